@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+Servido por ASGI, la espera de mensajes del chat (views.chat_espera_view) no
+ocupa un worker mientras espera. Requiere uvicorn, que no está en
+requirements.txt (pip install uvicorn):
+    gunicorn MejorSol.asgi:application -k uvicorn.workers.UvicornWorker
+Con el despliegue WSGI (MejorSol/wsgi.py) la vista no espera y el chat vuelve
+al polling cada tiempo_real.INTERVALO_POLLING segundos.
 """
 
 import os
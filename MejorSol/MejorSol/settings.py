@@ -68,6 +68,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Tiempo, consultas y Server-Timing por petición; solo con METRICAS_PETICIONES=True
+    'myapp.metricas_vistas.MetricasPeticionesMiddleware',
 ]
 
 # ===========================
@@ -76,6 +78,14 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'MejorSol.urls' 
 
+# Plantillas compiladas en memoria (cached loader) salvo con DEBUG, donde se
+# releen del disco en cada petición para ver los cambios sin reiniciar
+TEMPLATES_CACHEADAS = os.getenv('TEMPLATES_CACHEADAS', str(not DEBUG)).lower() == 'true'
+_CARGADORES_TEMPLATES = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,14 +93,18 @@ TEMPLATES = [
             BASE_DIR / 'templates',
             BASE_DIR / 'myapp' / 'templates'
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'myapp.fragmentos.contexto',
             ],
+            'loaders': (
+                [('django.template.loaders.cached.Loader', _CARGADORES_TEMPLATES)]
+                if TEMPLATES_CACHEADAS else _CARGADORES_TEMPLATES
+            ),
         },
     },
 ]
@@ -113,6 +127,29 @@ DATABASES = {
     }
 }
 
+# ===========================
+# CONFIGURACIÓN DE CACHÉ
+# ===========================
+
+# Con varios workers la caché debe ser compartida: el aviso de mensajes nuevos del
+# chat (myapp/tiempo_real.py) y las versiones del catálogo y de los fragmentos
+# (myapp/catalogo.py, myapp/fragmentos.py) se leen desde aquí. `check --deploy`
+# advierte si queda LocMemCache. P. ej.:
+#   CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache CACHE_LOCATION=127.0.0.1:11211
+#   CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache CACHE_LOCATION=cache_table
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'mejorsol'),
+    }
+}
+
+# Segundos que queda abierta la espera de mensajes del chat (menor que el timeout del worker)
+CHAT_LONG_POLL_SEGUNDOS = int(os.getenv('CHAT_LONG_POLL_SEGUNDOS', 25))
+
+# Usuario (inactivo, sin contraseña) que firma los mensajes del bot en los chats de cotización
+CHAT_BOT_USERNAME = os.getenv('CHAT_BOT_USERNAME', 'asistente_bot')
+
 # ===========================
 # VALIDACIÓN DE CONTRASEÑAS
 # ===========================
@@ -199,6 +236,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760
 
+# Backend del chatbot Dialogflow: 'google' (SessionsClient real) o 'local' (stub sin red)
+DIALOGFLOW_BACKEND = os.getenv('DIALOGFLOW_BACKEND', 'google')
+
+# Chatbot HuggingFace (services.ChatBotService): timeouts en segundos, reintentos ante
+# errores de conexión/5xx y circuito que deja de llamar tras N fallos seguidos
+CHATBOT_API_URL = os.getenv('CHATBOT_API_URL', 'https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium')
+CHATBOT_TIMEOUT_CONEXION = float(os.getenv('CHATBOT_TIMEOUT_CONEXION', 3))
+CHATBOT_TIMEOUT_LECTURA = float(os.getenv('CHATBOT_TIMEOUT_LECTURA', 10))
+CHATBOT_REINTENTOS = int(os.getenv('CHATBOT_REINTENTOS', 2))
+CHATBOT_CIRCUITO_FALLOS = int(os.getenv('CHATBOT_CIRCUITO_FALLOS', 5))
+CHATBOT_CIRCUITO_SEGUNDOS = int(os.getenv('CHATBOT_CIRCUITO_SEGUNDOS', 30))
+
+# Caché de respuestas del chatbot (myapp/cache_respuestas.py). Con COMPARTIDA las
+# respuestas también se guardan en CACHES para que las vean todos los workers
+CHATBOT_CACHE_MAXIMO = int(os.getenv('CHATBOT_CACHE_MAXIMO', 1000))
+CHATBOT_CACHE_SEGUNDOS = int(os.getenv('CHATBOT_CACHE_SEGUNDOS', 60 * 60))
+CHATBOT_CACHE_COMPARTIDA = os.getenv('CHATBOT_CACHE_COMPARTIDA', 'False').lower() == 'true'
+
+# Mensajes recientes de cada sesión del chatbot que se guardan en caché como contexto
+CHATBOT_CONTEXTO_MENSAJES = int(os.getenv('CHATBOT_CONTEXTO_MENSAJES', 6))
+CHATBOT_CONTEXTO_SEGUNDOS = int(os.getenv('CHATBOT_CONTEXTO_SEGUNDOS', 60 * 30))
+
+# Medición por petición (myapp/metricas_vistas.py): Server-Timing y p50/p95/p99 por
+# vista en api/metricas/vistas/. Desactivada no agrega costo
+METRICAS_PETICIONES = os.getenv('METRICAS_PETICIONES', 'False').lower() == 'true'
+METRICAS_PETICIONES_MUESTRAS = int(os.getenv('METRICAS_PETICIONES_MUESTRAS', 1000))
+
+# Miniaturas de imágenes de producto (myapp/imagenes.py): anchos en px y pool de hilos
+# que las genera después de cada subida (False: en la misma petición)
+MINIATURAS_ANCHOS = (160, 320, 640)
+MINIATURAS_EN_SEGUNDO_PLANO = os.getenv('MINIATURAS_EN_SEGUNDO_PLANO', 'True').lower() == 'true'
+MINIATURAS_HILOS = int(os.getenv('MINIATURAS_HILOS', 2))
+
+# Catálogo del dashboard de clientes en caché (myapp/catalogo.py). Los cambios de
+# productos, imágenes o categorías lo invalidan; el vencimiento es un respaldo.
+# Con una caché local (LocMemCache) las entradas duran a lo más CATALOGO_CACHE_SEGUNDOS_LOCAL
+CATALOGO_CACHE_SEGUNDOS = int(os.getenv('CATALOGO_CACHE_SEGUNDOS', 60 * 60))
+CATALOGO_CACHE_SEGUNDOS_LOCAL = int(os.getenv('CATALOGO_CACHE_SEGUNDOS_LOCAL', 60))
+
+# Fragmentos de plantilla en caché (myapp/fragmentos.py): grilla del catálogo, datos
+# de los gráficos de reportes y selectores de categoría. Las señales los invalidan
+FRAGMENTOS_CACHE_SEGUNDOS = int(os.getenv('FRAGMENTOS_CACHE_SEGUNDOS', 60 * 60))
+
+# Horas de sol por región para el dimensionamiento (myapp/dimensionamiento.py), p. ej.
+# {'atacama': {'invierno': 7, 'verano': 9}}. Las regiones no listadas usan kwh.xlsx.
+HORAS_SOL_POR_REGION = {}
+
 APP_CONFIG = {
     'EMPRESA_NOMBRE': 'SIEER Chile',
     'EMPRESA_RUT': '76.123.456-7',
@@ -0,0 +1,32 @@
+"""
+Código de Machine Learning (numpy + scikit-learn).
+
+Este módulo NO debe importarse a nivel de módulo desde views.py, urls.py ni
+pronosticos.py: cargar numpy/scikit-learn cuesta cientos de ms y decenas de MB
+por worker. Se importa dentro de las funciones que lo necesitan, de modo que
+solo lo paga el proceso que reajusta los pronósticos (ver tests.py,
+ArranqueLivianoTest).
+"""
+from datetime import timedelta
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+
+def proyectar_lineal(dias, valores, cantidad, acumulado=False):
+    """
+    Ajusta una regresión lineal valor ~ fecha y proyecta `cantidad` días
+    después del último día observado.
+    Con acumulado=True se ajusta sobre la suma acumulada de `valores`.
+    Retorna una lista de (dia, valor_predicho).
+    """
+    y = np.array(valores, dtype=float)
+    if acumulado:
+        y = y.cumsum()
+    X = np.array([d.toordinal() for d in dias]).reshape(-1, 1)
+    model = LinearRegression()
+    model.fit(X, y)
+
+    futuros = [dias[-1] + timedelta(days=i) for i in range(1, cantidad + 1)]
+    predichos = model.predict(np.array([d.toordinal() for d in futuros]).reshape(-1, 1))
+    return [(d, float(v)) for d, v in zip(futuros, predichos)]
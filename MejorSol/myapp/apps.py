@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.core.checks import Tags, register
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from .checks import revisar_cache_compartida
+        register(revisar_cache_compartida, Tags.caches, deploy=True)
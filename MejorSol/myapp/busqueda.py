@@ -0,0 +1,222 @@
+"""
+Búsqueda de productos del inventario (control_inventario_view y sugerencias).
+
+Busca en nombre, sku, descripcion, potencia y voltaje sin distinguir tildes ni
+mayúsculas (cache_respuestas.normalizar), exige todos los términos y ordena
+por relevancia:
+- MySQL: índice FULLTEXT con parser ngram (migración 0009), consultado con
+  MATCH ... AGAINST en modo booleano. El parser ngram también encuentra partes
+  de palabras ("450" en "450W", "bat" en "BAT-5K").
+- Otros motores (SQLite en desarrollo y tests): índice de trigramas en memoria
+  del proceso. Se reconstruye cuando cambia la versión 'busqueda' de
+  fragmentos.py, que suben las señales de Producto (models.py).
+
+Los términos de menos de MINIMO_TERMINO caracteres se ignoran en ambos casos; si
+no queda ninguno (p. ej. "5" o "x") se busca el texto completo en nombre y sku
+con icontains, como antes del índice. Los filtros del queryset (categoría,
+estado) se aplican en la misma consulta, sin tope de resultados: el listado, su
+total y la exportación CSV ven todas las coincidencias.
+"""
+import heapq
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+from . import fragmentos
+from .cache_respuestas import normalizar
+from .models import Producto
+
+CAMPOS = ('nombre', 'sku', 'descripcion', 'potencia', 'voltaje')
+# Peso de cada campo en la relevancia del índice en memoria
+PESOS = {'sku': 4, 'nombre': 3, 'potencia': 2, 'voltaje': 2, 'descripcion': 1}
+MINIMO_TERMINO = 2   # ngram_token_size por defecto de MySQL
+MAXIMO_TERMINOS = 8
+LIMITE_SUGERENCIAS = 8
+
+
+def terminos(q):
+    """Términos normalizados y sin repetir de la búsqueda."""
+    vistos = []
+    for termino in normalizar(q).split():
+        if len(termino) >= MINIMO_TERMINO and termino not in vistos:
+            vistos.append(termino)
+    return vistos[:MAXIMO_TERMINOS]
+
+
+def _usa_fulltext():
+    return connection.vendor == 'mysql'
+
+
+# ===========================
+# MYSQL: FULLTEXT
+# ===========================
+
+def _relevancia_fulltext(lista):
+    # Con la tabla: el listado une categorias, que también tiene nombre y descripcion
+    tabla = connection.ops.quote_name(Producto._meta.db_table)
+    columnas = ', '.join(f"{tabla}.{connection.ops.quote_name(campo)}" for campo in CAMPOS)
+    # normalizar() deja solo letras, dígitos y espacios: no quedan operadores del modo booleano
+    expresion = ' '.join(f'+"{termino}"' for termino in lista)
+    return RawSQL(f"MATCH ({columnas}) AGAINST (%s IN BOOLEAN MODE)", (expresion,))
+
+
+# ===========================
+# OTROS MOTORES: TRIGRAMAS EN MEMORIA
+# ===========================
+
+def _trigramas(palabra):
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+def _factor(palabra, termino):
+    if palabra == termino:
+        return 3  # palabra completa
+    if palabra.startswith(termino):
+        return 2  # comienzo de palabra (lo que se está escribiendo)
+    return 1
+
+
+class IndiceTrigramas:
+    """
+    Palabra normalizada -> [(id de producto, peso)], con el vocabulario indexado
+    por trigramas: un término se busca entre las palabras (pocas) y no entre los
+    productos. Cada lista viene ordenada por peso y antigüedad, así que un
+    término solo se resuelve leyendo el comienzo de las listas; con varios, el
+    más selectivo elige los candidatos y el resto se revisa en esos productos.
+    """
+
+    def __init__(self, filas):
+        self.posicion = {}  # desempate: más nuevo primero, como el listado sin búsqueda
+        self.documentos = {}  # id -> {palabra: peso}
+        self.palabras = defaultdict(list)
+        for posicion, (pk, *valores) in enumerate(filas):
+            self.posicion[pk] = posicion
+            pesos = {}
+            for campo, valor in zip(CAMPOS, valores):
+                for palabra in normalizar(valor).split():
+                    pesos[palabra] = max(pesos.get(palabra, 0), PESOS[campo])
+            self.documentos[pk] = pesos
+            for palabra, peso in pesos.items():
+                self.palabras[palabra].append((pk, peso))
+        self.trigramas = defaultdict(set)
+        for palabra, lista in self.palabras.items():
+            lista.sort(key=lambda elemento: (-elemento[1], self.posicion[elemento[0]]))
+            for trigrama in _trigramas(palabra):
+                self.trigramas[trigrama].add(palabra)
+
+    def _palabras_con(self, termino):
+        conjuntos = sorted((self.trigramas.get(t, set()) for t in _trigramas(termino)), key=len)
+        # Término de 2 letras: sin trigramas, se recorre el vocabulario
+        candidatas = conjuntos[0].intersection(*conjuntos[1:]) if conjuntos else self.palabras
+        return [palabra for palabra in candidatas if termino in palabra]
+
+    def _un_termino(self, termino, limite=None):
+        fuentes = [
+            ((-peso * factor, self.posicion[pk], pk) for pk, peso in self.palabras[palabra])
+            for palabra, factor in ((p, _factor(p, termino)) for p in self._palabras_con(termino))
+        ]
+        ids, vistos = [], set()
+        for _, _, pk in heapq.merge(*fuentes):
+            if pk not in vistos:  # la primera aparición es la de mayor puntaje
+                vistos.add(pk)
+                ids.append(pk)
+                if len(ids) == limite:
+                    break
+        return ids
+
+    def buscar(self, lista, limite=None):
+        """Ids de los productos con todos los términos, de mayor a menor relevancia (todos si limite=None)."""
+        if len(lista) == 1:
+            return self._un_termino(lista[0], limite)
+
+        palabras = {termino: self._palabras_con(termino) for termino in lista}
+        guia = min(lista, key=lambda t: sum(len(self.palabras[p]) for p in palabras[t]))
+        puntajes = {}
+        for palabra in palabras[guia]:
+            factor = _factor(palabra, guia)
+            for pk, peso in self.palabras[palabra]:
+                if peso * factor > puntajes.get(pk, 0):
+                    puntajes[pk] = peso * factor
+
+        puntuados = []
+        otros = [termino for termino in lista if termino != guia]
+        for pk, puntaje in puntajes.items():
+            documento = self.documentos[pk]
+            for termino in otros:
+                mejor = max((peso * _factor(p, termino) for p, peso in documento.items() if termino in p), default=0)
+                if not mejor:
+                    break
+                puntaje += mejor
+            else:
+                puntuados.append((-puntaje, self.posicion[pk], pk))
+        ordenados = heapq.nsmallest(limite, puntuados) if limite else sorted(puntuados)
+        return [pk for _, _, pk in ordenados]
+
+
+_indice = (None, None)
+_indice_lock = threading.Lock()
+
+
+def indice():
+    """Índice en memoria vigente; se reconstruye si los productos cambiaron."""
+    global _indice
+    version = fragmentos.version('busqueda')
+    if _indice[0] != version:
+        with _indice_lock:
+            if _indice[0] != version:
+                filas = Producto.objects.order_by('-fecha_creacion', '-id').values_list('id', *CAMPOS)
+                _indice = (version, IndiceTrigramas(filas.iterator()))
+    return _indice[1]
+
+
+def invalidar():
+    fragmentos.invalidar('busqueda')
+
+
+# ===========================
+# API
+# ===========================
+
+def filtrar(queryset, q):
+    """`queryset` (de Producto) reducido a los que coinciden con `q`, ordenado por relevancia."""
+    lista = terminos(q)
+    if not lista:
+        texto = (q or '').strip()
+        if not texto:
+            return queryset.none()
+        # Solo términos cortos: el índice no los cubre
+        return queryset.filter(Q(sku__icontains=texto) | Q(nombre__icontains=texto)).order_by('-fecha_creacion')
+    if _usa_fulltext():
+        return (
+            queryset.annotate(relevancia=_relevancia_fulltext(lista))
+            .filter(relevancia__gt=0).order_by('-relevancia', '-fecha_creacion')
+        )
+    ids = indice().buscar(lista)
+    if not ids:
+        return queryset.none()
+    if connection.vendor == 'sqlite':
+        # La misma expresión filtra y ordena: un solo parámetro aunque coincidan miles de productos
+        return queryset.annotate(posicion_busqueda=_posicion_sqlite(ids)).filter(posicion_busqueda__gt=0).order_by('posicion_busqueda')
+    posiciones = Case(*[When(pk=pk, then=posicion) for posicion, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(posicion_busqueda=posiciones).order_by('posicion_busqueda')
+
+
+def _posicion_sqlite(ids):
+    """instr() sobre ',id1,id2,...,': 0 si el producto no está, si no crece con su posición en `ids`."""
+    columna = f"{connection.ops.quote_name(Producto._meta.db_table)}.{connection.ops.quote_name('id')}"
+    return RawSQL(f"instr(%s, ',' || {columna} || ',')", (f",{','.join(map(str, ids))},",))
+
+
+def sugerencias(q, limite=LIMITE_SUGERENCIAS):
+    """Productos más relevantes para el autocompletado: [{'id', 'nombre', 'sku'}]."""
+    lista = terminos(q)
+    if not lista:
+        return []
+    if _usa_fulltext():
+        return list(filtrar(Producto.objects.all(), q).values('id', 'nombre', 'sku')[:limite])
+    ids = indice().buscar(lista, limite)
+    productos = Producto.objects.in_bulk(ids)
+    return [{'id': pk, 'nombre': productos[pk].nombre, 'sku': productos[pk].sku} for pk in ids if pk in productos]
@@ -0,0 +1,121 @@
+"""
+Caché de respuestas del chatbot por texto normalizado.
+
+Preguntas repetidas ("¿Cuánto cuesta un kit de 3 kW?", "cuanto cuesta un kit de
+3kw") se responden desde memoria sin llamar a HuggingFace ni a Dialogflow:
+  - primer nivel: LRU en el proceso con vencimiento (TTL), protegida con un lock
+  - segundo nivel opcional: la caché de Django (settings.CHATBOT_CACHE_COMPARTIDA),
+    compartida entre workers si CACHES apunta a memcached o a la base de datos
+
+Solo se guardan respuestas válidas a turnos sin contexto (ver los servicios en
+services.py): la clave es solo el texto, así que un turno con historial de
+HuggingFace o una sesión de Dialogflow con contextos activos siempre consulta al
+servicio. Los errores y respuestas de respaldo tampoco se guardan.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni signos de puntuación y con espacios simples."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'(\d)\s+(?=[a-z])', r'\1', texto)  # "3 kw" -> "3kw"
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    return ' '.join(texto.split())
+
+
+class CacheRespuestas:
+    """LRU con TTL en memoria del proceso, con respaldo opcional en la caché de Django."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_compartida = 0
+        self.fallos = 0
+
+    def _config(self):
+        return (
+            getattr(settings, 'CHATBOT_CACHE_MAXIMO', 1000),
+            getattr(settings, 'CHATBOT_CACHE_SEGUNDOS', 60 * 60),
+            getattr(settings, 'CHATBOT_CACHE_COMPARTIDA', False),
+        )
+
+    def _clave_compartida(self, clave):
+        return f"chatbot_respuestas:{self.nombre}:{hashlib.sha1(clave.encode()).hexdigest()}"
+
+    def obtener(self, clave):
+        """Respuesta guardada para `clave` o None."""
+        maximo, ttl, compartida = self._config()
+        ahora = time.monotonic()
+        with self._lock:
+            guardado = self._datos.get(clave)
+            if guardado is not None:
+                vence, valor = guardado
+                if vence > ahora:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+
+        if compartida:
+            valor = cache.get(self._clave_compartida(clave))
+            if valor is not None:
+                self._guardar_local(clave, valor, maximo, ttl)
+                with self._lock:
+                    self.aciertos_compartida += 1
+                return valor
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, valor):
+        maximo, ttl, compartida = self._config()
+        self._guardar_local(clave, valor, maximo, ttl)
+        if compartida:
+            cache.set(self._clave_compartida(clave), valor, ttl)
+
+    def _guardar_local(self, clave, valor, maximo, ttl):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > maximo:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self.aciertos = self.aciertos_compartida = self.fallos = 0
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.aciertos + self.aciertos_compartida + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'aciertos': self.aciertos,
+                'aciertos_compartida': self.aciertos_compartida,
+                'fallos': self.fallos,
+                'tasa_aciertos': round((self.aciertos + self.aciertos_compartida) / consultas, 3) if consultas else 0.0,
+            }
+
+
+respuestas_chatbot = CacheRespuestas('huggingface')
+respuestas_dialogflow = CacheRespuestas('dialogflow')
+
+
+def metricas():
+    """Métricas de ambas cachés (para el endpoint de administración)."""
+    return {
+        'huggingface': respuestas_chatbot.metricas(),
+        'dialogflow': respuestas_dialogflow.metricas(),
+    }
@@ -0,0 +1,115 @@
+"""
+Catálogo de productos activos para client_dashboard.
+
+El catálogo es el mismo para todos los clientes. Se guarda en la caché por
+página: un resumen (categorías con su total) y cada página ya serializada
+(productos con su categoría y su imagen principal), por categoría y número de
+página. Una petición lee solo el resumen y su página. Las claves llevan la
+versión del grupo 'catalogo' de fragmentos.py; las señales de Producto,
+ProductoImagen y Categoria (models.py) la cambian y las entradas anteriores
+vencen solas.
+
+Requiere una caché compartida (CACHE_BACKEND) con varios workers: con
+LocMemCache la versión es de cada proceso y los demás no ven el cambio. En ese
+caso las entradas duran a lo más CATALOGO_CACHE_SEGUNDOS_LOCAL y `check --deploy`
+lo advierte (checks.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from . import fragmentos
+from .models import Producto
+
+TAMANO_PAGINA = 12
+
+
+def _ttl():
+    ttl = getattr(settings, 'CATALOGO_CACHE_SEGUNDOS', 60 * 60)
+    if not fragmentos.cache_compartida():
+        # Los otros workers no ven invalidar(): la entrada vieja se sirve hasta que vence
+        ttl = min(ttl, getattr(settings, 'CATALOGO_CACHE_SEGUNDOS_LOCAL', 60))
+    return ttl
+
+
+def version():
+    return fragmentos.version('catalogo')
+
+
+def invalidar():
+    fragmentos.invalidar('catalogo')
+
+
+def _serializar(producto):
+    imagenes = list(producto.imagenes.all())  # prefetch, ya en orden (principal primero)
+    principal = imagenes[0] if imagenes else None
+    return {
+        'id': producto.id,
+        'nombre': producto.nombre,
+        'descripcion': producto.descripcion,
+        'precio': producto.precio,
+        'potencia': producto.potencia,
+        'voltaje': producto.voltaje,
+        'categoria_id': producto.categoria_id,
+        'categoria': producto.categoria.nombre,
+        'imagen': principal.miniatura if principal else '',
+        'imagen_grande': principal.miniatura_grande if principal else '',
+        'srcset_webp': principal.srcset_webp if principal else '',
+        'srcset_jpeg': principal.srcset_jpeg if principal else '',
+    }
+
+
+def _activos(categoria=None):
+    productos = Producto.objects.filter(activo=True)
+    if categoria:
+        productos = productos.filter(categoria_id=categoria)
+    return productos.order_by('-fecha_creacion', '-id')
+
+
+def _construir_resumen():
+    categorias = [
+        {'id': fila['categoria_id'], 'nombre': fila['categoria__nombre'], 'total': fila['total']}
+        for fila in _activos().order_by().values('categoria_id', 'categoria__nombre').annotate(total=Count('id'))
+    ]
+    categorias.sort(key=lambda c: c['nombre'])
+    return {'categorias': categorias, 'total': sum(c['total'] for c in categorias)}
+
+
+def _construir_pagina(categoria, inicio, tamano):
+    productos = _activos(categoria).select_related('categoria').prefetch_related('imagenes')
+    return [_serializar(p) for p in productos[inicio:inicio + tamano]]
+
+
+def _en_cache(clave, construir):
+    datos = cache.get(clave)
+    if datos is None:
+        datos = construir()
+        cache.set(clave, datos, _ttl())
+    return datos
+
+
+def pagina(numero=1, categoria=None, tamano=TAMANO_PAGINA):
+    """Una página del catálogo, opcionalmente solo de una categoría (id)."""
+    prefijo = f"catalogo:{version()}"
+    resumen = _en_cache(f"{prefijo}:resumen", _construir_resumen)
+    if categoria:
+        total = next((c['total'] for c in resumen['categorias'] if c['id'] == categoria), 0)
+    else:
+        total = resumen['total']
+    paginas = max(1, -(-total // tamano))
+    numero = min(max(1, numero), paginas)
+    inicio = (numero - 1) * tamano
+    productos = _en_cache(
+        f"{prefijo}:{categoria or 'todas'}:{tamano}:{numero}",
+        lambda: _construir_pagina(categoria, inicio, tamano) if total else [],
+    )
+    return {
+        'productos': productos,
+        'pagina': numero,
+        'paginas': paginas,
+        'total': total,
+        'hay_mas': numero < paginas,
+        'categoria': categoria,
+        'categorias': resumen['categorias'],
+        'total_general': resumen['total'],
+    }
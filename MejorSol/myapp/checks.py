@@ -0,0 +1,24 @@
+"""
+Checks de despliegue (`python manage.py check --deploy`).
+
+Las cachés con versión (fragmentos.py, catalogo.py, busqueda.py) y el contexto
+del chatbot asumen una caché que vean todos los workers.
+"""
+from django.core.checks import Warning
+
+from . import fragmentos
+
+
+def revisar_cache_compartida(app_configs, **kwargs):
+    """Registrado en apps.py con deploy=True."""
+    if fragmentos.cache_compartida():
+        return []
+    return [Warning(
+        "La caché por defecto es de cada proceso (LocMemCache o DummyCache).",
+        hint=(
+            "Con varios workers, invalidar() solo llega al proceso que la llama: el catálogo "
+            "y los fragmentos quedan desfasados hasta que vencen. Configurar CACHE_BACKEND y "
+            "CACHE_LOCATION (Memcached o DatabaseCache, ver settings.py)."
+        ),
+        id='myapp.W001',
+    )]
@@ -0,0 +1,93 @@
+"""
+Contexto de conversación del chatbot general (send_message).
+
+Por cada session_id se guarda en la caché un buffer circular con los últimos
+CHATBOT_CONTEXTO_MENSAJES mensajes y el id de la conversación. Con el buffer en
+caché un turno cuesta dos INSERT: el mensaje del usuario se guarda antes de
+llamar al bot (si el bot falla no se pierde del historial) y la respuesta
+después. Si no está en caché se reconstruye desde la base de datos con una
+sola consulta (los últimos mensajes junto con su conversación), una vez por
+turno.
+
+El buffer solo se usa si la caché es compartida entre workers
+(fragmentos.cache_compartida): con la LocMemCache por defecto cada proceso
+tendría su copia y un turno atendido por otro worker la dejaría obsoleta, así
+que el contexto se lee siempre de la base de datos.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+
+from .fragmentos import cache_compartida
+from .models import ChatConversation, ChatMessage
+
+
+def _clave(session_id):
+    return f"chatbot_contexto:{session_id}"
+
+
+def _maximo():
+    return getattr(settings, 'CHATBOT_CONTEXTO_MENSAJES', 6)
+
+
+def _ttl():
+    return getattr(settings, 'CHATBOT_CONTEXTO_SEGUNDOS', 60 * 30)
+
+
+def _desde_bd(session_id):
+    # Una consulta: los mensajes traen su conversación; solo una sesión nueva o vacía la busca aparte
+    ultimos = list(
+        ChatMessage.objects.filter(conversation__session_id=session_id).select_related('conversation')
+        .order_by('-timestamp', '-id')[:_maximo()]
+    )
+    if ultimos:
+        conversation = ultimos[0].conversation
+    else:
+        conversation, _ = ChatConversation.objects.get_or_create(session_id=session_id)
+    return {
+        'conversacion_id': conversation.pk,
+        'user_id': conversation.user_id,
+        'mensajes': [{'message': m.message, 'is_bot': m.is_bot} for m in reversed(ultimos)],
+    }
+
+
+def cargar(session_id, user=None):
+    """
+    Contexto de la sesión: {'conversacion_id', 'user_id', 'mensajes': [{'message', 'is_bot'}]}.
+    Si `user` está autenticado y la conversación aún no es suya, se le asigna
+    (un UPDATE solo cuando cambia).
+    """
+    compartida = cache_compartida()
+    contexto = cache.get(_clave(session_id)) if compartida else None
+    if contexto is None:
+        contexto = _desde_bd(session_id)
+        if compartida:
+            cache.set(_clave(session_id), contexto, _ttl())
+
+    if user is not None and user.is_authenticated and contexto['user_id'] != user.id:
+        ChatConversation.objects.filter(pk=contexto['conversacion_id']).update(user=user)
+        contexto['user_id'] = user.id
+        if compartida:
+            cache.set(_clave(session_id), contexto, _ttl())
+    return contexto
+
+
+def registrar_mensaje(session_id, contexto, mensaje, is_bot=False):
+    """Guarda un mensaje de la sesión (un INSERT) y lo agrega al buffer."""
+    nuevo = ChatMessage(conversation_id=contexto['conversacion_id'], message=mensaje, is_bot=is_bot)
+    try:
+        nuevo.save()
+    except IntegrityError:
+        # La conversación se borró y el buffer en caché quedó obsoleto: se recrea una vez
+        cache.delete(_clave(session_id))
+        contexto.update(_desde_bd(session_id))
+        nuevo.conversation_id = contexto['conversacion_id']
+        nuevo.save()
+
+    contexto['mensajes'] = (contexto['mensajes'] + [{'message': mensaje, 'is_bot': is_bot}])[-_maximo():]
+    if cache_compartida():
+        cache.set(_clave(session_id), contexto, _ttl())
+
+
+def olvidar(session_id):
+    cache.delete(_clave(session_id))
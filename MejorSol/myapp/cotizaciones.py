@@ -0,0 +1,61 @@
+"""
+Consultas reutilizables sobre ChatCotizacion para las vistas de administración.
+
+- contadores_por_estado(): todos los contadores por estado en una sola consulta
+  agrupada, guardados en caché e invalidados por las señales de ChatCotizacion
+  (ver models.py).
+- pagina_por_fecha(): paginación por cursor (keyset) sobre fecha_actualizacion,
+  cuyo costo no crece con el número de página como OFFSET.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from . import paginacion
+from .models import ChatCotizacion
+
+CLAVE_CONTADORES = 'cotizaciones:contadores_estado'
+# Tiempo máximo en caché: acota el desfase si se usa queryset.update() (no dispara señales)
+CONTADORES_TTL = getattr(settings, 'CONTADORES_CACHE_SEGUNDOS', 60)
+
+TAMANO_PAGINA = 25
+
+
+def contadores_por_estado(usar_cache=True):
+    """Retorna {'todos': n, 'pendiente': n, 'en_proceso': n, 'aprobada': n, 'rechazada': n}."""
+    if usar_cache:
+        contadores = cache.get(CLAVE_CONTADORES)
+        if contadores is not None:
+            return contadores
+
+    contadores = {estado: 0 for estado, _ in ChatCotizacion.ESTADO_CHOICES}
+    for fila in ChatCotizacion.objects.order_by().values('estado').annotate(total=Count('id')):
+        contadores[fila['estado']] = fila['total']
+    contadores['todos'] = sum(contadores.values())
+
+    if usar_cache:
+        cache.set(CLAVE_CONTADORES, contadores, CONTADORES_TTL)
+    return contadores
+
+
+def invalidar_contadores():
+    cache.delete(CLAVE_CONTADORES)
+
+
+def pagina_por_fecha(queryset, cursor=None, tamano=TAMANO_PAGINA):
+    """
+    Página de `queryset` ordenada por (-fecha_actualizacion, -id), empezando después de `cursor`.
+    Retorna (chats, siguiente_cursor); siguiente_cursor es None en la última página.
+    Un cursor inválido se ignora y se parte desde el comienzo.
+    """
+    orden = ('-fecha_actualizacion', '-id')
+    valores = None
+    if cursor:
+        try:
+            valores = paginacion.leer_cursor(cursor)
+        except ValueError:
+            pass
+
+    chats, hay_mas = paginacion.pagina(queryset, orden, valores, tamano)
+    siguiente = paginacion.cursor(chats[-1].fecha_actualizacion, chats[-1].id) if hay_mas else None
+    return chats, siguiente
@@ -0,0 +1,319 @@
+"""
+Generador de datos sintéticos para pruebas de carga (comando generar_datos).
+
+Crea clientes, productos, chats de cotización, sus mensajes y productos
+adquiridos a escala (millones de filas) con bulk_create por lotes:
+  - la contraseña se hashea una sola vez y se reutiliza en todos los usuarios
+  - las fechas se reparten en los últimos `dias` con más actividad cerca de hoy
+  - todo sale de un random.Random(semilla): misma semilla, mismos datos
+
+bulk_create no dispara señales, así que aquí se hace lo que harían: perfiles
+de los usuarios nuevos, reconciliación de KPIs, contadores por estado y
+series de pronósticos.
+"""
+import contextlib
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from .models import (
+    Categoria, ChatCotizacion, MensajeCotizacion, Perfil, Producto, ProductoAdquirido, ProductoImagen,
+)
+
+PREFIJO_USUARIO = 'sint_'
+PREFIJO_SKU = 'SINT-'
+TAMANO_LOTE = 5000
+
+CATEGORIAS = ['Paneles Solares', 'Inversores', 'Baterías', 'Kits On-Grid', 'Kits Off-Grid', 'Accesorios']
+NOMBRES = ['Camila', 'Matías', 'Valentina', 'Benjamín', 'Isidora', 'Vicente', 'Antonia', 'Martín', 'Josefa', 'Tomás']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda']
+REGIONES = ['Metropolitana, Santiago', 'Valparaíso, Viña del Mar', 'Biobío, Concepción', 'Coquimbo, La Serena', 'Maule, Talca']
+# Estados con su peso relativo
+ESTADOS = [('pendiente', 3), ('en_proceso', 3), ('aprobada', 2), ('rechazada', 1)]
+MENSAJES_CLIENTE = [
+    'Hola, quiero cotizar este producto.',
+    '¿Cuál es el plazo de instalación?',
+    '¿Incluye el inversor?',
+    'Mi consumo mensual es de unos 300 kWh.',
+    'Gracias, quedo atento.',
+]
+MENSAJES_EQUIPO = [
+    'Hola, te envío la cotización actualizada.',
+    'La instalación toma entre 3 y 5 días hábiles.',
+    'Sí, el kit incluye inversor y estructura.',
+    'Podemos coordinar una visita técnica.',
+]
+
+
+@contextlib.contextmanager
+def fechas_manuales(*modelos):
+    """
+    Desactiva auto_now/auto_now_add de `modelos` mientras dura el bloque, para
+    que bulk_create respete las fechas históricas generadas.
+    """
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for modelo in modelos for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _lotes(iterable, tamano):
+    lote = []
+    for elemento in iterable:
+        lote.append(elemento)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def insertar(modelo, objetos, tamano=TAMANO_LOTE):
+    """Inserta `objetos` (iterable) por lotes y retorna cuántos se crearon."""
+    total = 0
+    for lote in _lotes(objetos, tamano):
+        modelo.objects.bulk_create(lote, batch_size=tamano)
+        total += len(lote)
+    return total
+
+
+def insertar_con_ids(modelo, objetos, clave, tamano=TAMANO_LOTE, acotar=None):
+    """
+    Como insertar(), pero retorna los ids en orden. Los motores que no devuelven
+    ids en un INSERT múltiple (MySQL) los leen por `clave`, un campo con un valor
+    generado distinto en cada fila (username, sku): un rango de pk no sirve,
+    porque otro proceso puede insertar en la tabla durante el lote.
+    `acotar(lote)` retorna un Q extra para usar un índice si `clave` no lo tiene.
+    """
+    ids = []
+    for lote in _lotes(objetos, tamano):
+        with transaction.atomic():
+            modelo.objects.bulk_create(lote, batch_size=tamano)
+            if lote[-1].pk is None:
+                valores = [getattr(objeto, clave) for objeto in lote]
+                consulta = modelo.objects.filter(**{f'{clave}__in': valores})
+                if acotar is not None:
+                    consulta = consulta.filter(acotar(lote))
+                pks = dict(consulta.values_list(clave, 'pk'))
+                ids += [pks[valor] for valor in valores]
+            else:
+                ids += [objeto.pk for objeto in lote]
+    return ids
+
+
+class Generador:
+    """Genera el conjunto de datos; cada método retorna los ids creados."""
+
+    def __init__(self, dias=365, semilla=1, clave='demo1234', tamano_lote=TAMANO_LOTE, hasta=None):
+        self.dias = dias
+        self.rng = random.Random(semilla)
+        self.semilla = semilla
+        self.hasta = hasta or timezone.now()
+        self.desde = self.hasta - timedelta(days=dias)
+        self.tamano_lote = tamano_lote
+        self.hash_clave = make_password(clave)
+
+    def fecha(self):
+        """Fecha en la ventana con densidad creciente hacia `hasta` (crecimiento lineal)."""
+        return self.desde + timedelta(seconds=self.dias * 86400 * math.sqrt(self.rng.random()))
+
+    def categorias(self):
+        return [Categoria.objects.get_or_create(nombre=nombre)[0].pk for nombre in CATEGORIAS]
+
+    def productos(self, cantidad):
+        categorias = self.categorias()
+        base = Producto.objects.filter(sku__startswith=PREFIJO_SKU).count()
+        rng = self.rng
+
+        def construir():
+            for i in range(base, base + cantidad):
+                precio = Decimal(rng.randrange(50_000, 8_000_000, 1000))
+                creado = self.fecha()
+                activo = rng.random() > 0.1
+                yield Producto(
+                    nombre=f"Producto {i:07d}", sku=f"{PREFIJO_SKU}{self.semilla}-{i:07d}",
+                    categoria_id=rng.choice(categorias), precio=precio,
+                    costo=(precio * Decimal('0.7')).quantize(Decimal('1')),
+                    stock=rng.randint(0, 200), activo=activo, estado='activo' if activo else 'inactivo',
+                    fecha_creacion=creado, fecha_actualizacion=creado,
+                )
+
+        with fechas_manuales(Producto):
+            return insertar_con_ids(Producto, construir(), 'sku', self.tamano_lote)
+
+    def clientes(self, cantidad):
+        base = User.objects.filter(username__startswith=PREFIJO_USUARIO).count()
+        rng = self.rng
+        fechas = []
+
+        def construir():
+            for i in range(base, base + cantidad):
+                username = f"{PREFIJO_USUARIO}{self.semilla}_{i:08d}"
+                fechas.append(self.fecha())
+                yield User(
+                    username=username, email=f"{username}@ejemplo.cl", password=self.hash_clave,
+                    first_name=rng.choice(NOMBRES), last_name=rng.choice(APELLIDOS), date_joined=fechas[-1],
+                )
+
+        ids = insertar_con_ids(User, construir(), 'username', self.tamano_lote)
+        # La señal crear_perfil_usuario no corre con bulk_create
+        perfiles = (
+            Perfil(
+                usuario_id=pk, tipo_usuario='cliente', telefono=f"+569{rng.randint(10_000_000, 99_999_999)}",
+                fecha_creacion=fecha, fecha_actualizacion=fecha,
+            )
+            for pk, fecha in zip(ids, fechas)
+        )
+        with fechas_manuales(Perfil):
+            insertar(Perfil, perfiles, self.tamano_lote)
+        return ids
+
+    def cotizaciones(self, cantidad, clientes, productos, mensajes_por_chat=4):
+        """Chats de cotización con `mensajes_por_chat` mensajes en promedio y compras de los aprobados."""
+        from .flujo_cotizacion import obtener_bot
+
+        rng = self.rng
+        bot = obtener_bot()
+        staff = User.objects.filter(is_staff=True, is_active=True).values_list('pk', flat=True).first()
+        estados, pesos = zip(*ESTADOS)
+        precios = dict(Producto.objects.values_list('pk', 'precio'))
+        creados = {'cotizaciones': 0, 'mensajes': 0, 'adquiridos': 0}
+        # El correo de contacto lleva un índice propio de cada chat: es la clave para leer los ids
+        base = ChatCotizacion.objects.filter(cliente__username__startswith=PREFIJO_USUARIO).count()
+
+        with fechas_manuales(ChatCotizacion, MensajeCotizacion):
+            for inicio in range(0, cantidad, self.tamano_lote):
+                datos = []
+                for _ in range(min(self.tamano_lote, cantidad - inicio)):
+                    creado = self.fecha()
+                    actualizado = min(creado + timedelta(hours=rng.expovariate(1 / 48)), self.hasta)
+                    datos.append((rng.choice(clientes), rng.choice(productos), rng.choices(estados, pesos)[0], creado, actualizado))
+
+                chats = insertar_con_ids(ChatCotizacion, (
+                    ChatCotizacion(
+                        cliente_id=cliente, producto_id=producto, estado=estado,
+                        admin_asignado_id=staff if estado != 'pendiente' else None,
+                        cliente_nombre_dato=f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}",
+                        cliente_email_dato=f"cliente{cliente}.{self.semilla}-{base + inicio + n}@ejemplo.cl",
+                        cliente_telefono_dato=f"+569{rng.randint(10_000_000, 99_999_999)}",
+                        cliente_rut_dato=rng.choice(REGIONES),
+                        cliente_mensaje_dato='Proyecto residencial generado para pruebas de carga.',
+                        paso_intake='completo', staff_unido=staff is not None and estado != 'pendiente',
+                        fecha_creacion=creado, fecha_actualizacion=actualizado,
+                    )
+                    for n, (cliente, producto, estado, creado, actualizado) in enumerate(datos)
+                ), 'cliente_email_dato', self.tamano_lote,
+                    acotar=lambda lote: Q(cliente_id__in={chat.cliente_id for chat in lote}))
+
+                creados['mensajes'] += insertar(MensajeCotizacion, self._mensajes(
+                    zip(chats, datos), mensajes_por_chat, bot.pk, staff
+                ), self.tamano_lote)
+
+                adquiridos = [
+                    ProductoAdquirido(
+                        cliente_id=cliente, producto_id=producto, precio_adquisicion=precios[producto],
+                        fecha_compra=timezone.localtime(actualizado).date(),
+                    )
+                    for cliente, producto, estado, _, actualizado in datos if estado == 'aprobada'
+                ]
+                ProductoAdquirido.objects.bulk_create(adquiridos, batch_size=self.tamano_lote, ignore_conflicts=True)
+                creados['adquiridos'] += len(adquiridos)
+                creados['cotizaciones'] += len(chats)
+        return creados
+
+    def _mensajes(self, chats, promedio, bot_id, staff_id):
+        rng = self.rng
+        for chat_id, (cliente, _, estado, creado, actualizado) in chats:
+            cantidad = max(1, round(rng.expovariate(1 / promedio))) if promedio else 0
+            paso = (actualizado - creado) / max(cantidad, 1)
+            for n in range(cantidad):
+                if n % 2 == 0:
+                    autor, es_bot, texto = cliente, False, rng.choice(MENSAJES_CLIENTE)
+                elif staff_id is not None and estado != 'pendiente':
+                    autor, es_bot, texto = staff_id, False, rng.choice(MENSAJES_EQUIPO)
+                else:
+                    autor, es_bot, texto = bot_id, True, 'Por favor, ingresa el nombre y apellido.'
+                yield MensajeCotizacion(
+                    chat_id=chat_id, autor_id=autor, es_bot=es_bot, mensaje=texto, timestamp=creado + paso * n,
+                )
+
+
+def despues_de_generar():
+    """Lo que harían las señales omitidas por bulk_create: KPIs, contadores, catálogo, búsqueda y pronósticos."""
+    from .busqueda import invalidar as invalidar_busqueda
+    from .catalogo import invalidar as invalidar_catalogo
+    from .cotizaciones import invalidar_contadores
+    from .kpis import reconciliar
+    from .pronosticos import actualizar_pronosticos
+
+    reconciliar()
+    invalidar_contadores()
+    invalidar_catalogo()
+    invalidar_busqueda()
+    actualizar_pronosticos(completo=True)
+
+
+@contextlib.contextmanager
+def sin_senales_de_borrado():
+    """
+    Desconecta los receptores de post_delete de models.py mientras dura el bloque.
+    Con receptores, delete() carga cada fila (y las de sus cascadas) para enviarle
+    la señal; sin ellos, las tablas dependientes se borran con un DELETE por lote.
+    Quien lo use debe llamar a despues_de_generar() al terminar.
+    """
+    from . import models
+
+    receptores = [
+        (models.olvidar_usuario_bot, User),
+        (models.invalidar_catalogo, Producto),
+        (models.invalidar_catalogo, ProductoImagen),
+        (models.invalidar_indice_busqueda, Producto),
+        (models.invalidar_fragmentos_reportes, Producto),
+        (models.actualizar_kpis_al_eliminar, Producto),
+        (models.invalidar_contadores_cotizacion, ChatCotizacion),
+        (models.invalidar_fragmentos_reportes, ChatCotizacion),
+        (models.actualizar_kpis_al_eliminar, ChatCotizacion),
+        (models.actualizar_kpis_al_eliminar, Perfil),
+    ]
+    for receptor, modelo in receptores:
+        post_delete.disconnect(receptor, sender=modelo)
+    try:
+        yield
+    finally:
+        for receptor, modelo in receptores:
+            post_delete.connect(receptor, sender=modelo)
+
+
+def limpiar(actualizar=True):
+    """
+    Borra los datos sintéticos (usuarios con PREFIJO_USUARIO y productos con
+    PREFIJO_SKU) sin señales por fila. Con actualizar=False no se corre
+    despues_de_generar() (el comando lo hace después de generar).
+    """
+    usuarios = User.objects.filter(username__startswith=PREFIJO_USUARIO)
+    productos = Producto.objects.filter(sku__startswith=PREFIJO_SKU)
+    with sin_senales_de_borrado(), transaction.atomic():
+        chats = ChatCotizacion.objects.filter(Q(cliente__in=usuarios) | Q(producto__in=productos))
+        MensajeCotizacion.objects.filter(chat__in=chats).delete()
+        ProductoAdquirido.objects.filter(cliente__in=usuarios).delete()
+        chats.delete()
+        usuarios.delete()
+        productos.delete()
+    if actualizar:
+        despues_de_generar()
@@ -0,0 +1,529 @@
+"""
+Motor de dimensionamiento solar a partir de las planillas de myapp/data.
+
+Las planillas se leen una sola vez por proceso y se reducen a tablas compactas:
+  - bandas: potencia del equipo (kW) -> rango de consumo mensual (kWh) y horas
+    de sol de invierno/verano (kwh.xlsx)
+  - precios por tipo de sistema: paneles (W), baterías (kWh), inversores (kW),
+    materiales y mano de obra por rango de paneles, ayudantes y certificados
+    (kits_ongrid.xlsx.xlsx y offgrid.xlsx)
+
+Las tablas se guardan en un archivo JSON bajo BASE_DIR cuya clave son la fecha
+de modificación y tamaño de cada planilla, así los workers no vuelven a abrir
+Excel al arrancar mientras las planillas no cambien. Es JSON (no pickle) y no
+vive en el directorio temporal compartido: leerlo no puede ejecutar código.
+
+La potencia del equipo sale de la banda de kwh.xlsx que cubre el consumo, la
+misma que da el kit recomendado; paneles, inversor y certificado se calculan
+para esa potencia.
+
+El cálculo replica la hoja de kits: subtotal de materiales, 10% de imprevistos
+sobre el subtotal e IVA (settings.APP_CONFIG['IVA_PORCENTAJE']) sobre el subtotal.
+"""
+import csv
+import io
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+from django.conf import settings
+
+DIRECTORIO_DATOS = os.path.join(os.path.dirname(__file__), 'data')
+PLANILLAS = {
+    'kwh': 'kwh.xlsx',
+    'ongrid': 'kits_ongrid.xlsx.xlsx',
+    'offgrid': 'offgrid.xlsx',
+}
+TIPOS_SISTEMA = ('ongrid', 'offgrid')
+TEMPORADAS = ('invierno', 'verano')
+VERSION_TABLAS = 2
+
+DIAS_MES = 30
+IMPREVISTOS_PORCENTAJE = 10
+AYUDANTES_POR_INSTALACION = 3
+# Fracción del consumo diario que debe cubrir el banco de baterías off-grid (noche)
+RESPALDO_BATERIAS = 0.3
+
+logger = logging.getLogger(__name__)
+_tablas = None
+_tablas_lock = threading.Lock()
+
+
+# ===========================
+# LECTURA DE PLANILLAS
+# ===========================
+
+def _rango(texto):
+    """'175 a 200' -> (175.0, 200.0)"""
+    numeros = re.findall(r'\d+(?:[.,]\d+)?', str(texto or ''))
+    if len(numeros) < 2:
+        return None
+    return float(numeros[0].replace(',', '.')), float(numeros[1].replace(',', '.'))
+
+
+def _leer_bandas(ws):
+    """Filas de kwh.xlsx -> bandas ordenadas por potencia."""
+    bandas = []
+    horas_invierno = horas_verano = None
+    for kva, potencia_w, h_inv, kwh_mes, h_ver, kwh_verano in ws.iter_rows(min_row=2, max_col=6, values_only=True):
+        horas_invierno = h_inv or horas_invierno
+        horas_verano = h_ver or horas_verano
+        rango = _rango(kwh_mes)
+        if rango is None:
+            continue
+        if kva is None and bandas:
+            # Fila sin equipo: amplía el rango de la banda anterior
+            banda = bandas[-1]
+            banda['kwh_min'] = min(banda['kwh_min'], rango[0])
+            banda['kwh_max'] = max(banda['kwh_max'], rango[1])
+            continue
+        rango_verano = _rango(kwh_verano)
+        bandas.append({
+            'kw': round((potencia_w or kva / 1.25 * 1000) / 1000, 2),
+            'kva': kva,
+            'kwh_min': rango[0], 'kwh_max': rango[1],
+            'kwh_verano_min': rango_verano[0] if rango_verano else None,
+            'kwh_verano_max': rango_verano[1] if rango_verano else None,
+            'horas_invierno': horas_invierno, 'horas_verano': horas_verano,
+        })
+    return sorted(bandas, key=lambda b: b['kw'])
+
+
+PATRONES = [
+    ('paneles', re.compile(r'^(?:pol|mon)(\d+)$'), lambda m: float(m.group(1))),            # W
+    ('baterias', re.compile(r'^lit(\d+)$'), lambda m: float(m.group(1))),                    # kWh
+    ('baterias', re.compile(r'^(\d+)ah$'), lambda m: float(m.group(1)) * 12 / 1000),         # kWh a 12 V
+    ('inversores_ongrid', re.compile(r'^on([\d.]+)k$'), lambda m: float(m.group(1))),        # kW
+    # mppt5.1 / 5.2 / 5.3 son variantes del equipo de 5 kW
+    ('inversores_offgrid', re.compile(r'^mppt(\d+)(?:\.(\d))?$'), lambda m: float(m.group(1) if m.group(1) == '5' else m.group(0)[4:])),
+    ('materiales', re.compile(r'^ma(\d+)(?:a(\d+))?$'), lambda m: float(m.group(2) or m.group(1))),  # hasta N paneles
+    ('mano_obra', re.compile(r'^mo(\d+)(?:a(\d+))?$'), lambda m: float(m.group(2) or m.group(1))),
+    ('certificados', re.compile(r'^te1 (\d+)k$'), lambda m: float(m.group(1))),              # kW
+]
+
+
+def _leer_precios(ws):
+    """Columna A (código) y B (precio SIEER) -> {'precios': {...}, categoría: [(capacidad, código, precio)]}."""
+    tabla = {'precios': {}}
+    for categoria, _, _ in PATRONES:
+        tabla[categoria] = []
+    for codigo, precio in ws.iter_rows(min_row=3, max_col=2, values_only=True):
+        if not codigo or not isinstance(precio, (int, float)) or precio <= 0:
+            continue
+        codigo = str(codigo).strip().lower()
+        tabla['precios'][codigo] = precio
+        for categoria, patron, capacidad in PATRONES:
+            m = patron.match(codigo)
+            if m:
+                tabla[categoria].append((capacidad(m), codigo, precio))
+                break
+    for categoria, _, _ in PATRONES:
+        # Por capacidad y, a igual capacidad, el más barato primero
+        tabla[categoria].sort(key=lambda x: (x[0], x[2]))
+    return tabla
+
+
+def _leer_planillas():
+    from openpyxl import load_workbook  # solo se necesita si el caché JSON de tablas falta o quedó desactualizado
+
+    def hoja(nombre):
+        return load_workbook(os.path.join(DIRECTORIO_DATOS, PLANILLAS[nombre]), read_only=True, data_only=True).worksheets[0]
+
+    return {
+        'bandas': _leer_bandas(hoja('kwh')),
+        'ongrid': _leer_precios(hoja('ongrid')),
+        'offgrid': _leer_precios(hoja('offgrid')),
+    }
+
+
+# ===========================
+# CACHÉ DE TABLAS (JSON)
+# ===========================
+
+def _ruta_cache():
+    return getattr(settings, 'DIMENSIONAMIENTO_CACHE_PATH',
+                   os.path.join(settings.BASE_DIR, 'cache', 'dimensionamiento.json'))
+
+
+def _clave_planillas():
+    clave = [VERSION_TABLAS]
+    for nombre in sorted(PLANILLAS):
+        estado = os.stat(os.path.join(DIRECTORIO_DATOS, PLANILLAS[nombre]))
+        clave.append([PLANILLAS[nombre], estado.st_mtime_ns, estado.st_size])
+    return clave
+
+
+def _cargar_tablas():
+    clave = _clave_planillas()
+    ruta = _ruta_cache()
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            guardado = json.load(f)
+        if guardado.get('clave') == clave:
+            return guardado['tablas']
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+
+    # Mismo formato que al leerlo de vuelta (las tuplas quedan como listas)
+    tablas = json.loads(json.dumps(_leer_planillas()))
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'clave': clave, 'tablas': tablas}, f)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        logger.warning("No se pudo guardar el caché de dimensionamiento: %s", e)
+    return tablas
+
+
+def tablas():
+    """Tablas de dimensionamiento del proceso (se cargan en la primera llamada)."""
+    global _tablas
+    if _tablas is None:
+        with _tablas_lock:
+            if _tablas is None:
+                _tablas = _cargar_tablas()
+    return _tablas
+
+
+def recargar_tablas():
+    """Descarta las tablas en memoria (p. ej. después de actualizar las planillas)."""
+    global _tablas
+    with _tablas_lock:
+        _tablas = None
+
+
+# ===========================
+# CÁLCULO
+# ===========================
+
+def _menor_que_cubre(opciones, requerido):
+    """Primera opción con capacidad >= requerido; si ninguna alcanza, la mayor."""
+    for opcion in opciones:
+        if opcion[0] >= requerido:
+            return opcion
+    return opciones[-1] if opciones else None
+
+
+def _item(tipo, opcion, cantidad):
+    capacidad, codigo, precio = opcion
+    return {
+        'tipo': tipo, 'codigo': codigo, 'capacidad': capacidad,
+        'cantidad': cantidad, 'precio_unitario': precio, 'total': precio * cantidad,
+    }
+
+
+def banda_para(consumo_kwh):
+    """Banda de kwh.xlsx que cubre el consumo mensual, o None si lo supera."""
+    for banda in tablas()['bandas']:
+        if consumo_kwh <= banda['kwh_max']:
+            return banda
+    return None
+
+
+def potencia_para(consumo_kwh, horas):
+    """
+    (potencia kW, banda) para un consumo mensual con `horas` de sol diarias. El
+    consumo se lleva a las horas de invierno con que se armó kwh.xlsx y se usa la
+    potencia de la banda que lo cubre; sobre la última banda, la de esa banda en
+    proporción al consumo (sin banda, kit_recomendado queda en None).
+    """
+    bandas = tablas()['bandas']
+    if not bandas:
+        return consumo_kwh / (DIAS_MES * horas), None
+    equivalente = consumo_kwh * bandas[0]['horas_invierno'] / horas
+    banda = banda_para(equivalente)
+    if banda:
+        return banda['kw'], banda
+    return bandas[-1]['kw'] * equivalente / bandas[-1]['kwh_max'], None
+
+
+def horas_sol(temporada='invierno', region=None):
+    """
+    Horas de sol diarias. Las planillas no distinguen regiones: si la región está
+    en settings.HORAS_SOL_POR_REGION ({'region': {'invierno': h, 'verano': h}}) se
+    usa ese valor, si no el de kwh.xlsx.
+    """
+    temporada = 'verano' if temporada == 'verano' else 'invierno'
+    por_region = getattr(settings, 'HORAS_SOL_POR_REGION', {}).get((region or '').strip().lower())
+    if por_region and por_region.get(temporada):
+        return por_region[temporada]
+    bandas = tablas()['bandas']
+    return bandas[0]['horas_' + temporada] if bandas else 6
+
+
+def dimensionar(consumo_kwh, tipo_sistema='ongrid', temporada='invierno', region=None):
+    """
+    Equipo recomendado para un consumo mensual (kWh) y tipo de sistema ('ongrid' u 'offgrid').
+    Retorna potencia requerida, lista de materiales (paneles, inversor, baterías,
+    materiales, mano de obra, ayudantes, certificado) y subtotal/imprevistos/IVA/total.
+    """
+    if tipo_sistema not in TIPOS_SISTEMA:
+        raise ValueError(f"Tipo de sistema desconocido: {tipo_sistema}")
+    try:
+        consumo_kwh = float(consumo_kwh)
+    except (TypeError, ValueError):
+        raise ValueError("El consumo mensual debe ser un número.")
+    if not math.isfinite(consumo_kwh):
+        raise ValueError("El consumo mensual debe ser un número finito.")
+    if consumo_kwh <= 0:
+        raise ValueError("El consumo mensual debe ser mayor que cero.")
+
+    precios = tablas()[tipo_sistema]
+    horas = horas_sol(temporada, region)
+    # La misma banda da el kit recomendado y la potencia de los materiales
+    potencia_kw, banda = potencia_para(consumo_kwh, horas)
+
+    panel = precios['paneles'][-1]  # el de mayor potencia
+    cantidad_paneles = max(1, math.ceil(potencia_kw * 1000 / panel[0]))
+    potencia_instalada = cantidad_paneles * panel[0] / 1000
+
+    items = [_item('panel', panel, cantidad_paneles)]
+
+    inversores = precios['inversores_ongrid' if tipo_sistema == 'ongrid' else 'inversores_offgrid']
+    inversor = _menor_que_cubre(inversores, potencia_kw)
+    if inversor:
+        items.append(_item('inversor', inversor, max(1, math.ceil(potencia_kw / inversor[0]))))
+
+    baterias = None
+    if tipo_sistema == 'offgrid' and precios['baterias']:
+        bateria = precios['baterias'][-1]  # la de mayor capacidad (litio)
+        respaldo_kwh = consumo_kwh / DIAS_MES * RESPALDO_BATERIAS
+        baterias = _item('bateria', bateria, max(1, math.ceil(respaldo_kwh / bateria[0])))
+        items.append(baterias)
+
+    for tipo, categoria in (('materiales', 'materiales'), ('mano_obra', 'mano_obra')):
+        opcion = _menor_que_cubre(precios[categoria], cantidad_paneles)
+        if opcion:
+            items.append(_item(tipo, opcion, 1))
+
+    ayudante = precios['precios'].get('ay1')
+    if ayudante:
+        items.append(_item('ayudante', (1, 'ay1', ayudante), AYUDANTES_POR_INSTALACION))
+
+    if tipo_sistema == 'ongrid' and precios['certificados']:
+        certificado = _menor_que_cubre(precios['certificados'], potencia_instalada)
+        items.append(_item('certificado', certificado, max(1, math.ceil(potencia_instalada / certificado[0]))))
+
+    subtotal = sum(item['total'] for item in items)
+    imprevistos = round(subtotal * IMPREVISTOS_PORCENTAJE / 100)
+    iva = round(subtotal * settings.APP_CONFIG['IVA_PORCENTAJE'] / 100)
+
+    return {
+        'tipo_sistema': tipo_sistema,
+        'consumo_kwh': consumo_kwh,
+        'horas_sol': horas,
+        'potencia_requerida_kw': round(potencia_kw, 2),
+        'potencia_instalada_kw': round(potencia_instalada, 2),
+        'kit_recomendado': id_kit(tipo_sistema, banda['kw']) if banda else None,
+        'paneles': items[0],
+        'baterias': baterias,
+        'items': items,
+        'subtotal': subtotal,
+        'imprevistos': imprevistos,
+        'iva': iva,
+        'total': subtotal + imprevistos + iva,
+    }
+
+
+# ===========================
+# KITS PARA crear_cotizacion.html
+# ===========================
+
+def id_kit(tipo_sistema, kw):
+    return f"{tipo_sistema}-{kw:g}kw"
+
+
+def kits():
+    """
+    Un kit por banda de potencia y tipo de sistema, dimensionado para el tope de
+    consumo de la banda: {'ongrid': [{'id', 'nombre', 'potencia', 'precio'}], 'offgrid': [...]}.
+    El precio no incluye IVA (el formulario lo agrega aparte).
+    """
+    nombres = {'ongrid': 'Kit On-Grid', 'offgrid': 'Kit Off-Grid'}
+    resultado = {}
+    for tipo in TIPOS_SISTEMA:
+        resultado[tipo] = []
+        for banda in tablas()['bandas']:
+            calculo = dimensionar(banda['kwh_max'], tipo)
+            resultado[tipo].append({
+                'id': id_kit(tipo, banda['kw']),
+                'nombre': f"{nombres[tipo]} {banda['kw']:g} kW",
+                'potencia': banda['kw'],
+                'precio': calculo['subtotal'] + calculo['imprevistos'],
+            })
+    return resultado
+
+
+def tabla_kwh():
+    """Bandas de consumo para el formulario: [{'kit_kw', 'kwh_min', 'kwh_max'}]."""
+    return [
+        {'kit_kw': banda['kw'], 'kwh_min': banda['kwh_min'], 'kwh_max': banda['kwh_max']}
+        for banda in tablas()['bandas']
+    ]
+
+
+# ===========================
+# COTIZACIÓN EN LOTE
+# ===========================
+
+COLUMNAS_RESULTADO_LOTE = [
+    'fila', 'consumo_kwh', 'tipo_sistema', 'region', 'potencia_requerida_kw', 'paneles',
+    'kit_recomendado', 'subtotal', 'imprevistos', 'iva', 'total', 'error',
+]
+MAXIMO_FILAS_LOTE = 50000
+
+
+def leer_escenarios(contenido, formato='csv'):
+    """
+    Filas de entrada para cotizar_lote desde texto CSV (con encabezado) o JSON
+    (lista de objetos, o {'filas': [...]}). Columnas: consumo_kwh, tipo_sistema,
+    region y temporada (las dos últimas opcionales).
+    """
+    if formato == 'json':
+        datos = json.loads(contenido)
+        filas = datos.get('filas', []) if isinstance(datos, dict) else datos
+        if not isinstance(filas, list):
+            raise ValueError("Se esperaba una lista de escenarios.")
+        return filas
+    return list(csv.DictReader(io.StringIO(contenido.lstrip('\ufeff'))))
+
+
+def _precios_vector(np, opciones):
+    capacidades = np.array([o[0] for o in opciones], dtype=float)
+    precios = np.array([o[2] for o in opciones], dtype=float)
+    return capacidades, precios
+
+
+def _menor_que_cubre_vector(np, opciones, requerido):
+    """Versión vectorizada de _menor_que_cubre: (capacidad, precio) por fila."""
+    capacidades, precios = _precios_vector(np, opciones)
+    indice = np.minimum(np.searchsorted(capacidades, requerido, side='left'), len(capacidades) - 1)
+    return capacidades[indice], precios[indice]
+
+
+def _potencia_vector(np, consumo, horas):
+    """Versión vectorizada de potencia_para: (potencia kW, índice de banda o -1) por fila."""
+    bandas = tablas()['bandas']
+    if not bandas:
+        return consumo / (DIAS_MES * horas), np.full(len(consumo), -1)
+    equivalente = consumo * bandas[0]['horas_invierno'] / horas
+    topes = np.array([b['kwh_max'] for b in bandas], dtype=float)
+    potencias = np.array([b['kw'] for b in bandas], dtype=float)
+    indice = np.searchsorted(topes, equivalente, side='left')
+    dentro = indice < len(bandas)
+    potencia_kw = np.where(
+        dentro, potencias[np.minimum(indice, len(bandas) - 1)], potencias[-1] * equivalente / topes[-1]
+    )
+    return potencia_kw, np.where(dentro, indice, -1)
+
+
+def _subtotal_vector(np, precios, consumo, potencia_kw, offgrid):
+    """Mismo cálculo que dimensionar() para todas las filas de un tipo de sistema."""
+    panel_w, panel_precio = precios['paneles'][-1][0], precios['paneles'][-1][2]
+    paneles = np.maximum(1, np.ceil(potencia_kw * 1000 / panel_w))
+    potencia_instalada = paneles * panel_w / 1000
+    subtotal = paneles * panel_precio
+
+    inversores = precios['inversores_offgrid' if offgrid else 'inversores_ongrid']
+    if inversores:
+        capacidad, precio = _menor_que_cubre_vector(np, inversores, potencia_kw)
+        subtotal += np.maximum(1, np.ceil(potencia_kw / capacidad)) * precio
+
+    if offgrid and precios['baterias']:
+        capacidad, _, precio = precios['baterias'][-1]
+        respaldo_kwh = consumo / DIAS_MES * RESPALDO_BATERIAS
+        subtotal += np.maximum(1, np.ceil(respaldo_kwh / capacidad)) * precio
+
+    for categoria in ('materiales', 'mano_obra'):
+        if precios[categoria]:
+            subtotal += _menor_que_cubre_vector(np, precios[categoria], paneles)[1]
+
+    subtotal += precios['precios'].get('ay1', 0) * AYUDANTES_POR_INSTALACION
+
+    if not offgrid and precios['certificados']:
+        capacidad, precio = _menor_que_cubre_vector(np, precios['certificados'], potencia_instalada)
+        subtotal += np.maximum(1, np.ceil(potencia_instalada / capacidad)) * precio
+
+    return paneles, subtotal
+
+
+def cotizar_lote(filas):
+    """
+    Cotiza muchos escenarios de una vez con NumPy (una pasada por tipo de sistema).
+    Retorna una lista en el mismo orden que `filas`, con los mismos montos que
+    dimensionar(); las filas inválidas llevan 'error' en lugar de los montos.
+    """
+    import numpy as np
+
+    resultados = []
+    validas = []
+    horas_por_clave = {}
+    for numero, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict):
+            resultados.append({'fila': numero, 'error': "Cada escenario debe ser un objeto con consumo_kwh."})
+            continue
+        tipo = str(fila.get('tipo_sistema') or 'ongrid').strip().lower()
+        region = str(fila.get('region') or '').strip()
+        temporada = fila.get('temporada') or 'invierno'
+        if isinstance(temporada, str):
+            temporada = temporada.strip().lower()
+        resultado = {'fila': numero, 'consumo_kwh': fila.get('consumo_kwh'), 'tipo_sistema': tipo, 'region': region}
+        try:
+            consumo = float(fila.get('consumo_kwh'))
+        except (TypeError, ValueError):
+            consumo = None
+        if consumo is None or not math.isfinite(consumo) or not consumo > 0:
+            resultado['error'] = "El consumo mensual debe ser un número finito mayor que cero."
+        elif tipo not in TIPOS_SISTEMA:
+            resultado['error'] = f"Tipo de sistema desconocido: {tipo}"
+        elif temporada not in TEMPORADAS:
+            resultado['error'] = "La temporada debe ser 'invierno' o 'verano'."
+        else:
+            resultado['consumo_kwh'] = consumo
+            clave = (temporada, region)
+            if clave not in horas_por_clave:
+                horas_por_clave[clave] = horas_sol(*clave)
+            validas.append((len(resultados), consumo, tipo, horas_por_clave[clave]))
+        resultados.append(resultado)
+
+    if not validas:
+        return resultados
+
+    posicion = np.array([v[0] for v in validas])
+    consumo = np.array([v[1] for v in validas], dtype=float)
+    es_offgrid = np.array([v[2] == 'offgrid' for v in validas])
+    horas = np.array([v[3] for v in validas], dtype=float)
+
+    potencia_kw, indice_banda = _potencia_vector(np, consumo, horas)
+
+    paneles = np.zeros(len(validas))
+    subtotal = np.zeros(len(validas))
+    for tipo in TIPOS_SISTEMA:
+        mascara = es_offgrid if tipo == 'offgrid' else ~es_offgrid
+        if mascara.any():
+            paneles[mascara], subtotal[mascara] = _subtotal_vector(
+                np, tablas()[tipo], consumo[mascara], potencia_kw[mascara], tipo == 'offgrid'
+            )
+
+    imprevistos = np.round(subtotal * IMPREVISTOS_PORCENTAJE / 100)
+    iva = np.round(subtotal * settings.APP_CONFIG['IVA_PORCENTAJE'] / 100)
+    total = subtotal + imprevistos + iva
+
+    for i, pos in enumerate(posicion.tolist()):
+        tipo = resultados[pos]['tipo_sistema']
+        banda = tablas()['bandas'][indice_banda[i]] if indice_banda[i] >= 0 else None
+        resultados[pos].update({
+            'potencia_requerida_kw': round(float(potencia_kw[i]), 2),
+            'paneles': int(paneles[i]),
+            'kit_recomendado': id_kit(tipo, banda['kw']) if banda else None,
+            'subtotal': int(subtotal[i]),
+            'imprevistos': int(imprevistos[i]),
+            'iva': int(iva[i]),
+            'total': int(total[i]),
+        })
+    return resultados
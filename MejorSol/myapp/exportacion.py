@@ -0,0 +1,126 @@
+"""
+Exportación CSV (y JSON) en streaming.
+
+Las filas se leen de la base de datos por bloques (por_bloques) y se escriben
+a la respuesta a medida que se generan, así la memoria del worker no crece con
+el tamaño del catálogo o del historial. No se usa queryset.iterator(): con
+mysqlclient el resultado completo se trae al cliente igual, sin cursor del lado
+del servidor, y la memoria crecería con la exportación.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .paginacion import despues_de
+
+TAMANO_BLOQUE = 2000
+
+
+def por_bloques(queryset, tamano=TAMANO_BLOQUE):
+    """
+    Recorre `queryset` en su orden con una consulta de `tamano` filas por bloque
+    que retoma después de la última fila leída (keyset), sin OFFSET. Se agrega la
+    pk al orden para desempatar; los campos del orden (o anotaciones) no deben
+    tener NULL.
+    """
+    orden = [campo for campo in queryset.query.order_by if isinstance(campo, str)] or ['pk']
+    if orden[-1].lstrip('-') not in ('pk', 'id'):
+        orden.append('-pk' if orden[-1].startswith('-') else 'pk')
+    queryset = queryset.order_by(*orden)
+    campos = [campo.lstrip('-') for campo in orden]
+
+    bloque = list(queryset[:tamano])
+    while bloque:
+        yield from bloque
+        if len(bloque) < tamano:
+            return
+        ultimo = bloque[-1]
+        bloque = list(queryset.filter(despues_de(orden, [getattr(ultimo, c) for c in campos]))[:tamano])
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: retorna la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(nombre_archivo, encabezados, filas):
+    """StreamingHttpResponse con `encabezados` seguido de cada fila del iterable `filas`."""
+    writer = csv.writer(_Eco())
+
+    def lineas():
+        yield writer.writerow(encabezados)
+        for fila in filas:
+            yield writer.writerow(fila)
+
+    response = StreamingHttpResponse(lineas(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def respuesta_json_streaming(nombre_archivo, clave, elementos):
+    """StreamingHttpResponse con {"<clave>": [...]} escrito elemento por elemento."""
+    def partes():
+        yield f'{{{json.dumps(clave)}: ['
+        for i, elemento in enumerate(elementos):
+            yield (',' if i else '') + json.dumps(elemento, ensure_ascii=False, cls=DjangoJSONEncoder)
+        yield ']}'
+
+    response = StreamingHttpResponse(partes(), content_type='application/json')
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    return response
+
+
+def exportar_inventario(queryset):
+    def filas():
+        for producto in por_bloques(queryset.select_related('categoria')):
+            estado = 'OK'
+            if producto.stock <= producto.stock_minimo: estado = 'BAJO STOCK'
+            elif not producto.activo: estado = 'INACTIVO'
+            yield [
+                producto.sku, producto.nombre,
+                producto.categoria.nombre if producto.categoria else '',
+                producto.stock, producto.stock_minimo, producto.precio, estado
+            ]
+    return respuesta_csv(
+        'inventario.csv',
+        ['SKU', 'Producto', 'Categoría', 'Stock', 'Stock Mínimo', 'Precio', 'Estado'],
+        filas(),
+    )
+
+
+def exportar_cotizaciones(queryset):
+    def filas():
+        chats = queryset.select_related('cliente', 'producto', 'admin_asignado')
+        for chat in por_bloques(chats):
+            yield [
+                chat.id, chat.cliente.username, chat.cliente_nombre_dato or '',
+                chat.cliente_email_dato or '', chat.producto.nombre, chat.get_estado_display(),
+                chat.admin_asignado.username if chat.admin_asignado else '',
+                chat.fecha_creacion.isoformat(), chat.fecha_actualizacion.isoformat(),
+            ]
+    return respuesta_csv(
+        'historial_cotizaciones.csv',
+        ['ID', 'Cliente', 'Nombre', 'Email', 'Producto', 'Estado', 'Asignado a', 'Creada', 'Actualizada'],
+        filas(),
+    )
+
+
+def exportar_productos_adquiridos(queryset):
+    def filas():
+        adquiridos = queryset.select_related('cliente', 'producto')
+        for item in por_bloques(adquiridos):
+            yield [
+                item.cliente.username, item.producto.sku, item.producto.nombre, item.cantidad,
+                item.precio_adquisicion, item.fecha_compra, item.fecha_instalacion or '',
+                item.garantia_meses, item.get_estado_garantia_display(),
+            ]
+    return respuesta_csv(
+        'productos_adquiridos.csv',
+        ['Cliente', 'SKU', 'Producto', 'Cantidad', 'Precio', 'Fecha Compra', 'Fecha Instalación',
+         'Garantía (meses)', 'Estado Garantía'],
+        filas(),
+    )
@@ -0,0 +1,226 @@
+"""
+Asistente que toma los datos de una cotización en el chat (nombre, email,
+teléfono, región/comuna y detalle del proyecto).
+
+El paso actual se guarda en ChatCotizacion.paso_intake y cada paso se describe
+en PASOS, así agregar o reordenar preguntas es editar la tabla. Que ya respondió
+alguien del equipo se lee de ChatCotizacion.staff_unido (lo marca una señal en
+models.py). Cada mensaje del cliente se resuelve con el chat ya cargado y, a lo
+más, un UPDATE de las columnas que cambiaron.
+
+Los mensajes del bot los firma un usuario dedicado (settings.CHAT_BOT_USERNAME)
+que se busca una vez por proceso; el mensaje del cliente y la respuesta del bot
+se guardan juntos con crear_mensajes() (en una transacción).
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Perfil
+
+PASO_INICIAL = 'nombre'
+PASO_COMPLETO = 'completo'
+PREFIJO_CONFIRMAR = 'confirmar_'
+
+MAXIMO_CARACTERES = 500
+AFIRMACIONES = {'si', 'sí', 'ok', 'yes', 'correcto'}
+NEGACIONES = {'no', 'negativo', 'cambiar', 'corregir'}
+
+
+def _nombre_perfil(usuario):
+    return f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username
+
+
+def _email_perfil(usuario):
+    return usuario.email
+
+
+def _telefono_perfil(usuario):
+    perfil = getattr(usuario, 'perfil', None)
+    return getattr(perfil, 'telefono', '')
+
+
+# Cada paso: campo del chat donde queda el dato, dato del perfil para ofrecer
+# confirmación (opcional), pregunta, validación y paso siguiente.
+PASOS = {
+    'nombre': {
+        'campo': 'cliente_nombre_dato',
+        'perfil': _nombre_perfil,
+        'pregunta': "Por favor, ingresa el nombre y apellido.",
+        'confirmar': "Tu nombre registrado es **{}**. ¿Es correcto para esta cotización? (Sí/No)",
+        'corregir': "De acuerdo. Por favor, ingresa el nombre y apellido.",
+        'valido': lambda texto: len(texto) >= 5 and re.search(r'\s', texto),
+        'invalido': "Por favor, ingresa el nombre y apellido completo.",
+        'listo': "¡Genial, {}! ",
+        'siguiente': 'email',
+    },
+    'email': {
+        'campo': 'cliente_email_dato',
+        'perfil': _email_perfil,
+        'pregunta': "¿Cuál es tu correo electrónico?",
+        'confirmar': "Tu correo registrado es **{}**. ¿Es correcto? (Sí/No)",
+        'corregir': "Por favor, ingresa el correo electrónico (ej: tu@correo.com).",
+        'valido': lambda texto: re.match(r"[^@]+@[^@]+\.[^@]+", texto),
+        'invalido': "Correo no válido. Por favor, ingresa un email (ej: tu@correo.com).",
+        'listo': "Perfecto. ",
+        'siguiente': 'telefono',
+    },
+    'telefono': {
+        'campo': 'cliente_telefono_dato',
+        'perfil': _telefono_perfil,
+        'pregunta': "¿Cuál es tu número de teléfono?",
+        'confirmar': "Tu teléfono registrado es **{}**. ¿Es correcto? (Sí/No)",
+        'corregir': "Por favor, ingresa el número de teléfono.",
+        'valido': lambda texto: re.search(r'(\d.*){8,}', texto),
+        'invalido': "Teléfono no válido (ej: +56 9 1234 5678).",
+        'listo': "¡Gracias! ",
+        'siguiente': 'region',
+    },
+    'region': {
+        'campo': 'cliente_rut_dato',
+        'pregunta': "Indícame la **Región y Comuna**.",
+        'valido': lambda texto: len(texto) >= 5,
+        'invalido': "Necesitamos la Región y Comuna para evaluar logística.",
+        'listo': "¡Excelente! ",
+        'siguiente': 'detalle',
+    },
+    'detalle': {
+        'campo': 'cliente_mensaje_dato',
+        'pregunta': "Finalmente, ¿podrías darme **más detalles de tu proyecto**?",
+        'valido': lambda texto: len(texto) >= 10,
+        'invalido': "Por favor, dame un poco más de detalle sobre tu proyecto.",
+        'listo': "¡Muchas gracias! Tu solicitud está completa. Un vendedor revisará la información y te contactará pronto.",
+        'siguiente': PASO_COMPLETO,
+    },
+}
+
+
+def _entrar(chat, paso, usuario, cambios):
+    """Deja el chat en `paso` y retorna lo que el bot debe preguntar."""
+    if paso == PASO_COMPLETO:
+        chat.paso_intake = paso
+        chat.estado = 'en_proceso'
+        cambios.update({'paso_intake', 'estado'})
+        return ''
+    definicion = PASOS[paso]
+    dato_perfil = definicion['perfil'](usuario) if 'perfil' in definicion else None
+    if dato_perfil and str(dato_perfil).strip() not in ('', 'None'):
+        chat.paso_intake = PREFIJO_CONFIRMAR + paso
+        cambios.add('paso_intake')
+        return definicion['confirmar'].format(dato_perfil)
+    chat.paso_intake = paso
+    cambios.add('paso_intake')
+    return definicion['pregunta']
+
+
+def _guardar_dato(chat, paso, valor, usuario, cambios, listo):
+    definicion = PASOS[paso]
+    setattr(chat, definicion['campo'], valor)
+    cambios.add(definicion['campo'])
+    return listo.format(valor) + _entrar(chat, definicion['siguiente'], usuario, cambios)
+
+
+def _avanzar(chat, texto, usuario, cambios):
+    paso = chat.paso_intake
+    if paso == 'inicio':
+        return _entrar(chat, PASO_INICIAL, usuario, cambios)
+
+    if paso.startswith(PREFIJO_CONFIRMAR):
+        paso = paso[len(PREFIJO_CONFIRMAR):]
+        definicion = PASOS[paso]
+        respuesta = texto.lower().strip()
+        if respuesta in AFIRMACIONES:
+            return _guardar_dato(chat, paso, definicion['perfil'](usuario), usuario, cambios, definicion['listo'])
+        chat.paso_intake = paso
+        cambios.add('paso_intake')
+        if respuesta in NEGACIONES:
+            return definicion['corregir']
+        # Ni sí ni no: se toma el mensaje como el dato nuevo
+
+    definicion = PASOS[paso]
+    if not definicion['valido'](texto):
+        return definicion['invalido']
+    return _guardar_dato(chat, paso, texto, usuario, cambios, definicion['listo'])
+
+
+def procesar_respuesta_bot(chat, ultimo_mensaje_cliente, usuario=None):
+    """
+    Avanza el asistente con el mensaje del cliente y retorna la respuesta del
+    bot, o None si no corresponde responder (datos completos o ya respondió el equipo).
+    `usuario` es el cliente del chat si ya está cargado (evita la consulta de chat.cliente).
+    """
+    if chat.paso_intake == PASO_COMPLETO:
+        return None
+    if chat.staff_unido:
+        if chat.estado == 'pendiente':
+            chat.estado = 'en_proceso'
+            chat.save(update_fields=['estado', 'fecha_actualizacion'])
+        return None
+    if len(ultimo_mensaje_cliente) > MAXIMO_CARACTERES:
+        return f"Tu mensaje es muy largo (máximo {MAXIMO_CARACTERES} caracteres). Por favor, sé más breve."
+    if len(ultimo_mensaje_cliente) < 2:
+        return "No entendí tu respuesta. Por favor, intenta de nuevo."
+
+    cambios = set()
+    respuesta = _avanzar(chat, ultimo_mensaje_cliente, usuario or chat.cliente, cambios)
+    if cambios:
+        chat.save(update_fields=sorted(cambios | {'fecha_actualizacion'}))
+    return respuesta
+
+
+# ===========================
+# USUARIO BOT Y ESCRITURA DE MENSAJES
+# ===========================
+
+_bot = None
+_bot_lock = threading.Lock()
+
+
+def _crear_bot():
+    bot, creado = User.objects.get_or_create(
+        username=settings.CHAT_BOT_USERNAME,
+        defaults={'first_name': 'Asistente', 'last_name': 'Virtual', 'is_active': False},
+    )
+    if creado:
+        bot.set_unusable_password()
+        bot.save(update_fields=['password'])
+        # El perfil se crea como 'cliente' (señal de User); el bot no cuenta como cliente
+        perfil, _ = Perfil.objects.get_or_create(usuario=bot)
+        perfil.tipo_usuario = 'admin'
+        perfil.save()
+    return bot
+
+
+def obtener_bot():
+    """Usuario autor de los mensajes del bot. Se resuelve una vez por proceso."""
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                _bot = _crear_bot()
+    return _bot
+
+
+def olvidar_bot(usuario=None):
+    """Descarta el bot en memoria si `usuario` es el bot (o siempre, sin argumento)."""
+    global _bot
+    bot = _bot
+    if usuario is None or usuario.username == settings.CHAT_BOT_USERNAME or (bot is not None and usuario.pk == bot.pk):
+        _bot = None
+
+
+def crear_mensajes(chat, mensajes):
+    """
+    Guarda los MensajeCotizacion de `chat` en una transacción y retorna la lista
+    con sus ids. Es un save() por mensaje y corren las señales de models.py
+    (aviso en tiempo_real y staff_unido): en Django 3.2 ni MySQL ni SQLite
+    devuelven los ids de un INSERT múltiple, y leerlos de vuelta no es seguro
+    con chats concurrentes.
+    """
+    with transaction.atomic():
+        for mensaje in mensajes:
+            mensaje.save()
+    return mensajes
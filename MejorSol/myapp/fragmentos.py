@@ -0,0 +1,75 @@
+"""
+Fragmentos de plantilla en caché ({% cache %} de django.templatetags.cache).
+
+Las partes que solo dependen de los datos (grilla del catálogo, bloques de datos
+de los gráficos, selectores de categoría) se guardan con la versión de su grupo
+en la clave:
+
+    {% cache fragmentos.ttl 'inventario_categorias' fragmentos.categorias %}
+
+Las señales de models.py cambian la versión del grupo con invalidar(); el
+fragmento se vuelve a renderizar en la siguiente petición y las entradas
+anteriores vencen solas. Para que un acierto no consulte la BD, las vistas
+pasan los datos de esos fragmentos como QuerySet o SimpleLazyObject.
+
+Grupos:
+- 'catalogo': catálogo del dashboard de clientes (ver catalogo.py)
+- 'categorias': selectores de categoría (Categoria)
+- 'reportes': KPIs y datos de los gráficos de reportes_graficos
+  (ChatCotizacion, Producto y las series de pronosticos.py)
+
+busqueda.py usa el mismo mecanismo (grupo 'busqueda') para su índice en memoria.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+
+def cache_compartida():
+    """True si la caché por defecto la ven todos los workers (no es LocMemCache ni DummyCache)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def version(grupo):
+    clave = f"{grupo}:version"
+    actual = cache.get(clave)
+    if actual is None:
+        # Valor nuevo (no 1): si la clave se perdió, no se reutilizan fragmentos viejos
+        cache.add(clave, time.time_ns(), None)
+        actual = cache.get(clave)
+    return actual
+
+
+def invalidar(*grupos):
+    ahora = time.time_ns()
+    cache.set_many({f"{grupo}:version": ahora for grupo in grupos}, None)
+
+
+class VersionesFragmentos:
+    """Versiones para las claves de {% cache %}; cada una se lee solo si la plantilla la usa."""
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'FRAGMENTOS_CACHE_SEGUNDOS', 60 * 60)
+
+    @property
+    def catalogo(self):
+        return version('catalogo')
+
+    @property
+    def categorias(self):
+        return version('categorias')
+
+    @property
+    def reportes(self):
+        # Las ventanas de los pronósticos se mueven con el día aunque no haya cambios
+        return f"{version('reportes')}-{timezone.localdate().isoformat()}"
+
+
+def contexto(request):
+    """Context processor: `fragmentos` en todas las plantillas."""
+    return {'fragmentos': VersionesFragmentos()}
@@ -0,0 +1,143 @@
+"""
+Miniaturas de las imágenes de producto (ProductoImagen).
+
+Al subir una imagen (formulario de inventario o inline del admin) la señal de
+models.py encola generar_variantes() para después del commit. Las variantes se
+generan con Pillow en WebP y JPEG a los anchos de settings.MINIATURAS_ANCHOS y
+se guardan junto al original con el hash del contenido en el nombre
+(productos/<sku>/<hash>_320.webp): el nombre cambia si cambia la imagen, así
+que se pueden servir con caché larga. Los nombres quedan en
+ProductoImagen.variantes y las plantillas los leen con srcset()/miniatura_url().
+
+El trabajo corre en un pool de hilos del proceso (MINIATURAS_EN_SEGUNDO_PLANO);
+sin él (tests, comando generar_miniaturas) se hace en el momento.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+FORMATOS = {
+    # formato -> (formato de Pillow, extensión, opciones de guardado)
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _anchos():
+    return sorted(getattr(settings, 'MINIATURAS_ANCHOS', (160, 320, 640)))
+
+
+def hash_contenido(archivo):
+    """sha256 (primeros 16 hex) del contenido de `archivo`, leído por bloques."""
+    digest = hashlib.sha256()
+    archivo.seek(0)
+    for bloque in iter(lambda: archivo.read(1024 * 1024), b''):
+        digest.update(bloque)
+    archivo.seek(0)
+    return digest.hexdigest()[:16]
+
+
+def _codificar(imagen, formato):
+    formato_pil, _, opciones = FORMATOS[formato]
+    salida = BytesIO()
+    imagen.save(salida, formato_pil, **opciones)
+    return salida.getvalue()
+
+
+def _preparar(imagen):
+    """Aplica la orientación EXIF y deja la imagen en RGB (JPEG no admite transparencia)."""
+    from PIL import Image, ImageOps
+
+    imagen = ImageOps.exif_transpose(imagen)
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def generar_variantes(imagen_id):
+    """
+    Genera (o reutiliza, si ya existen con el mismo hash) las miniaturas de una
+    ProductoImagen y guarda sus nombres en `variantes`. Retorna el dict guardado
+    o None si la imagen ya no existe.
+    """
+    from PIL import Image
+
+    from .models import ProductoImagen
+
+    producto_imagen = ProductoImagen.objects.filter(pk=imagen_id).first()
+    if producto_imagen is None or not producto_imagen.imagen:
+        return None
+    almacenamiento = producto_imagen.imagen.storage
+    original = producto_imagen.imagen.name
+
+    with almacenamiento.open(original, 'rb') as archivo:
+        huella = hash_contenido(archivo)
+        imagen = _preparar(Image.open(archivo))
+    carpeta = os.path.dirname(original)
+
+    variantes = {'original': original, 'hash': huella, 'ancho': imagen.width}
+    for formato, (_, extension, _) in FORMATOS.items():
+        variantes[formato] = {}
+        for ancho in _anchos():
+            nombre = f"{carpeta}/{huella}_{ancho}.{extension}" if carpeta else f"{huella}_{ancho}.{extension}"
+            if not almacenamiento.exists(nombre):
+                alto = max(1, round(imagen.height * min(ancho, imagen.width) / imagen.width))
+                reducida = imagen.resize((min(ancho, imagen.width), alto), Image.LANCZOS)
+                nombre = almacenamiento.save(nombre, ContentFile(_codificar(reducida, formato)))
+            variantes[formato][str(ancho)] = nombre
+            if ancho >= imagen.width:
+                break  # no se agrandan imágenes chicas: la última variante queda al ancho original
+
+    # update() y no save(): no vuelve a disparar la señal
+    if ProductoImagen.objects.filter(pk=imagen_id, imagen=original).update(variantes=variantes):
+        from .catalogo import invalidar
+        invalidar()  # el catálogo guarda las URLs de las miniaturas
+    return variantes
+
+
+logger = logging.getLogger(__name__)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _generar(imagen_id):
+    try:
+        generar_variantes(imagen_id)
+    except Exception as e:
+        logger.warning("Error generando miniaturas de la imagen %s: %s", imagen_id, e)
+
+
+def _generar_en_hilo(imagen_id):
+    try:
+        _generar(imagen_id)
+    finally:
+        # El hilo del pool abre su propia conexión: se cierra al terminar
+        connections.close_all()
+
+
+def encolar(imagen_id):
+    """Genera las variantes después del commit, en segundo plano si está configurado."""
+    def lanzar():
+        global _pool
+        if not getattr(settings, 'MINIATURAS_EN_SEGUNDO_PLANO', True):
+            _generar(imagen_id)
+            return
+        if _pool is None:
+            with _pool_lock:
+                if _pool is None:
+                    _pool = ThreadPoolExecutor(
+                        max_workers=getattr(settings, 'MINIATURAS_HILOS', 2), thread_name_prefix='miniaturas'
+                    )
+        _pool.submit(_generar_en_hilo, imagen_id)
+
+    transaction.on_commit(lanzar)
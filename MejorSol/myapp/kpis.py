@@ -0,0 +1,96 @@
+"""
+KPIs del dashboard de administración (admin_panel).
+
+Los cuatro KPIs viven en una sola fila de DashboardSnapshot. Las señales de
+ChatCotizacion, Producto y Perfil (models.py) la ajustan con UPDATE ... SET
+campo = campo + delta, así leerlos cuesta una consulta en lugar de recorrer
+las tablas. Las operaciones que no disparan señales (queryset.update(),
+bulk_create) se corrigen con `python manage.py reconciliar_kpis` (cron).
+"""
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ChatCotizacion, DashboardSnapshot, Perfil, Producto
+
+SNAPSHOT_ID = 1
+
+
+def _mes(fecha_hora=None):
+    """Primer día del mes (hora local) de `fecha_hora`, o del mes actual."""
+    return timezone.localtime(fecha_hora).date().replace(day=1)
+
+
+def calcular_kpis():
+    """Calcula los KPIs recorriendo las tablas (solo para reconciliar)."""
+    mes = _mes()
+    return {
+        'mes': mes,
+        'cotizaciones_mes': ChatCotizacion.objects.filter(
+            fecha_creacion__year=mes.year, fecha_creacion__month=mes.month
+        ).count(),
+        'total_productos': Producto.objects.count(),
+        'total_clientes': Perfil.objects.filter(tipo_usuario='cliente').count(),
+        'stock_total': Producto.objects.aggregate(total=Sum('stock'))['total'] or 0,
+    }
+
+
+def reconciliar():
+    """Recalcula el snapshot completo y lo guarda."""
+    snapshot, _ = DashboardSnapshot.objects.update_or_create(
+        pk=SNAPSHOT_ID, defaults={**calcular_kpis(), 'fecha_actualizacion': timezone.now()}
+    )
+    return snapshot
+
+
+def obtener_snapshot():
+    """Lee el snapshot; si no existe o cambió el mes, lo recalcula."""
+    snapshot = DashboardSnapshot.objects.filter(pk=SNAPSHOT_ID).first()
+    if snapshot is None or snapshot.mes != _mes():
+        snapshot = reconciliar()
+    return snapshot
+
+
+def como_dict(snapshot):
+    return {
+        'kpi_cotizaciones_mes': snapshot.cotizaciones_mes,
+        'kpi_total_productos': snapshot.total_productos,
+        'kpi_total_clientes': snapshot.total_clientes,
+        'kpi_stock_total': snapshot.stock_total,
+        'actualizado': snapshot.fecha_actualizacion.isoformat(),
+    }
+
+
+def _ajustar(filtro=None, **deltas):
+    deltas = {campo: F(campo) + delta for campo, delta in deltas.items() if delta}
+    if deltas:
+        DashboardSnapshot.objects.filter(pk=SNAPSHOT_ID, **(filtro or {})).update(
+            fecha_actualizacion=timezone.now(), **deltas
+        )
+
+
+def registrar_guardado(instance, created):
+    if isinstance(instance, ChatCotizacion):
+        if created:
+            _ajustar({'mes': _mes(instance.fecha_creacion)}, cotizaciones_mes=1)
+    elif isinstance(instance, Producto):
+        anterior = 0 if created else instance._kpi_inicial
+        if anterior is not None:
+            _ajustar(total_productos=int(created), stock_total=instance.stock - anterior)
+        instance._kpi_inicial = instance.stock
+    elif isinstance(instance, Perfil):
+        if not created and instance._kpi_inicial is None:
+            return  # tipo_usuario no se cargó (only/defer): lo corrige la reconciliación
+        era_cliente = not created and instance._kpi_inicial == 'cliente'
+        es_cliente = instance.tipo_usuario == 'cliente'
+        _ajustar(total_clientes=int(es_cliente) - int(era_cliente))
+        instance._kpi_inicial = instance.tipo_usuario
+
+
+def registrar_eliminado(instance):
+    if isinstance(instance, ChatCotizacion):
+        _ajustar({'mes': _mes(instance.fecha_creacion)}, cotizaciones_mes=-1)
+    elif isinstance(instance, Producto):
+        _ajustar(total_productos=-1, stock_total=-instance.stock)
+    elif isinstance(instance, Perfil):
+        if instance.tipo_usuario == 'cliente':
+            _ajustar(total_clientes=-1)
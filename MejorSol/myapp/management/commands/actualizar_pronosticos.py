@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from myapp.pronosticos import actualizar_pronosticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrega los días nuevos a las series de reportes y reajusta las predicciones. "
+        "Pensado para ejecutarse periódicamente (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo', action='store_true',
+            help='Reconstruye toda la ventana en lugar de solo los días nuevos.'
+        )
+
+    def handle(self, *args, **options):
+        resultado = actualizar_pronosticos(completo=options['completo'])
+        for serie, dias in resultado.items():
+            self.stdout.write(f"  {serie}: {dias} día(s) actualizados")
+        self.stdout.write(self.style.SUCCESS("Pronósticos actualizados."))
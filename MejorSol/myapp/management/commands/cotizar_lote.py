@@ -0,0 +1,49 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.dimensionamiento import COLUMNAS_RESULTADO_LOTE, cotizar_lote, leer_escenarios
+
+
+class Command(BaseCommand):
+    help = (
+        "Cotiza un archivo CSV o JSON de escenarios (consumo_kwh, tipo_sistema, region, temporada) "
+        "con las tablas de myapp/data y escribe subtotal, IVA y total por fila."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con encabezado o JSON (lista de objetos).')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto, la consola).')
+        parser.add_argument('--formato', choices=['csv', 'json'], default='csv', help='Formato de salida.')
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                filas = leer_escenarios(f.read(), 'json' if ruta.lower().endswith('.json') else 'csv')
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+
+        inicio = time.perf_counter()
+        resultados = cotizar_lote(filas)
+        duracion = time.perf_counter() - inicio
+
+        salida = open(options['salida'], 'w', newline='', encoding='utf-8') if options['salida'] else sys.stdout
+        try:
+            if options['formato'] == 'json':
+                json.dump(resultados, salida, ensure_ascii=False, indent=2)
+            else:
+                writer = csv.DictWriter(salida, fieldnames=COLUMNAS_RESULTADO_LOTE, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(resultados)
+        finally:
+            if salida is not sys.stdout:
+                salida.close()
+
+        errores = sum(1 for r in resultados if 'error' in r)
+        self.stderr.write(self.style.SUCCESS(
+            f"{len(resultados)} escenario(s) cotizados en {duracion:.3f} s ({errores} con error)."
+        ))
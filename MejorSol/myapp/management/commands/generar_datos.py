@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.datos_sinteticos import TAMANO_LOTE, Generador, despues_de_generar, limpiar
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos (clientes, productos, cotizaciones, mensajes y compras) con bulk_create "
+        "por lotes, para pruebas de carga de las vistas de administración y reportes. Reemplaza cargar_datos.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=1000)
+        parser.add_argument('--productos', type=int, default=200)
+        parser.add_argument('--cotizaciones', type=int, default=5000)
+        parser.add_argument('--mensajes', type=int, default=4, help='Mensajes promedio por cotización.')
+        parser.add_argument('--dias', type=int, default=365, help='Días de historia hacia atrás desde hoy.')
+        parser.add_argument('--semilla', type=int, default=1, help='Misma semilla, mismos datos.')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por INSERT.')
+        parser.add_argument('--clave', default='demo1234', help='Contraseña de todos los clientes generados.')
+        parser.add_argument('--limpiar', action='store_true', help='Borra los datos sintéticos anteriores antes de generar.')
+
+    def handle(self, *args, **options):
+        if min(options['clientes'], options['productos'], options['dias'], options['lote']) < 1 or options['cotizaciones'] < 0:
+            raise CommandError("--clientes, --productos, --dias y --lote deben ser mayores que cero.")
+
+        if options['limpiar']:
+            limpiar(actualizar=False)
+            self.stdout.write("  datos sintéticos anteriores borrados")
+
+        generador = Generador(
+            dias=options['dias'], semilla=options['semilla'], clave=options['clave'], tamano_lote=options['lote'],
+        )
+        inicio = time.perf_counter()
+        productos = generador.productos(options['productos'])
+        self.stdout.write(f"  productos: {len(productos)} ({time.perf_counter() - inicio:.1f} s)")
+        clientes = generador.clientes(options['clientes'])
+        self.stdout.write(f"  clientes: {len(clientes)} ({time.perf_counter() - inicio:.1f} s)")
+        creados = generador.cotizaciones(options['cotizaciones'], clientes, productos, options['mensajes'])
+        self.stdout.write(
+            f"  cotizaciones: {creados['cotizaciones']} mensajes: {creados['mensajes']} "
+            f"compras: {creados['adquiridos']} ({time.perf_counter() - inicio:.1f} s)"
+        )
+
+        despues_de_generar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos generados en {time.perf_counter() - inicio:.1f} s (KPIs, contadores y pronósticos actualizados)."
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from myapp.imagenes import generar_variantes
+from myapp.models import ProductoImagen
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las miniaturas WebP/JPEG de las imágenes de producto que aún no las tienen "
+        "(imágenes subidas antes del pipeline o cuyo trabajo en segundo plano falló)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regenera también las que ya tienen miniaturas.')
+
+    def handle(self, *args, **options):
+        generadas = errores = 0
+        for producto_imagen in ProductoImagen.objects.only('id', 'imagen', 'variantes').iterator():
+            if not producto_imagen.imagen:
+                continue
+            if not options['todas'] and producto_imagen.variantes.get('original') == producto_imagen.imagen.name:
+                continue
+            try:
+                generar_variantes(producto_imagen.pk)
+                generadas += 1
+            except Exception as e:
+                errores += 1
+                self.stderr.write(f"  imagen {producto_imagen.pk} ({producto_imagen.imagen.name}): {e}")
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas generadas para {generadas} imagen(es), {errores} con error."))
@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import engines
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from myapp import fragmentos, views
+
+# plantilla -> (nombre de ruta, vista, rol)
+PLANTILLAS = {
+    'cliente/client_dashboard.html': ('client_dashboard', views.client_dashboard, 'cliente'),
+    'admin/control_inventario.html': ('control_inventario', views.control_inventario_view, 'admin'),
+    'admin/reportes_graficos.html': ('reportes_graficos', views.reportes_graficos_view, 'admin'),
+}
+
+
+def _en_frio():
+    """Deja todo como antes de las cachés: plantillas sin compilar y fragmentos vencidos."""
+    for cargador in engines['django'].engine.template_loaders:
+        if hasattr(cargador, 'reset'):
+            cargador.reset()
+    fragmentos.invalidar('catalogo', 'categorias', 'reportes')
+
+
+def medir(ruta, vista, usuario, repeticiones, frio):
+    """Mediana de ms y consultas por petición; `frio` vacía las cachés antes de cada una."""
+    fabrica = RequestFactory()
+    tiempos, consultas = [], []
+    vista(_peticion(fabrica, ruta, usuario))  # calentamiento (imports, conexión)
+    for _ in range(repeticiones):
+        if frio:
+            _en_frio()
+        request = _peticion(fabrica, ruta, usuario)
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            response = vista(request)
+            tiempos.append(time.perf_counter() - inicio)
+        if response.status_code != 200:
+            raise CommandError(f"{ruta} respondió {response.status_code}")
+        consultas.append(len(capturadas))
+    return statistics.median(tiempos) * 1000, statistics.median(consultas)
+
+
+def _peticion(fabrica, ruta, usuario):
+    request = fabrica.get(reverse(ruta))
+    request.user = usuario
+    return request
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo de render (mediana, ms) y las consultas de client_dashboard, control_inventario "
+        "y reportes_graficos sin cachés de plantillas (antes) y con el cached loader y los fragmentos "
+        "en caché (después)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        usuarios = {
+            'admin': User.objects.filter(is_staff=True, is_active=True).first(),
+            'cliente': User.objects.filter(is_staff=False, is_active=True, perfil__tipo_usuario='cliente').first(),
+        }
+        if not all(usuarios.values()):
+            raise CommandError("Se necesita al menos un usuario staff y un cliente activos.")
+
+        cargadores = [type(c).__module__ for c in engines['django'].engine.template_loaders]
+        self.stdout.write(f"Cargadores: {', '.join(cargadores)}  repeticiones: {options['repeticiones']}")
+        self.stdout.write(f"{'plantilla':<32} {'antes ms':>9} {'después ms':>11} {'consultas':>12}")
+        for plantilla, (ruta, vista, rol) in PLANTILLAS.items():
+            antes, consultas_antes = medir(ruta, vista, usuarios[rol], options['repeticiones'], frio=True)
+            despues, consultas_despues = medir(ruta, vista, usuarios[rol], options['repeticiones'], frio=False)
+            self.stdout.write(
+                f"{plantilla:<32} {antes:>9.1f} {despues:>11.1f} {consultas_antes:>5g} -> {consultas_despues:<4g}"
+            )
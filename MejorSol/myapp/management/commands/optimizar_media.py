@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.optimizacion_media import optimizar, ruta_control_por_defecto
+
+
+def _mb(cantidad):
+    return f"{cantidad / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Deduplica (por hash de contenido) y recomprime las imágenes de MEDIA_ROOT/productos/ y "
+        "MEDIA_ROOT/cotizaciones_img/, reapuntando las referencias en la BD. Se puede interrumpir "
+        "y retomar: el avance queda en el archivo de control."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, help='Procesos del pool (por defecto, uno por CPU).')
+        parser.add_argument('--lote', type=int, help='Máximo de archivos a procesar en esta ejecución.')
+        parser.add_argument('--control', default=ruta_control_por_defecto(), help='Archivo de control (JSON).')
+        parser.add_argument('--umbral-kb', type=int, default=500, help='Recomprime las imágenes sobre este tamaño.')
+        parser.add_argument('--lado-maximo', type=int, default=2560, help='Lado máximo en px al recomprimir.')
+        parser.add_argument('--calidad', type=int, default=85, help='Calidad JPEG/WebP al recomprimir.')
+        parser.add_argument('--simular', action='store_true', help='Solo informa; no cambia archivos ni la BD.')
+
+    def handle(self, *args, **options):
+        resumen = optimizar(
+            str(settings.MEDIA_ROOT), ruta_control=options['control'], procesos=options['procesos'],
+            lote=options['lote'], umbral_bytes=options['umbral_kb'] * 1024, lado_maximo=options['lado_maximo'],
+            calidad=options['calidad'], simular=options['simular'], informar=self.stdout.write,
+        )
+        self.stdout.write(
+            f"  archivos revisados: {resumen['hasheados']}  duplicados: {resumen['duplicados']} "
+            f"(filas reapuntadas: {resumen['filas_reapuntadas']})  recomprimidos: {resumen['recomprimidos']}  "
+            f"errores: {resumen['errores']}"
+        )
+        prefijo = "Se ahorrarían" if options['simular'] else "Ahorro"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}: {_mb(resumen['ahorro_total'])} (duplicados {_mb(resumen['ahorro_duplicados'])}, "
+            f"recompresión {_mb(resumen['ahorro_recompresion'])})."
+        ))
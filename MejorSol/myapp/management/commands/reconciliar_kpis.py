@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from myapp.kpis import reconciliar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde cero los KPIs del dashboard (DashboardSnapshot). "
+        "Corrige cambios que no disparan señales (update masivo, bulk_create); pensado para cron."
+    )
+
+    def handle(self, *args, **options):
+        snapshot = reconciliar()
+        self.stdout.write(
+            f"  cotizaciones_mes={snapshot.cotizaciones_mes} productos={snapshot.total_productos} "
+            f"clientes={snapshot.total_clientes} stock={snapshot.stock_total}"
+        )
+        self.stdout.write(self.style.SUCCESS("KPIs reconciliados."))
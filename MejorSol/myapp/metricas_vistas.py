@@ -0,0 +1,159 @@
+"""
+Medición por petición: tiempo total, número de consultas y tiempo en BD.
+
+MetricasPeticionesMiddleware (activo con settings.METRICAS_PETICIONES) mide cada
+petición con connection.execute_wrapper, agrega el encabezado Server-Timing
+(visible en la pestaña Network del navegador) y guarda la muestra bajo el
+nombre de la ruta. En ASGI el middleware corre como corrutina y el wrapper se
+instala en la conexión del hilo donde se ejecutan las vistas síncronas. Por vista se conservan las últimas METRICAS_PETICIONES_MUESTRAS
+muestras, de donde salen p50/p95/p99 (api/metricas/vistas/, solo admin).
+
+Desactivado, el middleware lanza MiddlewareNotUsed y Django lo saca de la
+cadena: no queda ningún costo por petición. Las métricas son de este proceso;
+con varios workers cada uno tiene las suyas.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+PERCENTILES = (50, 95, 99)
+
+
+_medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+
+class _Medicion:
+    """execute_wrapper que cuenta las consultas de una petición y suma su tiempo."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_bd = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if _medicion_actual.get() is not self:
+            # En ASGI las vistas síncronas de peticiones simultáneas comparten el hilo y la conexión
+            return execute(sql, params, many, context)
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.tiempo_bd += time.perf_counter() - inicio
+
+
+def _percentil(ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    return ordenados[max(0, -(-len(ordenados) * p // 100) - 1)]
+
+
+class RegistroMetricas:
+    """Últimas muestras (total, consultas, tiempo_bd) por vista, protegidas con un lock."""
+
+    def __init__(self):
+        self._muestras = defaultdict(self._nueva_ventana)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nueva_ventana():
+        return deque(maxlen=getattr(settings, 'METRICAS_PETICIONES_MUESTRAS', 1000))
+
+    def registrar(self, vista, total, consultas, tiempo_bd):
+        with self._lock:
+            self._muestras[vista].append((total, consultas, tiempo_bd))
+
+    def limpiar(self):
+        with self._lock:
+            self._muestras.clear()
+
+    def resumen(self):
+        """{vista: {'peticiones', 'total_ms': {p50, p95, p99}, 'bd_ms': {...}, 'consultas': {...}}}"""
+        with self._lock:
+            copia = {vista: list(muestras) for vista, muestras in self._muestras.items()}
+        resultado = {}
+        for vista, muestras in sorted(copia.items()):
+            columnas = [sorted(columna) for columna in zip(*muestras)]
+            total, consultas, tiempo_bd = columnas
+            resultado[vista] = {
+                'peticiones': len(muestras),
+                'total_ms': {f'p{p}': round(_percentil(total, p) * 1000, 2) for p in PERCENTILES},
+                'bd_ms': {f'p{p}': round(_percentil(tiempo_bd, p) * 1000, 2) for p in PERCENTILES},
+                'consultas': {f'p{p}': _percentil(consultas, p) for p in PERCENTILES},
+            }
+        return resultado
+
+
+registro = RegistroMetricas()
+
+
+def _nombre_vista(request):
+    coincidencia = getattr(request, 'resolver_match', None)
+    if coincidencia is None:
+        return 'sin_ruta'
+    return coincidencia.view_name or coincidencia._func_path
+
+
+def _conectar(medicion):
+    # connections[...] y no `connection`: el proxy resolvería la conexión del hilo que lo use después
+    conexion = connections[DEFAULT_DB_ALIAS]
+    conexion.execute_wrappers.append(medicion)
+    return conexion
+
+
+class MetricasPeticionesMiddleware:
+    """
+    Mide cada petición y agrega Server-Timing. Solo con settings.METRICAS_PETICIONES.
+    Funciona en WSGI y en ASGI (asgi.py) sin que Django cambie de modo en la cadena.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_PETICIONES', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Igual que MiddlewareMixin: marca la instancia como corrutina y
+            # __call__ deriva a __acall__
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        medicion = _Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(medicion):
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self._registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicion = _Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        # La conexión de la vista es la del hilo donde sync_to_async la ejecuta, no la de este contexto
+        conexion = await sync_to_async(_conectar)(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            conexion.execute_wrappers.remove(medicion)
+            _medicion_actual.reset(token)
+        return self._registrar(request, response, medicion, time.perf_counter() - inicio)
+
+    def _registrar(self, request, response, medicion, total):
+        registro.registrar(_nombre_vista(request), total, medicion.consultas, medicion.tiempo_bd)
+        # En respuestas en streaming el total cubre hasta el primer byte, no la descarga
+        response['Server-Timing'] = (
+            f'total;dur={total * 1000:.1f}, '
+            f'db;dur={medicion.tiempo_bd * 1000:.1f};desc="{medicion.consultas} consultas"'
+        )
+        return response
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieDiariaReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(choices=[('cotizaciones', 'Cotizaciones por día'), ('clientes', 'Clientes nuevos por día')], max_length=20)),
+                ('dia', models.DateField()),
+                ('valor', models.IntegerField(default=0)),
+                ('fecha_calculo', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Serie Diaria de Reporte',
+                'verbose_name_plural': 'Series Diarias de Reporte',
+                'db_table': 'reportes_serie_diaria',
+                'ordering': ['serie', 'dia'],
+                'unique_together': {('serie', 'dia')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PrediccionReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(choices=[('cotizaciones', 'Cotizaciones por día'), ('clientes', 'Clientes nuevos por día')], max_length=20)),
+                ('dia', models.DateField()),
+                ('valor', models.FloatField()),
+                ('fecha_calculo', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Predicción de Reporte',
+                'verbose_name_plural': 'Predicciones de Reporte',
+                'db_table': 'reportes_prediccion',
+                'ordering': ['serie', 'dia'],
+                'unique_together': {('serie', 'dia')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_pronosticos_reporte'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensajecotizacion',
+            index=models.Index(fields=['chat', 'id'], name='mensaje_cot_chat_id_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_indice_mensajes_chat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mes de cotizaciones_mes (primer día)')),
+                ('cotizaciones_mes', models.IntegerField(default=0)),
+                ('total_productos', models.IntegerField(default=0)),
+                ('total_clientes', models.IntegerField(default=0)),
+                ('stock_total', models.BigIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Snapshot del Dashboard',
+                'verbose_name_plural': 'Snapshots del Dashboard',
+                'db_table': 'dashboard_snapshot',
+            },
+        ),
+    ]
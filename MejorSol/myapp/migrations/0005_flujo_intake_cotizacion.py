@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+CAMPOS_PASOS = [
+    # (campo, paso si falta el dato, paso si quedó 'CONFIRMAR_*')
+    ('cliente_nombre_dato', 'nombre', 'confirmar_nombre'),
+    ('cliente_email_dato', 'email', 'confirmar_email'),
+    ('cliente_telefono_dato', 'telefono', 'confirmar_telefono'),
+    ('cliente_rut_dato', 'region', None),
+    ('cliente_mensaje_dato', 'detalle', None),
+]
+
+
+def deducir_paso(chat):
+    """Paso equivalente a como el asistente anterior leía los campos del chat."""
+    if chat.cliente_nombre_dato is None:
+        return 'inicio'
+    for campo, paso, paso_confirmar in CAMPOS_PASOS:
+        valor = getattr(chat, campo)
+        if valor is None:
+            return paso
+        if paso_confirmar and valor.startswith('CONFIRMAR_'):
+            return paso_confirmar
+    return 'completo'
+
+
+def completar_pasos(apps, schema_editor):
+    ChatCotizacion = apps.get_model('myapp', 'ChatCotizacion')
+    MensajeCotizacion = apps.get_model('myapp', 'MensajeCotizacion')
+
+    con_staff = MensajeCotizacion.objects.filter(autor__is_staff=True, es_bot=False).values('chat_id')
+    ChatCotizacion.objects.filter(id__in=con_staff).update(staff_unido=True)
+
+    ChatCotizacion.objects.filter(cliente_mensaje_dato__isnull=False).update(paso_intake='completo')
+    for chat in ChatCotizacion.objects.filter(cliente_mensaje_dato__isnull=True).iterator():
+        chat.paso_intake = deducir_paso(chat)
+        # Los marcadores 'CONFIRMAR_*' ya no se guardan en los campos de datos
+        for campo, _, _ in CAMPOS_PASOS:
+            if (getattr(chat, campo) or '').startswith('CONFIRMAR_'):
+                setattr(chat, campo, None)
+        chat.save(update_fields=['paso_intake'] + [campo for campo, _, _ in CAMPOS_PASOS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_dashboard_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatcotizacion',
+            name='paso_intake',
+            field=models.CharField(choices=[('inicio', 'Sin iniciar'), ('nombre', 'Pide nombre'), ('confirmar_nombre', 'Confirma nombre'), ('email', 'Pide email'), ('confirmar_email', 'Confirma email'), ('telefono', 'Pide teléfono'), ('confirmar_telefono', 'Confirma teléfono'), ('region', 'Pide región y comuna'), ('detalle', 'Pide detalle del proyecto'), ('completo', 'Completo')], default='inicio', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='chatcotizacion',
+            name='staff_unido',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(completar_pasos, migrations.RunPython.noop),
+    ]
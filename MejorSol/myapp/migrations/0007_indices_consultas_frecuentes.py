@@ -0,0 +1,63 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:41
+
+from django.db import migrations, models
+
+# auth_user no es de esta app: el índice de date_joined (lista de clientes y serie
+# de clientes nuevos en pronosticos.py) se crea con el schema_editor
+INDICE_DATE_JOINED = models.Index(fields=['date_joined'], name='auth_user_date_joined_idx')
+
+
+def crear_indice_date_joined(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), INDICE_DATE_JOINED)
+
+
+def borrar_indice_date_joined(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), INDICE_DATE_JOINED)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('myapp', '0006_indice_mensajes_chatbot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatcotizacion',
+            index=models.Index(fields=['estado', 'fecha_actualizacion'], name='chat_cot_estado_act_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatcotizacion',
+            index=models.Index(fields=['fecha_actualizacion'], name='chat_cot_actualizacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatcotizacion',
+            index=models.Index(fields=['fecha_creacion'], name='chat_cot_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatcotizacion',
+            index=models.Index(fields=['cliente', 'fecha_actualizacion'], name='chat_cot_cliente_act_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensajecotizacion',
+            index=models.Index(fields=['chat', 'timestamp'], name='mensaje_cot_chat_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='perfil',
+            index=models.Index(fields=['tipo_usuario', 'fecha_creacion'], name='perfil_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'fecha_creacion'], name='producto_activo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_creacion'], name='producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoadquirido',
+            index=models.Index(fields=['fecha_compra'], name='adquirido_fecha_compra_idx'),
+        ),
+        migrations.RunPython(crear_indice_date_joined, borrar_indice_date_joined),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Índice FULLTEXT de la búsqueda del inventario (ver busqueda.py). Es propio de
+# MySQL; en otros motores busqueda.py usa su índice de trigramas en memoria.
+# El parser ngram indexa partes de palabras, útil para SKU y "450W".
+CREAR = (
+    "ALTER TABLE productos ADD FULLTEXT INDEX producto_busqueda_ft "
+    "(nombre, sku, descripcion, potencia, voltaje) WITH PARSER ngram"
+)
+BORRAR = "ALTER TABLE productos DROP INDEX producto_busqueda_ft"
+
+
+def crear_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(CREAR)
+
+
+def borrar_indice_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_miniaturas_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fulltext, borrar_indice_fulltext),
+    ]
@@ -1,12 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, post_init
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 import os
 import uuid
 
+from .tiempo_real import notificar_mensaje
+
 # ===========================
 # MODELOS DE USUARIO Y PERFIL
 # ===========================
@@ -30,6 +32,10 @@ class Perfil(models.Model):
         verbose_name_plural = 'Perfiles'
         db_table = 'perfiles'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Clientes recientes del dashboard y conteo de clientes (tipo_usuario)
+            models.Index(fields=['tipo_usuario', 'fecha_creacion'], name='perfil_tipo_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.usuario.username} - {self.get_tipo_usuario_display()}"
@@ -40,6 +46,12 @@ def crear_perfil_usuario(sender, instance, created, **kwargs):
     if created:
         Perfil.objects.get_or_create(usuario=instance)
 
+@receiver([post_save, post_delete], sender=User)
+def olvidar_usuario_bot(sender, instance, **kwargs):
+    """El usuario bot queda en memoria por proceso (ver flujo_cotizacion.obtener_bot)"""
+    from .flujo_cotizacion import olvidar_bot
+    olvidar_bot(instance)
+
 # ===========================
 # MODELOS DE CHATBOT (GENERAL AI)
 # ===========================
@@ -55,6 +67,12 @@ class ChatConversation(models.Model):
         verbose_name_plural = 'Conversaciones de Chat IA'
         ordering = ['-created_at']
 
+@receiver(post_delete, sender=ChatConversation)
+def olvidar_contexto_chatbot(sender, instance, **kwargs):
+    """El contexto de la sesión queda en caché (ver contexto_chatbot.py)"""
+    from .contexto_chatbot import olvidar
+    olvidar(instance.session_id)
+
 class ChatMessage(models.Model):
     conversation = models.ForeignKey(ChatConversation, on_delete=models.CASCADE, related_name='messages')
     message = models.TextField()
@@ -65,6 +83,10 @@ class ChatMessage(models.Model):
         verbose_name = 'Mensaje de Chat IA'
         verbose_name_plural = 'Mensajes de Chat IA'
         ordering = ['timestamp']
+        indexes = [
+            # Paginación por cursor de get_conversation_history (conversation_id, timestamp)
+            models.Index(fields=['conversation', 'timestamp'], name='chat_msg_conv_ts_idx'),
+        ]
 
 # ===========================
 # MODELOS DE CATALOGO E INVENTARIO
@@ -119,6 +141,11 @@ class Producto(models.Model):
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Inventario y catálogo: activos ordenados por fecha de creación
+            models.Index(fields=['activo', 'fecha_creacion'], name='producto_activo_fecha_idx'),
+            models.Index(fields=['fecha_creacion'], name='producto_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} - {self.sku}"
@@ -146,6 +173,8 @@ class ProductoImagen(models.Model):
     orden = models.IntegerField(default=0, verbose_name="Orden de Visualización")
     es_principal = models.BooleanField(default=False, verbose_name="Imagen Principal")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Miniaturas generadas (ver imagenes.py): {'original', 'hash', 'ancho', 'webp': {ancho: nombre}, 'jpeg': {...}}
+    variantes = models.JSONField(default=dict, blank=True, editable=False)
     
     class Meta:
         verbose_name = 'Imagen de Producto'
@@ -156,6 +185,66 @@ class ProductoImagen(models.Model):
     def __str__(self):
         return f"Imagen de {self.producto.nombre}"
 
+    def _variantes_vigentes(self):
+        """Variantes del archivo actual (vacío si aún no se generan o cambió la imagen)."""
+        if self.variantes.get('original') != self.imagen.name:
+            return {}
+        return self.variantes
+
+    def miniatura_url(self, ancho=320, formato='jpeg'):
+        """URL de la miniatura más chica con al menos `ancho` px; la original si no hay miniaturas."""
+        opciones = self._variantes_vigentes().get(formato)
+        if not opciones:
+            return self.imagen.url
+        elegido = next((a for a in sorted(opciones, key=int) if int(a) >= ancho), max(opciones, key=int))
+        return self.imagen.storage.url(opciones[elegido])
+
+    def srcset(self, formato='jpeg'):
+        """Valor para el atributo srcset: "url 160w, url 320w, ..." ('' si no hay miniaturas)."""
+        variantes = self._variantes_vigentes()
+        opciones = variantes.get(formato, {})
+        return ', '.join(
+            f"{self.imagen.storage.url(nombre)} {min(int(ancho), variantes['ancho'])}w"
+            for ancho, nombre in sorted(opciones.items(), key=lambda par: int(par[0]))
+        )
+
+    @property
+    def miniatura(self):
+        return self.miniatura_url()
+
+    @property
+    def miniatura_grande(self):
+        return self.miniatura_url(640)
+
+    @property
+    def srcset_webp(self):
+        return self.srcset('webp')
+
+    @property
+    def srcset_jpeg(self):
+        return self.srcset('jpeg')
+
+@receiver(post_save, sender=ProductoImagen)
+def encolar_miniaturas(sender, instance, **kwargs):
+    """Genera las miniaturas después del commit si la imagen es nueva o cambió (ver imagenes.py)"""
+    if instance.imagen and instance.variantes.get('original') != instance.imagen.name:
+        from .imagenes import encolar
+        encolar(instance.pk)
+
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=ProductoImagen)
+def invalidar_catalogo(sender, **kwargs):
+    """El catálogo del dashboard de clientes queda en caché (ver catalogo.py)"""
+    from .catalogo import invalidar
+    invalidar()
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_indice_busqueda(sender, **kwargs):
+    """El índice de búsqueda en memoria (motores sin FULLTEXT) se reconstruye (ver busqueda.py)"""
+    from .busqueda import invalidar
+    invalidar()
+
 class MovimientoInventario(models.Model):
     TIPO_MOVIMIENTO_CHOICES = [
         ('ENTRADA', 'Entrada'),
@@ -206,6 +295,9 @@ class ProductoAdquirido(models.Model):
         db_table = 'productos_adquiridos'
         ordering = ['-fecha_compra']
         unique_together = ['cliente', 'producto', 'fecha_compra']
+        indexes = [
+            models.Index(fields=['fecha_compra'], name='adquirido_fecha_compra_idx'),
+        ]
     
     def __str__(self):
         return f"{self.cliente.username} - {self.producto.nombre}"
@@ -326,6 +418,20 @@ class ChatCotizacion(models.Model):
         ('aprobada', 'Aprobada'),
         ('rechazada', 'Rechazada'),
     ]
+
+    # Pasos del asistente que toma los datos de la cotización (ver flujo_cotizacion.py)
+    PASO_INTAKE_CHOICES = [
+        ('inicio', 'Sin iniciar'),
+        ('nombre', 'Pide nombre'),
+        ('confirmar_nombre', 'Confirma nombre'),
+        ('email', 'Pide email'),
+        ('confirmar_email', 'Confirma email'),
+        ('telefono', 'Pide teléfono'),
+        ('confirmar_telefono', 'Confirma teléfono'),
+        ('region', 'Pide región y comuna'),
+        ('detalle', 'Pide detalle del proyecto'),
+        ('completo', 'Completo'),
+    ]
     
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name='chats_cotizacion')
     cliente = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chats_cotizacion')
@@ -338,6 +444,10 @@ class ChatCotizacion(models.Model):
     cliente_rut_dato = models.CharField(max_length=20, blank=True, null=True)
     cliente_mensaje_dato = models.TextField(blank=True, null=True)
 
+    paso_intake = models.CharField(max_length=20, choices=PASO_INTAKE_CHOICES, default='inicio')
+    # True desde el primer mensaje (no bot) de un admin o vendedor; el asistente deja de responder
+    staff_unido = models.BooleanField(default=False)
+
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -345,10 +455,38 @@ class ChatCotizacion(models.Model):
         verbose_name = 'Chat de Cotización'
         verbose_name_plural = 'Chats de Cotizaciones'
         ordering = ['-fecha_actualizacion']
+        indexes = [
+            # Bandeja de cotizaciones e historial: por estado y/o fecha de actualización
+            models.Index(fields=['estado', 'fecha_actualizacion'], name='chat_cot_estado_act_idx'),
+            models.Index(fields=['fecha_actualizacion'], name='chat_cot_actualizacion_idx'),
+            # Cotizaciones recientes del dashboard y del mes (KPIs)
+            models.Index(fields=['fecha_creacion'], name='chat_cot_creacion_idx'),
+            # "Mis cotizaciones" del cliente
+            models.Index(fields=['cliente', 'fecha_actualizacion'], name='chat_cot_cliente_act_idx'),
+        ]
 
     def __str__(self):
         return f"Cotización #{self.id} de {self.cliente.username} por {self.producto.nombre}"
 
+@receiver([post_save, post_delete], sender=ChatCotizacion)
+def invalidar_contadores_cotizacion(sender, **kwargs):
+    """Los contadores por estado del listado de cotizaciones quedan en caché (ver cotizaciones.py)"""
+    from .cotizaciones import invalidar_contadores
+    invalidar_contadores()
+
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_fragmentos_categorias(sender, **kwargs):
+    """Selectores de categoría en caché de fragmentos (ver fragmentos.py)"""
+    from .fragmentos import invalidar
+    invalidar('categorias')
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=ChatCotizacion)
+def invalidar_fragmentos_reportes(sender, **kwargs):
+    """KPIs y datos de gráficos de reportes en caché de fragmentos (ver fragmentos.py)"""
+    from .fragmentos import invalidar
+    invalidar('reportes')
+
 class MensajeCotizacion(models.Model):
     chat = models.ForeignKey(ChatCotizacion, on_delete=models.CASCADE, related_name='mensajes')
     autor = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -363,6 +501,116 @@ class MensajeCotizacion(models.Model):
         verbose_name = 'Mensaje de Cotización'
         verbose_name_plural = 'Mensajes de Cotizaciones'
         ordering = ['timestamp']
+        indexes = [
+            # Paginación por cursor de chat_api_view (chat_id, id)
+            models.Index(fields=['chat', 'id'], name='mensaje_cot_chat_id_idx'),
+            # chat.mensajes.all() usa el orden por timestamp
+            models.Index(fields=['chat', 'timestamp'], name='mensaje_cot_chat_ts_idx'),
+        ]
 
     def __str__(self):
-        return f"Mensaje de {self.autor.username} en chat #{self.chat.id}"
\ No newline at end of file
+        return f"Mensaje de {self.autor.username} en chat #{self.chat.id}"
+
+@receiver(post_save, sender=MensajeCotizacion)
+def avisar_mensaje_cotizacion(sender, instance, created, **kwargs):
+    """Despierta a quienes esperan mensajes nuevos en este chat (ver tiempo_real.py)"""
+    if created:
+        transaction.on_commit(lambda: notificar_mensaje(instance.chat_id, instance.id))
+
+@receiver(post_save, sender=MensajeCotizacion)
+def marcar_staff_unido(sender, instance, created, **kwargs):
+    """Guarda en el chat que ya respondió una persona del equipo (evita un EXISTS por mensaje)"""
+    if not created or instance.es_bot or not instance.autor.is_staff:
+        return
+    chat = instance.chat
+    if not chat.staff_unido:
+        ChatCotizacion.objects.filter(pk=chat.pk).update(staff_unido=True)
+        chat.staff_unido = True
+
+# ===========================
+# MODELOS DE REPORTES (PRONÓSTICOS PRECALCULADOS)
+# ===========================
+
+SERIE_REPORTE_CHOICES = [
+    ('cotizaciones', 'Cotizaciones por día'),
+    ('clientes', 'Clientes nuevos por día'),
+]
+
+class SerieDiariaReporte(models.Model):
+    """Conteo diario observado de una serie. Se agrega de forma incremental (ver pronosticos.py)."""
+    serie = models.CharField(max_length=20, choices=SERIE_REPORTE_CHOICES)
+    dia = models.DateField()
+    valor = models.IntegerField(default=0)
+    fecha_calculo = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Serie Diaria de Reporte'
+        verbose_name_plural = 'Series Diarias de Reporte'
+        db_table = 'reportes_serie_diaria'
+        ordering = ['serie', 'dia']
+        unique_together = ['serie', 'dia']
+
+    def __str__(self):
+        return f"{self.serie} {self.dia}: {self.valor}"
+
+class PrediccionReporte(models.Model):
+    """Predicción ajustada para los días futuros de una serie. Se reemplaza en cada actualización."""
+    serie = models.CharField(max_length=20, choices=SERIE_REPORTE_CHOICES)
+    dia = models.DateField()
+    valor = models.FloatField()
+    fecha_calculo = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Predicción de Reporte'
+        verbose_name_plural = 'Predicciones de Reporte'
+        db_table = 'reportes_prediccion'
+        ordering = ['serie', 'dia']
+        unique_together = ['serie', 'dia']
+
+    def __str__(self):
+        return f"{self.serie} {self.dia}: {self.valor}"
+
+# ===========================
+# MODELO DE KPIs DEL DASHBOARD (SNAPSHOT)
+# ===========================
+
+class DashboardSnapshot(models.Model):
+    """
+    Fila única con los KPIs de admin_panel. Se mantiene de forma incremental con
+    las señales de más abajo y se recalcula completa con `manage.py reconciliar_kpis` (ver kpis.py).
+    """
+    mes = models.DateField(verbose_name="Mes de cotizaciones_mes (primer día)")
+    cotizaciones_mes = models.IntegerField(default=0)
+    total_productos = models.IntegerField(default=0)
+    total_clientes = models.IntegerField(default=0)
+    stock_total = models.BigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Snapshot del Dashboard'
+        verbose_name_plural = 'Snapshots del Dashboard'
+        db_table = 'dashboard_snapshot'
+
+    def __str__(self):
+        return f"KPIs {self.mes:%Y-%m} (actualizado {self.fecha_actualizacion:%d/%m %H:%M})"
+
+@receiver(post_init, sender=Producto)
+@receiver(post_init, sender=Perfil)
+def recordar_valores_kpi(sender, instance, **kwargs):
+    """Guarda el stock / tipo de usuario cargado para calcular la diferencia al guardar"""
+    campo = 'stock' if sender is Producto else 'tipo_usuario'
+    instance._kpi_inicial = instance.__dict__.get(campo)
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Perfil)
+@receiver(post_save, sender=ChatCotizacion)
+def actualizar_kpis_al_guardar(sender, instance, created, **kwargs):
+    from .kpis import registrar_guardado
+    registrar_guardado(instance, created)
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Perfil)
+@receiver(post_delete, sender=ChatCotizacion)
+def actualizar_kpis_al_eliminar(sender, instance, **kwargs):
+    from .kpis import registrar_eliminado
+    registrar_eliminado(instance)
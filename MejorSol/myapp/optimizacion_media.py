@@ -0,0 +1,269 @@
+"""
+Deduplicación y recompresión de las imágenes subidas (comando optimizar_media).
+
+Recorre MEDIA_ROOT/productos/ y MEDIA_ROOT/cotizaciones_img/ en tres pasos:
+  1. hash sha256 de cada archivo, en un pool de procesos
+  2. archivos con el mismo contenido: las filas de ProductoImagen y
+     MensajeCotizacion que apuntan a las copias pasan a apuntar a uno solo
+     (el primero visto) y las copias se borran
+  3. imágenes sobre el umbral de tamaño o de lado máximo se recomprimen en el
+     pool, conservando nombre y formato (las referencias en la BD no cambian);
+     solo se reemplazan si el resultado pesa menos
+
+El avance queda en un archivo de control (JSON, por defecto en BASE_DIR/cache/)
+después de cada bloque, así una ejecución interrumpida o limitada con --lote
+sigue donde quedó. Los archivos ya vistos se reconocen por tamaño y fecha de
+modificación; antes de borrar una copia se vuelven a hashear ella y el original.
+
+Las funciones que corren en el pool (_hashear, _recomprimir) no usan Django.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+CARPETAS = ('productos', 'cotizaciones_img')
+EXTENSIONES = {'.jpg', '.jpeg', '.png', '.webp'}
+# Miniaturas de imagenes.py (<hash>_<ancho>.<ext>): se derivan de los originales
+PATRON_MINIATURA = re.compile(r'^[0-9a-f]{16}_\d+\.(webp|jpg)$')
+FORMATO_PIL = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP'}
+BLOQUE = 200
+
+logger = logging.getLogger(__name__)
+
+
+def ruta_control_por_defecto():
+    # Bajo BASE_DIR y no en el directorio temporal compartido: el paso 2 borra archivos según este control
+    from django.conf import settings
+    return getattr(settings, 'OPTIMIZAR_MEDIA_CONTROL_PATH',
+                   os.path.join(settings.BASE_DIR, 'cache', 'optimizar_media.json'))
+
+
+# ===========================
+# TRABAJO EN EL POOL (SIN DJANGO)
+# ===========================
+
+def _hashear(tarea):
+    raiz, relativa = tarea
+    digest = hashlib.sha256()
+    with open(os.path.join(raiz, relativa), 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(bloque)
+    estado = os.stat(os.path.join(raiz, relativa))
+    return relativa, [digest.hexdigest(), estado.st_size, estado.st_mtime_ns]
+
+
+def _recomprimir(tarea):
+    """Recomprime una imagen en su mismo formato; retorna (relativa, antes, después) o un error."""
+    from PIL import Image, ImageOps
+
+    raiz, relativa, lado_maximo, calidad, simular = tarea
+    ruta = os.path.join(raiz, relativa)
+    antes = os.path.getsize(ruta)
+    formato = FORMATO_PIL[os.path.splitext(relativa)[1].lower()]
+    try:
+        with Image.open(ruta) as original:
+            imagen = ImageOps.exif_transpose(original)
+            if max(imagen.size) > lado_maximo:
+                imagen.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+            if formato == 'JPEG' and imagen.mode not in ('RGB', 'L'):
+                imagen = imagen.convert('RGB')
+            opciones = {
+                'JPEG': {'quality': calidad, 'optimize': True, 'progressive': True},
+                'WEBP': {'quality': calidad, 'method': 6},
+                'PNG': {'optimize': True},
+            }[formato]
+            descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+            with os.fdopen(descriptor, 'wb') as salida:
+                imagen.save(salida, formato, **opciones)
+    except Exception as e:
+        return relativa, antes, None, str(e)
+
+    despues = os.path.getsize(temporal)
+    # Solo vale la pena si ahorra al menos un 10 %
+    if simular or despues >= antes * 0.9:
+        os.remove(temporal)
+        return relativa, antes, (despues if despues < antes * 0.9 else antes), None
+    os.replace(temporal, ruta)
+    return relativa, antes, despues, None
+
+
+# ===========================
+# PROCESO PRINCIPAL
+# ===========================
+
+def leer_control(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            control = json.load(f)
+    except (OSError, ValueError):
+        control = {}
+    control.setdefault('archivos', {})      # relativa -> [sha256, tamaño, mtime_ns]
+    control.setdefault('recomprimidos', {})  # relativa -> [antes, después]
+    control.setdefault('ahorro_duplicados', 0)
+    return control
+
+
+def guardar_control(ruta, control):
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(control, f)
+    os.replace(temporal, ruta)
+
+
+def recorrer(raiz, carpetas=CARPETAS):
+    """Rutas relativas a `raiz` de las imágenes originales (sin miniaturas)."""
+    for carpeta in carpetas:
+        for directorio, _, archivos in os.walk(os.path.join(raiz, carpeta)):
+            for nombre in sorted(archivos):
+                if os.path.splitext(nombre)[1].lower() in EXTENSIONES and not PATRON_MINIATURA.match(nombre):
+                    yield os.path.relpath(os.path.join(directorio, nombre), raiz).replace(os.sep, '/')
+
+
+def _por_bloques(funcion, tareas, procesos, registrar):
+    """
+    Aplica `funcion` a `tareas` (en un pool si procesos > 1), llama a `registrar`
+    con cada resultado y entrega la cantidad hecha al terminar cada bloque.
+    """
+    pool = ProcessPoolExecutor(max_workers=procesos) if procesos > 1 and tareas else None
+    try:
+        for inicio in range(0, len(tareas), BLOQUE):
+            bloque = tareas[inicio:inicio + BLOQUE]
+            for resultado in (pool.map(funcion, bloque, chunksize=8) if pool else map(funcion, bloque)):
+                registrar(resultado)
+            yield min(inicio + BLOQUE, len(tareas))
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def _huella_actual(raiz, relativa):
+    try:
+        return _hashear((raiz, relativa))[1][0]
+    except OSError:
+        return None
+
+
+def _cambio(raiz, relativa, conocido):
+    try:
+        estado = os.stat(os.path.join(raiz, relativa))
+    except OSError:
+        return False
+    return conocido is None or conocido[1:] != [estado.st_size, estado.st_mtime_ns]
+
+
+def reapuntar(canonico, copias):
+    """Hace que las filas que usan `copias` usen `canonico`. Retorna las filas cambiadas."""
+    from django.db import transaction
+
+    from .models import MensajeCotizacion, ProductoImagen
+
+    with transaction.atomic():
+        cambiadas = MensajeCotizacion.objects.filter(imagen__in=copias).update(imagen=canonico)
+        for producto_imagen in ProductoImagen.objects.filter(imagen__in=copias).only('id', 'variantes'):
+            # Las miniaturas siguen siendo válidas: mismo contenido
+            variantes = producto_imagen.variantes
+            if variantes:
+                variantes['original'] = canonico
+            ProductoImagen.objects.filter(pk=producto_imagen.pk).update(imagen=canonico, variantes=variantes)
+            cambiadas += 1
+    if cambiadas:
+        from .catalogo import invalidar
+        invalidar()
+    return cambiadas
+
+
+def optimizar(raiz, ruta_control=None, procesos=None, lote=None, umbral_bytes=500 * 1024,
+              lado_maximo=2560, calidad=85, simular=False, informar=logger.info):
+    """Ejecuta los tres pasos y retorna el resumen (bytes ahorrados, duplicados, recomprimidos)."""
+    ruta_control = ruta_control or ruta_control_por_defecto()
+    procesos = procesos or os.cpu_count() or 1
+    control = leer_control(ruta_control)
+    archivos = control['archivos']
+    resumen = {'hasheados': 0, 'duplicados': 0, 'filas_reapuntadas': 0, 'recomprimidos': 0,
+               'ahorro_duplicados': 0, 'ahorro_recompresion': 0, 'errores': 0}
+
+    # 1. Hash de los archivos nuevos o modificados
+    actuales = set(recorrer(raiz))
+    for relativa in set(archivos) - actuales:
+        del archivos[relativa]  # ya no existe
+    pendientes = [(raiz, r) for r in sorted(actuales) if _cambio(raiz, r, archivos.get(r))][:lote]
+
+    def registrar_hash(resultado):
+        relativa, datos = resultado
+        archivos[relativa] = datos
+        control['recomprimidos'].pop(relativa, None)
+        resumen['hasheados'] += 1
+
+    for hechos in _por_bloques(_hashear, pendientes, procesos, registrar_hash):
+        guardar_control(ruta_control, control)
+        informar(f"  hash: {hechos}/{len(pendientes)}")
+
+    # 2. Duplicados: se conserva el primero visto (orden del archivo de control)
+    grupos = {}
+    for relativa, (huella, tamano, _) in archivos.items():
+        grupos.setdefault(huella, []).append((relativa, tamano))
+    for huella, miembros in grupos.items():
+        if len(miembros) < 2:
+            continue
+        canonico, copias = miembros[0][0], miembros[1:]
+        if not simular:
+            # El control pudo quedar desfasado (archivo editado con igual tamaño y fecha):
+            # se vuelve a hashear justo antes de reapuntar y borrar
+            if _huella_actual(raiz, canonico) != huella:
+                archivos.pop(canonico)  # se vuelve a hashear en la próxima ejecución
+                continue
+            for relativa, _ in copias:
+                if _huella_actual(raiz, relativa) != huella:
+                    archivos.pop(relativa)
+            copias = [(r, tamano) for r, tamano in copias if r in archivos]
+            if not copias:
+                continue
+        resumen['duplicados'] += len(copias)
+        ahorro = sum(tamano for _, tamano in copias)
+        resumen['ahorro_duplicados'] += ahorro
+        if simular:
+            continue
+        resumen['filas_reapuntadas'] += reapuntar(canonico, [r for r, _ in copias])
+        for relativa, _ in copias:
+            try:
+                os.remove(os.path.join(raiz, relativa))
+            except FileNotFoundError:
+                pass
+            del archivos[relativa]
+        control['ahorro_duplicados'] += ahorro
+    if not simular:
+        guardar_control(ruta_control, control)
+
+    # 3. Recompresión de las imágenes grandes que aún no se revisan
+    candidatas = [
+        (raiz, relativa, lado_maximo, calidad, simular)
+        for relativa, (_, tamano, _) in archivos.items()
+        if tamano > umbral_bytes and relativa not in control['recomprimidos']
+    ][:lote]
+
+    def registrar_recompresion(resultado):
+        relativa, antes, despues, error = resultado
+        if error:
+            resumen['errores'] += 1
+            logger.warning("No se pudo recomprimir %s: %s", relativa, error)
+            return
+        if despues < antes:
+            resumen['recomprimidos'] += 1
+            resumen['ahorro_recompresion'] += antes - despues
+        if not simular:
+            control['recomprimidos'][relativa] = [antes, despues]
+            if despues < antes:
+                archivos[relativa] = _hashear((raiz, relativa))[1]
+
+    for hechos in _por_bloques(_recomprimir, candidatas, procesos, registrar_recompresion):
+        if not simular:
+            guardar_control(ruta_control, control)
+        informar(f"  recompresión: {hechos}/{len(candidatas)}")
+
+    resumen['ahorro_total'] = resumen['ahorro_duplicados'] + resumen['ahorro_recompresion']
+    return resumen
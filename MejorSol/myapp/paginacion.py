@@ -0,0 +1,47 @@
+"""
+Paginación por cursor (keyset) compartida por los listados y las exportaciones.
+
+Una página retoma después de la última fila vista comparando por tuplas sobre
+el orden, con el mismo costo en cualquier página (sin OFFSET). Los cursores
+de texto tienen la forma '<fecha iso>_<id>'.
+
+Se usa en cotizaciones.pagina_por_fecha, exportacion.por_bloques, el
+historial del chatbot y los mensajes del chat de cotización (views.py).
+"""
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def despues_de(orden, valores):
+    """Filas que van después de `valores` en `orden` (comparación por tuplas con Q)."""
+    condicion, iguales = Q(), {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        condicion |= Q(**iguales, **{f"{nombre}__{'lt' if campo.startswith('-') else 'gt'}": valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def pagina(queryset, orden, valores=None, tamano=25):
+    """
+    Hasta `tamano` filas de `queryset` en `orden`, después de `valores` (o desde
+    el comienzo si es None). Retorna (filas, hay_mas). El último campo de `orden`
+    debe desempatar (la pk).
+    """
+    queryset = queryset.order_by(*orden)
+    if valores is not None:
+        queryset = queryset.filter(despues_de(orden, valores))
+    filas = list(queryset[:tamano + 1])
+    return filas[:tamano], len(filas) > tamano
+
+
+def cursor(fecha, pk):
+    return f"{fecha.isoformat()}_{pk}"
+
+
+def leer_cursor(texto):
+    """'<fecha iso>_<id>' -> (datetime, id). Lanza ValueError si no es válido."""
+    fecha, _, pk = texto.rpartition('_')
+    # Un '+' del huso horario sin codificar en la URL llega como espacio
+    return datetime.fromisoformat(fecha.replace(' ', '+')), int(pk)
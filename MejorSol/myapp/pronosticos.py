@@ -0,0 +1,144 @@
+"""
+Almacén de pronósticos para reportes_graficos_view.
+
+Las series diarias (cotizaciones creadas y clientes registrados) se guardan en
+SerieDiariaReporte y se agregan de forma incremental: en cada actualización solo
+se recalcula el último día guardado (pudo quedar incompleto) y los días nuevos.
+Después se ajusta la regresión lineal y se reemplazan las filas de
+PrediccionReporte. La vista solo lee filas ya calculadas.
+
+Actualización periódica: `python manage.py actualizar_pronosticos` (cron).
+
+El ajuste vive en analitica.py y se importa solo dentro de ajustar_predicciones,
+para que views.py no cargue numpy/scikit-learn al arrancar cada worker.
+"""
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import fragmentos
+from .models import ChatCotizacion, SerieDiariaReporte, PrediccionReporte
+
+VENTANA_DIAS = 90        # Días de historia usados para entrenar
+DIAS_TENDENCIA = 30      # Días mostrados en el gráfico de tendencia
+DIAS_PREDICCION = {'cotizaciones': 3, 'clientes': 7}
+
+
+def _origen_serie(serie):
+    """Retorna (queryset, campo_fecha) desde el que se cuenta cada serie."""
+    if serie == 'cotizaciones':
+        return ChatCotizacion.objects.all(), 'fecha_creacion'
+    if serie == 'clientes':
+        return User.objects.filter(perfil__tipo_usuario='cliente'), 'date_joined'
+    raise ValueError(f"Serie desconocida: {serie}")
+
+
+def actualizar_serie(serie, hoy=None, completo=False):
+    """
+    Agrega a la serie los días que faltan hasta `hoy`.
+    Con completo=True se reconstruye toda la ventana de VENTANA_DIAS.
+    Retorna la cantidad de días escritos.
+    """
+    hoy = hoy or timezone.localdate()
+    ultimo = None
+    if not completo:
+        ultimo = SerieDiariaReporte.objects.filter(serie=serie).aggregate(ultimo=Max('dia'))['ultimo']
+    # El último día guardado pudo quedar a medias: se recalcula junto con los nuevos.
+    desde = ultimo or (hoy - timedelta(days=VENTANA_DIAS))
+    # is_dst=False: el día del cambio de horario la medianoche no existe en Chile
+    # (el reloj salta a la 01:00); se toma el comienzo real del día
+    inicio = timezone.make_aware(datetime.combine(desde, time.min), is_dst=False)
+
+    queryset, campo = _origen_serie(serie)
+    # TruncDate agrupa por la fecha local sin construir la medianoche: TruncDay
+    # lanza NonExistentTimeError el día del cambio de horario en Chile
+    conteos = {
+        x['dia']: x['total']
+        for x in (queryset.filter(**{f'{campo}__gte': inicio})
+                  .annotate(dia=TruncDate(campo))
+                  .values('dia').annotate(total=Count('id')).order_by('dia'))
+    }
+
+    dias = [desde + timedelta(days=i) for i in range((hoy - desde).days + 1)]
+    with transaction.atomic():
+        borrar = SerieDiariaReporte.objects.filter(serie=serie)
+        if not completo:
+            borrar = borrar.filter(dia__gte=desde)
+        borrar.delete()
+        SerieDiariaReporte.objects.bulk_create([
+            SerieDiariaReporte(serie=serie, dia=d, valor=conteos.get(d, 0)) for d in dias
+        ])
+    return len(dias)
+
+
+def _ventana(serie, dias):
+    """Últimos `dias` valores guardados de la serie, en orden cronológico."""
+    filas = SerieDiariaReporte.objects.filter(serie=serie).order_by('-dia').values_list('dia', 'valor')[:dias]
+    return list(reversed(filas))
+
+
+def ajustar_predicciones(serie):
+    """Entrena la regresión lineal sobre la ventana guardada y reemplaza las predicciones."""
+    filas = _ventana(serie, VENTANA_DIAS + 1)
+    predicciones = []
+    if filas:
+        from .analitica import proyectar_lineal  # carga diferida de numpy/sklearn
+
+        proyectados = proyectar_lineal(
+            [d for d, _ in filas], [v for _, v in filas], DIAS_PREDICCION[serie],
+            # Para clientes se proyecta el acumulado dentro de la ventana
+            acumulado=(serie == 'clientes'),
+        )
+        predicciones = [
+            PrediccionReporte(serie=serie, dia=d, valor=v) for d, v in proyectados
+        ]
+
+    with transaction.atomic():
+        PrediccionReporte.objects.filter(serie=serie).delete()
+        PrediccionReporte.objects.bulk_create(predicciones)
+    return predicciones
+
+
+def actualizar_pronosticos(completo=False):
+    """Actualiza todas las series y sus predicciones. Retorna {serie: días escritos}."""
+    resultado = {}
+    for serie in DIAS_PREDICCION:
+        resultado[serie] = actualizar_serie(serie, completo=completo)
+        ajustar_predicciones(serie)
+    fragmentos.invalidar('reportes')  # los gráficos de reportes quedan en caché de fragmentos
+    return resultado
+
+
+def datos_reporte():
+    """
+    Lee las series y predicciones precalculadas para el dashboard de reportes.
+    Si el almacén está vacío (primer despliegue) se llena una vez aquí.
+    """
+    if not SerieDiariaReporte.objects.exists():
+        actualizar_pronosticos()
+
+    tendencia = _ventana('cotizaciones', DIAS_TENDENCIA + 1)
+    clientes = _ventana('clientes', VENTANA_DIAS + 1)
+    pred_cot = PrediccionReporte.objects.filter(serie='cotizaciones').order_by('dia').values_list('dia', 'valor')
+    pred_cli = list(PrediccionReporte.objects.filter(serie='clientes').order_by('dia').values_list('dia', 'valor'))
+
+    kpi_prom = round(sum(v for _, v in tendencia) / len(tendencia), 1) if tendencia else 0
+    kpi_proy = 0
+    if pred_cli:
+        acumulado = sum(v for _, v in clientes)
+        kpi_proy = int(pred_cli[-1][1] - acumulado)
+
+    return {
+        'tendencia_labels': [d.strftime('%d-%b') for d, _ in tendencia],
+        'tendencia_valores': [v for _, v in tendencia],
+        'prediccion_labels': [d.strftime('%d-%b') for d, _ in pred_cot],
+        'prediccion_valores': [max(0, round(v, 1)) for _, v in pred_cot],
+        'clientes_ml_labels': [d.strftime('%d-%b') for d, _ in pred_cli],
+        'clientes_ml_valores': [int(v) for _, v in pred_cli],
+        'kpi_promedio_cot_dia': kpi_prom,
+        'kpi_proyeccion_clientes': kpi_proy,
+    }
@@ -1,53 +1,213 @@
+import logging
 import os
-import requests
-from google.cloud import dialogflow_v2 as dialogflow
+import threading
+import time
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_respuestas import normalizar, respuestas_chatbot, respuestas_dialogflow
+
+logger = logging.getLogger(__name__)
 
 
 # =====================================================
 #   CHATBOT GRATUITO (HUGGINGFACE)
 # =====================================================
 
+class CircuitoHTTP:
+    """
+    Corta las llamadas a un servicio externo después de `fallos_max` fallos
+    seguidos y durante `segundos_abierto` responde sin llamar. Pasado ese
+    tiempo deja pasar una llamada de prueba: si funciona se cierra de nuevo.
+    """
+
+    def __init__(self, fallos_max=5, segundos_abierto=30):
+        self.fallos_max = fallos_max
+        self.segundos_abierto = segundos_abierto
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.fallos < self.fallos_max:
+                return True
+            if time.monotonic() >= self.abierto_hasta:
+                # Llamada de prueba; las demás siguen cortadas hasta saber el resultado
+                self.abierto_hasta = time.monotonic() + self.segundos_abierto
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.fallos >= self.fallos_max:
+                self.abierto_hasta = time.monotonic() + self.segundos_abierto
+
+
 class ChatBotService:
     """
     Servicio opcional que usa HuggingFace (DialoGPT-medium).
     No interfiere con el chatbot de Dialogflow.
+
+    Las llamadas comparten un httpx.Client por proceso (conexiones keep-alive),
+    con timeouts de conexión/lectura, reintentos acotados con backoff para
+    errores de conexión y respuestas 429/502/503/504, y un circuito que deja
+    de llamar a la API mientras esté caída. Si no hay respuesta se usa RESPUESTA_RESPALDO.
     """
 
     API_URL = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium"
+    RESPUESTA_RESPALDO = "¡Hola! Soy SIEERBot. ¿En qué puedo ayudarte?"
+    RESPUESTA_CARGANDO = "El modelo de IA está cargando. Inténtalo nuevamente."
+    RESPUESTA_SIN_TEXTO = "No pude procesar tu mensaje."
+    ESTADOS_REINTENTABLES = {429, 502, 503, 504}
 
-    def get_ai_response(self, user_message):
+    def _payload(self, user_message, history):
+        """Entrada conversacional de DialoGPT: mensajes anteriores del usuario y del bot."""
+        history = list(history or [])
+        if history and not history[-1]['is_bot'] and history[-1]['message'] == user_message:
+            history.pop()  # send_message ya guardó el mensaje actual en el historial
+        if not history:
+            return {"inputs": user_message}
+        return {"inputs": {
+            "past_user_inputs": [m['message'] for m in history if not m['is_bot']],
+            "generated_responses": [m['message'] for m in history if m['is_bot']],
+            "text": user_message,
+        }}
+
+    def _interpretar(self, result):
+        if isinstance(result, list):
+            result = result[0] if result else {}
+        # Modelo está cargando
+        if "error" in result and "is currently loading" in result["error"]:
+            return self.RESPUESTA_CARGANDO
+        return result.get("generated_text", self.RESPUESTA_SIN_TEXTO)
+
+    def get_ai_response(self, user_message, history=None):
+        # Con historial la respuesta depende de la conversación: solo se cachean turnos sin contexto
+        if isinstance(self._payload(user_message, history)['inputs'], dict):
+            return self._consultar(user_message, history)
+        clave = normalizar(user_message)
+        respuesta = respuestas_chatbot.obtener(clave)
+        if respuesta is None:
+            respuesta = self._consultar(user_message, history)
+            if respuesta not in (self.RESPUESTA_RESPALDO, self.RESPUESTA_CARGANDO, self.RESPUESTA_SIN_TEXTO):
+                respuestas_chatbot.guardar(clave, respuesta)
+        return respuesta
+
+    def _consultar(self, user_message, history):
         HF_TOKEN = os.getenv('HF_TOKEN', 'AQUI_VA_TU_TOKEN_DE_HUGGING_FACE')
 
         headers = {"Authorization": f"Bearer {HF_TOKEN}"}
+        url = getattr(settings, 'CHATBOT_API_URL', self.API_URL)
+        reintentos = getattr(settings, 'CHATBOT_REINTENTOS', 2)
+        backoff = getattr(settings, 'CHATBOT_BACKOFF_SEGUNDOS', 0.5)
 
-        try:
-            response = requests.post(self.API_URL, headers=headers, json={
-                "inputs": user_message,
-            })
+        circuito = _circuito_chatbot()
+        if not circuito.permitir():
+            return self.RESPUESTA_RESPALDO
 
-            result = response.json()
+        payload = self._payload(user_message, history)
+        for intento in range(reintentos + 1):
+            try:
+                response = _cliente_http().post(url, headers=headers, json=payload)
+                if response.status_code in self.ESTADOS_REINTENTABLES and intento < reintentos:
+                    time.sleep(backoff * 2 ** intento)
+                    continue
+                result = response.json()
+                if response.status_code >= 500 and self._interpretar(result) != self.RESPUESTA_CARGANDO:
+                    raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request, response=response)
+                circuito.exito()
+                return self._interpretar(result)
 
-            # Modelo está cargando
-            if "error" in result and "is currently loading" in result["error"]:
-                return "El modelo de IA está cargando. Inténtalo nuevamente."
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                # Sin conexión o conexión keep-alive cerrada por el servidor: se puede reintentar
+                if intento < reintentos:
+                    time.sleep(backoff * 2 ** intento)
+                    continue
+                logger.warning("Error en ChatBotService: %s", e)
+            except Exception as e:
+                # Timeout de lectura incluido: reintentar solo cargaría más al servicio lento
+                logger.warning("Error en ChatBotService: %s", e)
+            break
 
-            return result.get("generated_text", "No pude procesar tu mensaje.")
+        circuito.fallo()
+        return self.RESPUESTA_RESPALDO
+
+    async def aget_ai_response(self, user_message, history=None):
+        """Versión para vistas async: la llamada corre en un hilo aparte con el mismo cliente compartido."""
+        return await sync_to_async(self.get_ai_response, thread_sensitive=False)(user_message, history)
+
+
+_http_client = None
+_circuito = None
+_chatbot_lock = threading.Lock()
+
+
+def _cliente_http():
+    """httpx.Client del proceso (thread-safe, reutiliza conexiones)."""
+    global _http_client
+    if _http_client is None:
+        with _chatbot_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(
+                    timeout=httpx.Timeout(
+                        getattr(settings, 'CHATBOT_TIMEOUT_LECTURA', 10),
+                        connect=getattr(settings, 'CHATBOT_TIMEOUT_CONEXION', 3),
+                    ),
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                )
+    return _http_client
+
+
+def _circuito_chatbot():
+    global _circuito
+    if _circuito is None:
+        with _chatbot_lock:
+            if _circuito is None:
+                _circuito = CircuitoHTTP(
+                    getattr(settings, 'CHATBOT_CIRCUITO_FALLOS', 5),
+                    getattr(settings, 'CHATBOT_CIRCUITO_SEGUNDOS', 30),
+                )
+    return _circuito
 
-        except Exception as e:
-            print(f"Error en ChatBotService: {e}")
-            return "¡Hola! Soy SIEERBot. ¿En qué puedo ayudarte?"
+
+def reset_chatbot_service():
+    """Cierra el cliente HTTP, reinicia el circuito y vacía la caché de respuestas."""
+    global _http_client, _circuito
+    respuestas_chatbot.limpiar()
+    with _chatbot_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _circuito = None
 
 
 # ==========================================================
 #                  SERVICIO OFICIAL DIALOGFLOW
 # ==========================================================
 
+# Los contextos de Dialogflow ES vencen a los 20 minutos sin actividad en la sesión
+DURACION_CONTEXTOS = 20 * 60
+
+
 class DialogflowService:
     """
     Servicio para comunicar Django ↔ Dialogflow ES/CX.
     """
 
     def __init__(self):
+        # Importación diferida: gRPC/protobuf solo se cargan al crear el cliente
+        from google.cloud import dialogflow_v2 as dialogflow
+        self.dialogflow = dialogflow
+
         self.project_id = os.getenv("DIALOGFLOW_PROJECT_ID")
         credentials_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
@@ -67,8 +227,29 @@ class DialogflowService:
     def detect_intent(self, session_id, text, language_code="es"):
         """
         Envía texto a Dialogflow y retorna respuesta estructurada.
+        Las preguntas ya respondidas (mismo texto normalizado) salen de la caché,
+        solo mientras la sesión no tenga contextos activos: con contextos el
+        intent detectado depende de la conversación. Las respuestas que dejan
+        contextos activos marcan la sesión (en la caché de Django, compartida
+        entre workers si CACHES lo es) y no se guardan.
         """
+        clave = f"{language_code}:{normalizar(text)}"
+        clave_contexto = f"dialogflow_contexto:{session_id}"
+        con_contexto = cache.get(clave_contexto) is not None
+        respuesta = None if con_contexto else respuestas_dialogflow.obtener(clave)
+        if respuesta is None:
+            respuesta = self._detect_intent(session_id, text, language_code)
+            contextos = respuesta.pop("contextos", 0)
+            if contextos:
+                cache.set(clave_contexto, contextos, DURACION_CONTEXTOS)
+            elif "error" not in respuesta:
+                cache.delete(clave_contexto)
+                if not con_contexto:
+                    respuestas_dialogflow.guardar(clave, respuesta)
+        return {**respuesta, "query": text}
 
+    def _detect_intent(self, session_id, text, language_code):
+        dialogflow = self.dialogflow
         session = self.session_client.session_path(self.project_id, session_id)
 
         text_input = dialogflow.TextInput(text=text, language_code=language_code)
@@ -89,11 +270,67 @@ class DialogflowService:
                 "response": result.fulfillment_text,
                 "intent": result.intent.display_name,
                 "confidence": result.intent_detection_confidence,
+                # Contextos activos de la sesión después de esta consulta
+                "contextos": len(result.output_contexts),
             }
 
         except Exception as e:
-            print(f"Error en DialogflowService: {e}")
+            logger.warning("Error en DialogflowService: %s", e)
             return {
                 "error": "Error al comunicar con Dialogflow",
                 "detail": str(e)
-            }
\ No newline at end of file
+            }
+
+
+class DialogflowLocalService:
+    """
+    Backend local (sin red ni credenciales) para tests y desarrollo offline.
+    Responde con la misma estructura que DialogflowService.detect_intent.
+    """
+
+    RESPUESTA = "Hola, soy SIEERBot (modo local). ¿En qué puedo ayudarte?"
+
+    def detect_intent(self, session_id, text, language_code="es"):
+        return {
+            "query": text,
+            "response": self.RESPUESTA,
+            "intent": "Default Fallback Intent",
+            "confidence": 1.0,
+        }
+
+
+# ==========================================================
+#          INSTANCIA ÚNICA POR PROCESO (CARGA DIFERIDA)
+# ==========================================================
+
+DIALOGFLOW_BACKENDS = {
+    'google': DialogflowService,
+    'local': DialogflowLocalService,
+}
+
+_dialogflow_service = None
+_dialogflow_lock = threading.Lock()
+
+
+def get_dialogflow_service():
+    """
+    Retorna el servicio de Dialogflow del proceso, creándolo en la primera llamada.
+    El backend se elige con settings.DIALOGFLOW_BACKEND ('google' o 'local').
+    Si la creación falla (p. ej. faltan credenciales) se propaga la excepción y
+    se reintenta en la siguiente llamada; el resto del sitio no se ve afectado.
+    """
+    global _dialogflow_service
+    if _dialogflow_service is None:
+        with _dialogflow_lock:
+            if _dialogflow_service is None:
+                backend = getattr(settings, 'DIALOGFLOW_BACKEND', 'google')
+                _dialogflow_service = DIALOGFLOW_BACKENDS[backend]()
+    return _dialogflow_service
+
+
+def reset_dialogflow_service():
+    """Descarta la instancia actual y sus respuestas en caché (usado por tests al cambiar de backend)."""
+    global _dialogflow_service
+    respuestas_dialogflow.limpiar()
+    with _dialogflow_lock:
+        _dialogflow_service = None
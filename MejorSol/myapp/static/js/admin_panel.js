@@ -43,31 +43,6 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // ===== SIMULAR DATOS EN TIEMPO REAL =====
-    function updateStats() {
-        const stats = document.querySelectorAll('.stat-info h3');
-        if (stats.length > 0) {
-            // Simular cambios pequeños en las estadísticas
-            stats.forEach(stat => {
-                const currentText = stat.textContent;
-                const currentValue = parseFloat(currentText.replace(/[^0-9.]/g, ''));
-                if (!isNaN(currentValue)) {
-                    const change = (Math.random() - 0.5) * 0.1; // ±5%
-                    const newValue = currentValue * (1 + change);
-                    
-                    if (currentText.includes('$')) {
-                        stat.textContent = `$ ${Math.round(newValue).toLocaleString()}`;
-                    } else {
-                        stat.textContent = Math.round(newValue).toLocaleString();
-                    }
-                }
-            });
-        }
-    }
-    
-    // Actualizar estadísticas cada 30 segundos
-    setInterval(updateStats, 30000);
-    
     // ===== NOTIFICACIONES TOAST =====
     function showNotification(message, type = 'info') {
         // Verificar si ya existe una notificación
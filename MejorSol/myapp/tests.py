@@ -1,3 +1,1631 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    busqueda, cache_respuestas, catalogo, contexto_chatbot, datos_sinteticos, dimensionamiento, exportacion, fragmentos, kpis,
+    metricas_vistas, optimizacion_media, pronosticos, tiempo_real,
+)
+from .cache_respuestas import normalizar
+from .cotizaciones import contadores_por_estado, pagina_por_fecha
+from .flujo_cotizacion import olvidar_bot, procesar_respuesta_bot
+from .models import (
+    Categoria, ChatConversation, ChatCotizacion, ChatMessage, MensajeCotizacion, Perfil, Producto, ProductoAdquirido,
+    ProductoImagen, SerieDiariaReporte,
+)
+from .services import ChatBotService, DialogflowLocalService, DialogflowService, reset_chatbot_service, reset_dialogflow_service
+
+
+# ===========================
+# ARRANQUE DE WORKERS (IMPORTACIONES PESADAS)
+# ===========================
+
+MODULOS_ML = ('numpy', 'pandas', 'sklearn', 'scipy')
+MODULOS_GRPC = ('grpc',)  # cliente de Dialogflow
+
+SCRIPT_ARRANQUE = """
+import json, resource, sys, time
+import django
+
+def rss_kb():
+    # Pico de memoria de este proceso. ru_maxrss hereda el máximo del padre tras
+    # fork + exec (el runner de tests), VmHWM no; fuera de Linux no hay /proc
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(l.split()[1]) for l in f if l.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # En macOS ru_maxrss viene en bytes, en el resto en KB
+        return maximo // 1024 if sys.platform == 'darwin' else maximo
+
+django.setup()
+inicio = time.perf_counter()
+import myapp.urls
+{extra}
+print(json.dumps({{
+    'segundos': time.perf_counter() - inicio,
+    'rss_kb': rss_kb(),
+    'modulos': sorted({{m.split('.')[0] for m in sys.modules}}),
+}}))
+"""
+
+
+def medir_arranque(extra=''):
+    """Importa las URLs en un proceso nuevo (como un worker) y mide tiempo, RSS y módulos cargados."""
+    salida = subprocess.run(
+        [sys.executable, '-c', SCRIPT_ARRANQUE.format(extra=extra)],
+        cwd=settings.BASE_DIR, env=os.environ.copy(),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+class ArranqueLivianoTest(SimpleTestCase):
+    """Evita que numpy/pandas/scikit-learn vuelvan a cargarse al importar las vistas."""
+
+    def test_urls_no_cargan_librerias_ml(self):
+        arranque = medir_arranque()
+        cargados = [m for m in MODULOS_ML if m in arranque['modulos']]
+        self.assertEqual(cargados, [], f"Importar myapp.urls carga librerías de ML: {cargados}")
+
+    def test_urls_no_crean_cliente_dialogflow(self):
+        arranque = medir_arranque()
+        cargados = [m for m in MODULOS_GRPC if m in arranque['modulos']]
+        self.assertEqual(cargados, [], f"Importar myapp.urls carga el cliente gRPC: {cargados}")
+
+    def test_ml_diferido_ahorra_tiempo_y_memoria(self):
+        liviano = medir_arranque()
+        con_ml = medir_arranque(extra='import myapp.analitica')
+        print(
+            f"\nArranque worker: {liviano['segundos'] * 1000:.0f} ms / {liviano['rss_kb'] // 1024} MB"
+            f" (con ML: {con_ml['segundos'] * 1000:.0f} ms / {con_ml['rss_kb'] // 1024} MB)"
+        )
+        self.assertLess(liviano['rss_kb'], con_ml['rss_kb'])
+        self.assertLess(liviano['segundos'], con_ml['segundos'])
+
+
+# ===========================
+# CHATBOT DIALOGFLOW
+# ===========================
+
+class ChatbotDialogflowTest(SimpleTestCase):
+
+    def setUp(self):
+        reset_dialogflow_service()
+        self.addCleanup(reset_dialogflow_service)
+
+    @override_settings(DIALOGFLOW_BACKEND='local')
+    def test_backend_local(self):
+        response = self.client.post(reverse('chatbot_dialogflow'), {'message': 'hola', 'session_id': 's1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], DialogflowLocalService.RESPUESTA)
+
+    @override_settings(DIALOGFLOW_BACKEND='google')
+    def test_sin_credenciales_responde_503(self):
+        with mock.patch.dict(os.environ, {'DIALOGFLOW_PROJECT_ID': ''}), \
+                self.assertLogs('myapp.views', 'WARNING') as registro:
+            response = self.client.post(reverse('chatbot_dialogflow'), {'message': 'hola'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Dialogflow no disponible', registro.output[0])
+
+
+
+# ===========================
+# CHATBOT HUGGINGFACE (SERVIDOR LOCAL DE PRUEBA)
+# ===========================
+
+class _StubHF(BaseHTTPRequestHandler):
+    """Responde con la siguiente respuesta de `self.server.respuestas`: (estado, cuerpo, demora)."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.peticiones.append(self.client_address[1])
+        estado, cuerpo, demora = self.server.respuestas.pop(0) if self.server.respuestas else (200, {'generated_text': 'ok'}, 0)
+        time.sleep(demora)
+        datos = json.dumps(cuerpo).encode()
+        try:
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente cortó por timeout
+
+    def log_message(self, *args):
+        pass
+
+
+class ChatBotServiceTest(TestCase):
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _StubHF)
+        self.servidor.respuestas, self.servidor.peticiones = [], []
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        configuracion = override_settings(
+            CHATBOT_API_URL=f'http://127.0.0.1:{self.servidor.server_port}/',
+            CHATBOT_TIMEOUT_LECTURA=0.3, CHATBOT_BACKOFF_SEGUNDOS=0.01,
+            CHATBOT_CIRCUITO_FALLOS=2, CHATBOT_CIRCUITO_SEGUNDOS=60,
+        )
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        reset_chatbot_service()
+        self.addCleanup(reset_chatbot_service)
+
+    def test_reintenta_y_reutiliza_la_conexion(self):
+        self.servidor.respuestas = [(503, {'error': 'Bad gateway'}, 0), (200, {'generated_text': 'Hola!'}, 0)]
+        self.assertEqual(ChatBotService().get_ai_response('hola'), 'Hola!')
+        self.assertEqual(ChatBotService().get_ai_response('otra vez'), 'ok')
+        # Tres peticiones por la misma conexión keep-alive (mismo puerto de origen)
+        self.assertEqual(len(self.servidor.peticiones), 3)
+        self.assertEqual(len(set(self.servidor.peticiones)), 1)
+
+    def test_timeout_abre_el_circuito(self):
+        self.servidor.respuestas = [(200, {'generated_text': 'tarde'}, 0.6)] * 2
+        servicio = ChatBotService()
+        with self.assertLogs('myapp.services', 'WARNING') as registro:
+            for _ in range(2):
+                self.assertEqual(servicio.get_ai_response('hola'), ChatBotService.RESPUESTA_RESPALDO)
+        self.assertEqual(len(registro.records), 2)
+        self.assertEqual(len(self.servidor.peticiones), 2)
+        inicio = time.monotonic()
+        self.assertEqual(servicio.get_ai_response('hola'), ChatBotService.RESPUESTA_RESPALDO)
+        self.assertEqual(len(self.servidor.peticiones), 2)  # circuito abierto: no llama
+        self.assertLess(time.monotonic() - inicio, 0.1)
+
+    def test_send_message_async_con_historial(self):
+        self.servidor.respuestas = [(200, {'generated_text': 'Primera'}, 0), (200, {'generated_text': 'Segunda'}, 0)]
+        url = reverse('send_message')
+        data = self.client.post(url, json.dumps({'message': 'hola'}), content_type='application/json').json()
+        self.assertEqual(data['response'], 'Primera')
+        data = self.client.post(
+            url, json.dumps({'message': 'y el precio?', 'session_id': data['session_id']}), content_type='application/json'
+        ).json()
+        self.assertEqual((data['status'], data['response']), ('success', 'Segunda'))
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+    @mock.patch.object(contexto_chatbot, 'cache_compartida', return_value=True)
+    def test_turno_con_contexto_en_cache_compartida(self, _):
+        cache.clear()
+        url = reverse('send_message')
+        session_id = self.client.post(url, json.dumps({'message': 'hola'}), content_type='application/json').json()['session_id']
+        with CaptureQueriesContext(connection) as consultas:
+            data = self.client.post(
+                url, json.dumps({'message': 'y la garantía?', 'session_id': session_id}), content_type='application/json'
+            ).json()
+        self.assertEqual(data['status'], 'success')
+        # Mensaje del usuario (antes de llamar al bot) y respuesta del bot
+        self.assertEqual([q['sql'].split()[0] for q in consultas], ['INSERT', 'INSERT'])
+
+        # Caché fría: el contexto se reconstruye desde la base de datos
+        cache.clear()
+        contexto = contexto_chatbot.cargar(session_id)
+        self.assertEqual([m['is_bot'] for m in contexto['mensajes']], [False, True, False, True])
+        self.assertEqual(contexto['mensajes'][2]['message'], 'y la garantía?')
+
+    def test_turno_con_cache_local_lee_el_contexto_una_vez(self):
+        url = reverse('send_message')
+        session_id = self.client.post(url, json.dumps({'message': 'hola'}), content_type='application/json').json()['session_id']
+        with CaptureQueriesContext(connection) as consultas:
+            data = self.client.post(
+                url, json.dumps({'message': 'y la garantía?', 'session_id': session_id}), content_type='application/json'
+            ).json()
+        self.assertEqual(data['status'], 'success')
+        # Contexto (mensajes con su conversación), mensaje del usuario y respuesta del bot
+        self.assertEqual([q['sql'].split()[0] for q in consultas], ['SELECT', 'INSERT', 'INSERT'])
+
+    def test_cache_local_no_deja_contexto_obsoleto(self):
+        contexto = contexto_chatbot.cargar('sesion-workers')
+        # Turno atendido por otro worker (otra LocMemCache): solo lo ve la base de datos
+        ChatMessage.objects.create(conversation_id=contexto['conversacion_id'], message='desde otro worker')
+        self.assertEqual(contexto_chatbot.cargar('sesion-workers')['mensajes'][-1]['message'], 'desde otro worker')
+
+    def test_error_del_bot_conserva_el_mensaje(self):
+        with mock.patch.object(ChatBotService, 'aget_ai_response', side_effect=RuntimeError('caído')):
+            data = self.client.post(
+                reverse('send_message'), json.dumps({'message': 'hola', 'session_id': 's-error'}), content_type='application/json'
+            ).json()
+        self.assertEqual(data['status'], 'error')
+        self.assertEqual(list(ChatMessage.objects.filter(conversation__session_id='s-error').values_list('message', 'is_bot')), [('hola', False)])
+
+
+class HistorialConversacionTest(TestCase):
+
+    def setUp(self):
+        self.conversacion = ChatConversation.objects.create(session_id='sesion-1')
+        ChatMessage.objects.bulk_create(
+            ChatMessage(conversation=self.conversacion, message=f'm{i}', is_bot=bool(i % 2)) for i in range(7)
+        )
+        self.url = reverse('conversation_history', kwargs={'session_id': 'sesion-1'})
+
+    def test_paginas_hacia_atras_y_adelante(self):
+        pagina = self.client.get(self.url, {'limit': 3}).json()
+        self.assertEqual([m['message'] for m in pagina['history']], ['m4', 'm5', 'm6'])
+        self.assertTrue(pagina['hay_mas'])
+        anterior = self.client.get(self.url, {'limit': 3, 'before': pagina['before']}).json()
+        self.assertEqual([m['message'] for m in anterior['history']], ['m1', 'm2', 'm3'])
+        siguiente = self.client.get(self.url, {'limit': 5, 'after': anterior['after']}).json()
+        self.assertEqual([m['message'] for m in siguiente['history']], ['m4', 'm5', 'm6'])
+        self.assertFalse(siguiente['hay_mas'])
+        self.assertEqual(self.client.get(self.url, {'before': 'x'}).status_code, 400)
+
+    def test_exportacion_completa_en_streaming(self):
+        response = self.client.get(self.url, {'export': 'json'})
+        self.assertTrue(response.streaming)
+        datos = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([m['message'] for m in datos['history']], [f'm{i}' for i in range(7)])
+
+
+class CacheRespuestasTest(SimpleTestCase):
+
+    def setUp(self):
+        reset_chatbot_service()
+        reset_dialogflow_service()
+        cache.clear()
+        self.addCleanup(reset_chatbot_service)
+        self.addCleanup(reset_dialogflow_service)
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar('¿Cuánto cuesta un kit de 3 kW?'), normalizar('cuanto cuesta un  KIT de 3kw'))
+
+    def test_chatbot_responde_desde_cache(self):
+        with mock.patch.object(ChatBotService, '_consultar', return_value='Desde 3 millones') as consultar:
+            servicio = ChatBotService()
+            servicio.get_ai_response('¿Cuánto cuesta un kit de 3 kW?')
+            inicio = time.perf_counter()
+            respuesta = servicio.get_ai_response('cuanto cuesta un kit de 3kw')
+            self.assertLess(time.perf_counter() - inicio, 0.001)
+        self.assertEqual(respuesta, 'Desde 3 millones')
+        self.assertEqual(consultar.call_count, 1)
+        metricas = cache_respuestas.metricas()['huggingface']
+        self.assertEqual((metricas['aciertos'], metricas['fallos']), (1, 1))
+
+    def test_no_guarda_respuesta_de_respaldo(self):
+        with mock.patch.object(ChatBotService, '_consultar', return_value=ChatBotService.RESPUESTA_RESPALDO) as consultar:
+            ChatBotService().get_ai_response('hola')
+            ChatBotService().get_ai_response('hola')
+        self.assertEqual(consultar.call_count, 2)
+
+    def test_chatbot_no_cachea_turnos_con_historial(self):
+        historial = [{'message': 'Tengo una casa en Maipú', 'is_bot': False}, {'message': 'Perfecto', 'is_bot': True}]
+        with mock.patch.object(ChatBotService, '_consultar', side_effect=['Para tu casa: 3 kW', 'Desde 3 millones']) as consultar:
+            servicio = ChatBotService()
+            servicio.get_ai_response('¿y cuánto cuesta?', historial)
+            # Otro usuario, sin historial: no recibe la respuesta de la conversación anterior
+            self.assertEqual(servicio.get_ai_response('¿y cuánto cuesta?'), 'Desde 3 millones')
+        self.assertEqual(consultar.call_count, 2)
+
+    def test_dialogflow_no_cachea_sesiones_con_contexto(self):
+        servicio = DialogflowService.__new__(DialogflowService)
+        con_contexto = {'query': 'sí', 'response': 'Agendado para mañana', 'intent': 'confirmar_visita', 'confidence': 0.9, 'contextos': 1}
+        sin_contexto = {'query': 'sí', 'response': '¿Sí a qué?', 'intent': 'fallback', 'confidence': 0.4, 'contextos': 0}
+        with mock.patch.object(DialogflowService, '_detect_intent', side_effect=[con_contexto, sin_contexto, sin_contexto]) as detectar:
+            self.assertEqual(servicio.detect_intent('s1', 'sí')['response'], 'Agendado para mañana')
+            self.assertEqual(servicio.detect_intent('s2', 'sí')['response'], '¿Sí a qué?')
+            # s1 sigue con contexto: consulta a Dialogflow aunque el texto esté en caché
+            servicio.detect_intent('s1', 'sí')
+        self.assertEqual(detectar.call_count, 3)
+        self.assertNotIn('contextos', servicio.detect_intent('s2', 'sí'))
+
+    @override_settings(CHATBOT_CACHE_COMPARTIDA=True)
+    def test_dialogflow_comparte_entre_procesos(self):
+        servicio = DialogflowService.__new__(DialogflowService)
+        respuesta = {'query': 'Horario?', 'response': 'De 9 a 18', 'intent': 'horario', 'confidence': 0.9}
+        with mock.patch.object(DialogflowService, '_detect_intent', return_value=respuesta) as detectar:
+            servicio.detect_intent('s1', 'Horario?')
+            cache_respuestas.respuestas_dialogflow.limpiar()  # como otro worker: LRU vacía
+            self.assertEqual(servicio.detect_intent('s2', 'horario')['response'], 'De 9 a 18')
+        self.assertEqual(detectar.call_count, 1)
+        self.assertEqual(cache_respuestas.metricas()['dialogflow']['aciertos_compartida'], 1)
+
+
+# ===========================
+# CHAT DE COTIZACIÓN
+# ===========================
+
+def crear_chat(username='cliente1'):
+    """Cliente + producto + chat de cotización mínimos para los tests."""
+    cliente = User.objects.create_user(username=username, password='clave-segura-123')
+    categoria, _ = Categoria.objects.get_or_create(nombre='Paneles')
+    producto, _ = Producto.objects.get_or_create(
+        sku='PAN-450', defaults={'nombre': 'Panel 450W', 'precio': 150000, 'categoria': categoria}
+    )
+    return ChatCotizacion.objects.create(cliente=cliente, producto=producto)
+
+
+@mock.patch.object(tiempo_real, 'ESPERA_MAXIMA', 0.3)
+@mock.patch.object(tiempo_real, 'INTERVALO_REVISION', 0.05)
+class ChatEsperaTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.chat = crear_chat()
+        self.client.force_login(self.chat.cliente)
+        self.async_client.force_login(self.chat.cliente)
+        self.url = reverse('chat_espera_view', kwargs={'chat_id': self.chat.id})
+
+    def esperar(self, ultimo_id):
+        """Petición por ASGI (la única que mantiene la espera abierta)."""
+        async def pedir():
+            return await self.async_client.get(self.url, {'ultimo_id': ultimo_id})
+
+        inicio = time.monotonic()
+        data = async_to_sync(pedir)().json()
+        return data, time.monotonic() - inicio
+
+    def test_retorna_mensajes_nuevos(self):
+        mensaje = MensajeCotizacion.objects.create(chat=self.chat, autor=self.chat.cliente, mensaje='Hola')
+        data, _ = self.esperar(0)
+        self.assertEqual([m['id'] for m in data['mensajes']], [mensaje.id])
+
+    def test_sin_mensajes_vence_la_espera(self):
+        data, segundos = self.esperar(0)
+        self.assertEqual(data['mensajes'], [])
+        self.assertGreaterEqual(segundos, 0.3)
+        self.assertEqual(data['reintentar_ms'], 0)
+
+    def test_marca_en_cache_despierta_la_espera(self):
+        mensaje = MensajeCotizacion.objects.create(chat=self.chat, autor=self.chat.cliente, mensaje='Hola')
+        tiempo_real.notificar_mensaje(self.chat.id, mensaje.id)
+        data, _ = self.esperar(0)
+        self.assertEqual(len(data['mensajes']), 1)
+
+    def test_wsgi_no_espera_y_vuelve_al_polling(self):
+        inicio = time.monotonic()
+        data = self.client.get(self.url, {'ultimo_id': 0}).json()
+        self.assertLess(time.monotonic() - inicio, 0.3)
+        self.assertEqual(data['mensajes'], [])
+        self.assertEqual(data['reintentar_ms'], tiempo_real.INTERVALO_POLLING * 1000)
+
+    def test_cache_fria_siembra_la_marca_con_la_bd(self):
+        mensaje = MensajeCotizacion.objects.create(chat=self.chat, autor=self.chat.cliente, mensaje='Hola')
+        cache.clear()
+        # Un ultimo_id inventado no queda como marca para los demás
+        self.client.get(self.url, {'ultimo_id': 10 ** 9})
+        self.assertEqual(tiempo_real.ultimo_mensaje_id(self.chat.id), mensaje.id)
+
+    def test_sembrar_no_pisa_una_marca_mas_nueva(self):
+        MensajeCotizacion.objects.create(chat=self.chat, autor=self.chat.cliente, mensaje='Hola')
+        cache.clear()
+        tiempo_real.notificar_mensaje(self.chat.id, 10 ** 6)
+        self.assertEqual(tiempo_real.sembrar_marca(self.chat.id), 10 ** 6)
+
+    def _mensaje_de_otro_worker(self):
+        """Guarda un mensaje sin mover la marca de este proceso (como otro worker con caché local)."""
+        self.client.get(self.url, {'ultimo_id': 0})  # siembra la marca de este proceso
+        with mock.patch.object(tiempo_real, 'notificar_mensaje'):
+            return MensajeCotizacion.objects.create(chat=self.chat, autor=self.chat.cliente, mensaje='Hola')
+
+    def test_mensaje_de_otro_worker_llega_al_vencer_la_espera(self):
+        mensaje = self._mensaje_de_otro_worker()
+        with mock.patch.object(fragmentos, 'cache_compartida', return_value=True):
+            data, _ = self.esperar(0)
+        self.assertEqual([m['id'] for m in data['mensajes']], [mensaje.id])
+        self.assertEqual(tiempo_real.ultimo_mensaje_id(self.chat.id), mensaje.id)
+
+    def test_mensaje_de_otro_worker_con_cache_local_en_wsgi(self):
+        mensaje = self._mensaje_de_otro_worker()
+        data = self.client.get(self.url, {'ultimo_id': 0}).json()
+        self.assertEqual([m['id'] for m in data['mensajes']], [mensaje.id])
+
+    @mock.patch.object(tiempo_real, 'INTERVALO_POLLING', 0.1)
+    @mock.patch.object(tiempo_real, 'INTERVALO_REVISION', 0.05)
+    @mock.patch.object(tiempo_real, 'ESPERA_MAXIMA', 5)
+    def test_cache_local_revisa_la_bd_durante_la_espera(self):
+        mensaje = self._mensaje_de_otro_worker()
+        data, segundos = self.esperar(0)
+        self.assertEqual([m['id'] for m in data['mensajes']], [mensaje.id])
+        self.assertLess(segundos, 2)
+
+    def test_otro_cliente_no_autorizado(self):
+        otro = User.objects.create_user(username='intruso', password='clave-segura-123')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class FlujoCotizacionTest(TestCase):
+
+    def setUp(self):
+        self.chat = crear_chat()
+        self.cliente = User.objects.select_related('perfil').get(pk=self.chat.cliente_id)
+        self.cliente.email = 'cliente@correo.cl'
+        self.cliente.save()
+
+    def _responder(self, texto):
+        return procesar_respuesta_bot(self.chat, texto, usuario=self.cliente)
+
+    def test_flujo_completo_una_consulta_por_mensaje(self):
+        self.assertIn('cliente1', self._responder('Hola'))
+        pasos = [
+            ('no', 'nombre'), ('Juan Pérez', 'confirmar_email'), ('sí', 'telefono'),
+            ('+56 9 1234 5678', 'region'), ('RM, Maipú', 'detalle'),
+            ('Casa con consumo de 350 kWh', 'completo'),
+        ]
+        for texto, paso in pasos:
+            with self.assertNumQueries(1):
+                self._responder(texto)
+            self.assertEqual(self.chat.paso_intake, paso)
+
+        self.chat.refresh_from_db()
+        self.assertEqual(
+            (self.chat.cliente_nombre_dato, self.chat.cliente_email_dato, self.chat.estado),
+            ('Juan Pérez', 'cliente@correo.cl', 'en_proceso'),
+        )
+        self.assertIsNone(self._responder('¿Hola?'))
+
+    def test_dato_invalido_no_avanza(self):
+        self._responder('Hola')
+        self._responder('no')
+        with self.assertNumQueries(0):
+            self.assertIn('completo', self._responder('Juan'))
+        self.assertEqual(self.chat.paso_intake, 'nombre')
+
+    def test_api_guarda_mensaje_y_respuesta(self):
+        olvidar_bot()
+        self.addCleanup(olvidar_bot)
+        self.client.force_login(self.cliente)
+        url = reverse('chat_api_view', kwargs={'chat_id': self.chat.id})
+        self.client.post(url, json.dumps({'mensaje': 'Hola'}), content_type='application/json')
+
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            data = self.client.post(url, json.dumps({'mensaje': 'sí'}), content_type='application/json').json()
+        sql = [q['sql'] for q in consultas]
+        # Un INSERT por mensaje (cliente y bot), en una transacción
+        self.assertEqual(sum(q.startswith('INSERT') for q in sql), 2)
+        self.assertFalse(any('WHERE "auth_user"."is_superuser"' in q for q in sql))
+
+        self.assertEqual([m['es_bot'] for m in data['mensajes']], [False, True])
+        ids = list(MensajeCotizacion.objects.filter(chat=self.chat).order_by('id').values_list('id', flat=True))
+        self.assertEqual([m['id'] for m in data['mensajes']], ids[-2:])
+        self.assertEqual(tiempo_real.ultimo_mensaje_id(self.chat.id), ids[-1])
+        self.assertEqual(data['mensajes'][1]['autor'], settings.CHAT_BOT_USERNAME)
+
+    def test_staff_unido_detiene_el_asistente(self):
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        MensajeCotizacion.objects.create(chat=self.chat, autor=admin, mensaje='Hola, te ayudo')
+        self.chat.refresh_from_db()
+        self.assertTrue(self.chat.staff_unido)
+        self.assertIsNone(self._responder('Hola'))
+        self.assertEqual(self.chat.estado, 'en_proceso')
+
+
+class ChatApiCursorTest(TestCase):
+
+    def setUp(self):
+        self.chat = crear_chat()
+        self.client.force_login(self.chat.cliente)
+        self.url = reverse('chat_api_view', kwargs={'chat_id': self.chat.id})
+        self.mensajes = MensajeCotizacion.objects.bulk_create([
+            MensajeCotizacion(chat=self.chat, autor=self.chat.cliente, mensaje=f'm{i}') for i in range(7)
+        ])
+        self.ids = list(MensajeCotizacion.objects.filter(chat=self.chat).order_by('id').values_list('id', flat=True))
+
+    def test_sin_cursor_retorna_ultima_pagina(self):
+        data = self.client.get(self.url, {'limit': 3}).json()
+        self.assertEqual([m['id'] for m in data['mensajes']], self.ids[-3:])
+        self.assertTrue(data['hay_mas'])
+
+    def test_after_id(self):
+        data = self.client.get(self.url, {'after_id': self.ids[1], 'limit': 3}).json()
+        self.assertEqual([m['id'] for m in data['mensajes']], self.ids[2:5])
+        self.assertTrue(data['hay_mas'])
+
+    def test_before_id(self):
+        data = self.client.get(self.url, {'before_id': self.ids[3], 'limit': 10}).json()
+        self.assertEqual([m['id'] for m in data['mensajes']], self.ids[:3])
+        self.assertFalse(data['hay_mas'])
+
+    def test_consultas_no_dependen_del_historial(self):
+        with CaptureQueriesContext(connection) as corto:
+            self.client.get(self.url, {'after_id': 0})
+        MensajeCotizacion.objects.bulk_create([
+            MensajeCotizacion(chat=self.chat, autor=self.chat.cliente, mensaje='x') for _ in range(60)
+        ])
+        with CaptureQueriesContext(connection) as largo:
+            self.client.get(self.url, {'after_id': 0})
+        self.assertEqual(len(corto), len(largo))
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get(self.url, {'after_id': 'x'}).status_code, 400)
+
+
+# ===========================
+# LISTADO DE COTIZACIONES (ADMIN)
+# ===========================
+
+class ContadoresYPaginacionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        chat = crear_chat()
+        self.chats = [chat] + [
+            ChatCotizacion.objects.create(cliente=chat.cliente, producto=chat.producto, estado=estado)
+            for estado in ['pendiente', 'aprobada', 'aprobada', 'rechazada']
+        ]
+
+    def test_contadores_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            contadores = contadores_por_estado()
+        self.assertEqual(contadores, {'todos': 5, 'pendiente': 2, 'en_proceso': 0, 'aprobada': 2, 'rechazada': 1})
+        with self.assertNumQueries(0):
+            contadores_por_estado()
+
+    def test_guardar_invalida_contadores(self):
+        contadores_por_estado()
+        self.chats[0].estado = 'en_proceso'
+        self.chats[0].save()
+        self.assertEqual(contadores_por_estado()['en_proceso'], 1)
+
+    def test_paginacion_por_cursor_recorre_todo(self):
+        vistos, cursor = [], None
+        while True:
+            pagina, cursor = pagina_por_fecha(ChatCotizacion.objects.all(), cursor=cursor, tamano=2)
+            vistos += [c.id for c in pagina]
+            if cursor is None:
+                break
+        self.assertEqual(sorted(vistos), sorted(c.id for c in self.chats))
+        self.assertEqual(len(vistos), len(set(vistos)))
+
+    def test_vista_listado(self):
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        self.client.force_login(admin)
+        response = self.client.get(reverse('cotizaciones'), {'estado': 'aprobada'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_filtro'], 2)
+        self.assertEqual(len(response.context['chats_cotizacion']), 2)
+
+
+# ===========================
+# EXPORTACIÓN CSV
+# ===========================
+
+class ExportacionCsvTest(TestCase):
+
+    def setUp(self):
+        self.chat = crear_chat()
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        self.client.force_login(admin)
+
+    def _leer(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_inventario(self):
+        lineas = self._leer(self.client.get(reverse('control_inventario'), {'export': 'csv'}))
+        self.assertEqual(lineas[0].split(',')[0], 'SKU')
+        self.assertTrue(lineas[1].startswith('PAN-450,'))
+        # Con búsqueda el orden es por relevancia (anotación) y también se exporta por bloques
+        lineas = self._leer(self.client.get(reverse('control_inventario'), {'export': 'csv', 'q': 'panel'}))
+        self.assertTrue(lineas[1].startswith('PAN-450,'))
+
+    def test_historial_respeta_filtros(self):
+        lineas = self._leer(self.client.get(reverse('historial_cotizaciones'), {'export': 'csv', 'estado': 'aprobada'}))
+        self.assertEqual(len(lineas), 1)
+        lineas = self._leer(self.client.get(reverse('historial_cotizaciones'), {'export': 'csv', 'estado': 'pendiente'}))
+        self.assertEqual(len(lineas), 2)
+
+    def test_productos_adquiridos(self):
+        ProductoAdquirido.objects.create(
+            cliente=self.chat.cliente, producto=self.chat.producto, precio_adquisicion=150000
+        )
+        lineas = self._leer(self.client.get(reverse('calculos_estadisticas'), {'export': 'csv'}))
+        self.assertEqual(len(lineas), 2)
+        self.assertIn('PAN-450', lineas[1])
+
+    def test_por_bloques_recorre_en_orden_con_empates(self):
+        categoria = self.chat.producto.categoria
+        Producto.objects.bulk_create([
+            Producto(nombre=f'Extra {i}', sku=f'EXT-{i}', categoria=categoria, precio=1000, stock=i % 3)
+            for i in range(7)
+        ])
+        queryset = Producto.objects.order_by('-stock')
+        esperado = list(queryset.order_by('-stock', '-pk').values_list('pk', flat=True))
+        # 8 filas en bloques de 3: tres consultas, sin OFFSET
+        with CaptureQueriesContext(connection) as consultas:
+            vistos = [p.pk for p in exportacion.por_bloques(queryset, tamano=3)]
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(len(consultas), 3)
+        self.assertFalse(any('OFFSET' in c['sql'] for c in consultas.captured_queries))
+
+
+# ===========================
+# KPIs DEL DASHBOARD
+# ===========================
+
+class DashboardSnapshotTest(TestCase):
+
+    def _snapshot(self):
+        """(KPIs recalculados desde las tablas, KPIs mantenidos por señales)"""
+        snapshot = kpis.obtener_snapshot()
+        return kpis.calcular_kpis(), {campo: getattr(snapshot, campo) for campo in kpis.calcular_kpis()}
+
+    def test_senales_mantienen_el_snapshot(self):
+        kpis.reconciliar()
+        chat = crear_chat()
+        producto = chat.producto
+        producto.stock = 40
+        producto.save()
+        Producto.objects.create(nombre='Inversor', sku='INV-3K', precio=1, stock=5, categoria=producto.categoria)
+        perfil = chat.cliente.perfil
+        perfil.tipo_usuario = 'vendedor'
+        perfil.save()
+        User.objects.create_user(username='cliente2', password='clave-segura-123')
+        ChatCotizacion.objects.create(cliente=chat.cliente, producto=producto)
+        chat.delete()
+
+        calculado, incremental = self._snapshot()
+        self.assertEqual(incremental, calculado)
+
+    def test_endpoint_lee_una_fila(self):
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        self.client.force_login(admin)
+        kpis.reconciliar()
+        with CaptureQueriesContext(connection) as consultas:
+            data = self.client.get(reverse('admin_kpis_api')).json()
+        self.assertEqual(data['kpi_total_clientes'], 1)
+        self.assertFalse(any('COUNT' in q['sql'] or 'SUM' in q['sql'] for q in consultas))
+        self.assertContains(self.client.get(reverse('admin_panel')), 'data-kpi="kpi_total_clientes"')
+
+
+# ===========================
+# DIMENSIONAMIENTO SOLAR
+# ===========================
+
+class DimensionamientoTest(TestCase):
+
+    def setUp(self):
+        self.ruta_cache = os.path.join(settings.BASE_DIR, 'dimensionamiento_test.json')
+        self.addCleanup(lambda: os.path.exists(self.ruta_cache) and os.remove(self.ruta_cache))
+        self.addCleanup(dimensionamiento.recargar_tablas)
+        dimensionamiento.recargar_tablas()
+
+    def test_dimensionar_ongrid(self):
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            r = dimensionamiento.dimensionar(180, 'ongrid')
+        # Banda de 1 kW (175 a 340 kWh) -> 2 paneles de 550 W e inversor de 1 kW
+        self.assertEqual(r['paneles']['cantidad'], 2)
+        self.assertEqual([i['codigo'] for i in r['items'] if i['tipo'] == 'inversor'], ['on1k'])
+        self.assertEqual(r['kit_recomendado'], 'ongrid-1kw')
+        self.assertEqual(r['total'], r['subtotal'] + r['imprevistos'] + r['iva'])
+        self.assertIsNone(r['baterias'])
+        for invalido in ('abc', 'inf', 'nan', -5):
+            with self.assertRaises(ValueError):
+                dimensionamiento.dimensionar(invalido, 'offgrid')
+
+    def test_paneles_de_la_misma_banda_que_el_kit(self):
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            r = dimensionamiento.dimensionar(300, 'ongrid')
+            kit = next(k for k in dimensionamiento.kits()['ongrid'] if k['id'] == r['kit_recomendado'])
+        self.assertEqual(r['kit_recomendado'], 'ongrid-1kw')
+        self.assertEqual(r['potencia_requerida_kw'], kit['potencia'])
+        self.assertEqual(r['paneles']['cantidad'], 2)
+
+    def test_api_rechaza_consumo_no_finito(self):
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        self.client.force_login(admin)
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            response = self.client.get(reverse('dimensionamiento_api'), {'consumo_kwh': 'inf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cache_json_evita_leer_excel(self):
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            dimensionamiento.tablas()
+            self.assertTrue(os.path.exists(self.ruta_cache))
+            dimensionamiento.recargar_tablas()
+            with mock.patch.object(dimensionamiento, '_leer_planillas') as leer:
+                self.assertTrue(dimensionamiento.dimensionar(600, 'offgrid')['baterias'])
+            leer.assert_not_called()
+
+    def test_lote_coincide_con_dimensionar(self):
+        filas = [
+            {'consumo_kwh': kwh, 'tipo_sistema': tipo}
+            for kwh in (90, 180, 355, 600, 905, 3000) for tipo in ('ongrid', 'offgrid')
+        ] + [{'consumo_kwh': 'x', 'tipo_sistema': 'ongrid'}, {'consumo_kwh': 200, 'tipo_sistema': 'eolico'}]
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            resultados = dimensionamiento.cotizar_lote(filas)
+            for fila, resultado in zip(filas[:-2], resultados):
+                esperado = dimensionamiento.dimensionar(fila['consumo_kwh'], fila['tipo_sistema'])
+                for campo in ('subtotal', 'iva', 'total', 'kit_recomendado'):
+                    self.assertEqual(resultado[campo], esperado[campo], (fila, campo))
+                self.assertEqual(resultado['paneles'], esperado['paneles']['cantidad'])
+        self.assertIn('error', resultados[-1])
+        self.assertIn('error', resultados[-2])
+
+    def test_lote_error_por_fila_invalida(self):
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        self.client.force_login(admin)
+        cuerpo = '[[300, "ongrid"], "x", {"consumo_kwh": "inf"}, {"consumo_kwh": 1e400}, {"consumo_kwh": 300}]'
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            response = self.client.post(reverse('cotizar_lote_api'), cuerpo, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()['resultados']
+        self.assertEqual([r['fila'] for r in resultados], [1, 2, 3, 4, 5])
+        self.assertTrue(all('error' in r for r in resultados[:4]))
+        self.assertEqual(resultados[4]['kit_recomendado'], 'ongrid-1kw')
+
+    def test_lote_temporada_invalida_es_error_de_la_fila(self):
+        admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        self.client.force_login(admin)
+        filas = [
+            {'consumo_kwh': 300, 'temporada': ['verano']},
+            {'consumo_kwh': 300, 'temporada': {'verano': True}},
+            {'consumo_kwh': 300, 'temporada': 'otoño'},
+            {'consumo_kwh': 300, 'temporada': ' Verano '},
+            {'consumo_kwh': 300},
+        ]
+        with self.settings(DIMENSIONAMIENTO_CACHE_PATH=self.ruta_cache):
+            response = self.client.post(reverse('cotizar_lote_api'), {'filas': filas}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()['resultados']
+        self.assertTrue(all('error' in r for r in resultados[:3]))
+        self.assertFalse(any('error' in r for r in resultados[3:]))
+        self.assertGreaterEqual(resultados[4]['potencia_requerida_kw'], resultados[3]['potencia_requerida_kw'])
+
+    def test_leer_escenarios_csv(self):
+        filas = dimensionamiento.leer_escenarios('consumo_kwh,tipo_sistema,region\n350,offgrid,Atacama\n')
+        self.assertEqual(filas, [{'consumo_kwh': '350', 'tipo_sistema': 'offgrid', 'region': 'Atacama'}])
+
+
+# ===========================
+# PLANES DE CONSULTA (EXPLAIN) DE LAS VISTAS DE LISTADO
+# ===========================
+
+# Tablas de configuración con pocas filas, donde recorrerlas completas es lo esperado
+TABLAS_PEQUENAS = {'categorias', 'dashboard_snapshot', 'django_content_type'}
+
+
+def escaneos_completos(consultas):
+    """
+    Ejecuta EXPLAIN sobre cada SELECT capturado y retorna [(tabla, sql)] de los que
+    recorren una tabla completa sin índice (SQLite: 'SCAN <tabla>'; MySQL: type=ALL).
+    """
+    hallazgos = []
+    with connection.cursor() as cursor:
+        for sql in dict.fromkeys(q['sql'] for q in consultas if q['sql'].startswith('SELECT')):
+            if connection.vendor == 'mysql':
+                cursor.execute('EXPLAIN ' + sql)
+                columnas = [c[0] for c in cursor.description]
+                tablas = [fila['table'] for fila in (dict(zip(columnas, f)) for f in cursor.fetchall()) if fila['type'] == 'ALL']
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                tablas = [
+                    detalle.split()[1] for *_, detalle in cursor.fetchall()
+                    if detalle.startswith('SCAN') and ' USING ' not in detalle
+                ]
+            hallazgos += [(tabla, sql) for tabla in tablas if tabla not in TABLAS_PEQUENAS]
+    return hallazgos
+
+
+class PlanesConsultaTest(TestCase):
+    """Cada vista de listado, sobre un conjunto de datos sembrado, debe usar índices."""
+
+    @classmethod
+    def setUpTestData(cls):
+        clave = make_password('clave-segura-123')
+        ahora = timezone.now()
+        categoria = Categoria.objects.create(nombre='Paneles')
+        Producto.objects.bulk_create(
+            Producto(nombre=f'Panel {i}', sku=f'PAN-{i}', precio=1000 + i, stock=i % 7, categoria=categoria, activo=bool(i % 3))
+            for i in range(60)
+        )
+        User.objects.bulk_create(
+            User(username=f'cliente{i}', password=clave, date_joined=ahora - timedelta(days=i)) for i in range(150)
+        )
+        usuarios = list(User.objects.order_by('id'))
+        Perfil.objects.bulk_create(Perfil(usuario=u) for u in usuarios)
+        productos = list(Producto.objects.all())
+        estados = [estado for estado, _ in ChatCotizacion.ESTADO_CHOICES]
+        ChatCotizacion.objects.bulk_create(
+            ChatCotizacion(cliente=usuarios[i % 150], producto=productos[i % 60], estado=estados[i % 4]) for i in range(400)
+        )
+        cls.chat = ChatCotizacion.objects.order_by('id').first()
+        MensajeCotizacion.objects.bulk_create(
+            MensajeCotizacion(chat=cls.chat, autor=cls.chat.cliente, mensaje=f'm{i}') for i in range(100)
+        )
+        conversacion = ChatConversation.objects.create(session_id='sesion-planes')
+        ChatMessage.objects.bulk_create(ChatMessage(conversation=conversacion, message=f'm{i}') for i in range(100))
+        cls.admin = User.objects.create_user(username='admin1', password='clave-segura-123', is_staff=True)
+        # bulk_create no dispara señales: el snapshot se deja al día como lo haría el cron
+        kpis.reconciliar()
+
+    def _verificar(self, usuario, url, parametros=None):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, parametros or {})
+        self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(escaneos_completos(consultas), [], url)
+
+    def test_vistas_de_administracion(self):
+        for nombre, parametros in [
+            ('admin_panel', None),
+            ('control_inventario', {'estado': 'activo'}),
+            ('cotizaciones', None),
+            ('cotizaciones', {'estado': 'pendiente'}),
+            ('historial_cotizaciones', {'estado': 'aprobada'}),
+            ('historial_cotizaciones', {'desde': '2020-01-01'}),
+            ('lista_clientes', None),
+        ]:
+            with self.subTest(vista=nombre, parametros=parametros):
+                self._verificar(self.admin, reverse(nombre), parametros)
+
+    def test_vistas_de_cliente(self):
+        cliente = self.chat.cliente
+        self._verificar(cliente, reverse('lista_chats_cotizacion'))
+        self._verificar(cliente, reverse('chat_api_view', kwargs={'chat_id': self.chat.id}), {'limit': 20})
+        self._verificar(cliente, reverse('conversation_history', kwargs={'session_id': 'sesion-planes'}), {'limit': 20})
+
+
+# ===========================
+# GENERADOR DE DATOS SINTÉTICOS
+# ===========================
+
+class GeneradorDatosTest(TestCase):
+
+    def _generar(self, semilla):
+        generador = datos_sinteticos.Generador(dias=30, semilla=semilla, tamano_lote=7)
+        productos = generador.productos(5)
+        clientes = generador.clientes(20)
+        creados = generador.cotizaciones(40, clientes, productos, mensajes_por_chat=3)
+        return generador, clientes, creados
+
+    def test_genera_con_perfiles_fechas_y_kpis(self):
+        generador, clientes, creados = self._generar(semilla=7)
+        datos_sinteticos.despues_de_generar()
+
+        self.assertEqual(Perfil.objects.filter(usuario_id__in=clientes, tipo_usuario='cliente').count(), 20)
+        self.assertEqual(ChatCotizacion.objects.count(), 40)
+        self.assertEqual(MensajeCotizacion.objects.count(), creados['mensajes'])
+        fechas = ChatCotizacion.objects.values_list('fecha_creacion', flat=True)
+        self.assertTrue(all(generador.desde <= f <= generador.hasta for f in fechas))
+        self.assertGreater(len({f.date() for f in fechas}), 1)
+        # Una sola hash de contraseña para todos y válida
+        self.assertTrue(User.objects.get(pk=clientes[0]).check_password('demo1234'))
+
+        snapshot = kpis.obtener_snapshot()
+        esperado = kpis.calcular_kpis()
+        self.assertEqual(snapshot.total_clientes, esperado['total_clientes'])
+        self.assertEqual(snapshot.cotizaciones_mes, esperado['cotizaciones_mes'])
+
+    def test_misma_semilla_mismos_datos(self):
+        def firma():
+            return list(ChatCotizacion.objects.order_by('pk').values_list('estado', 'producto__sku', 'cliente__username'))
+
+        self._generar(semilla=3)
+        primera = firma()
+        datos_sinteticos.limpiar()
+        self.assertFalse(User.objects.filter(username__startswith=datos_sinteticos.PREFIJO_USUARIO).exists())
+        self._generar(semilla=3)
+        self.assertEqual(firma(), primera)
+
+    def test_limpiar_sin_senales_por_fila(self):
+        self._generar(semilla=5)
+        datos_sinteticos.despues_de_generar()
+        with mock.patch.object(kpis, 'registrar_eliminado') as por_fila, \
+                mock.patch.object(datos_sinteticos, 'despues_de_generar', wraps=datos_sinteticos.despues_de_generar) as final:
+            datos_sinteticos.limpiar()
+        por_fila.assert_not_called()
+        final.assert_called_once_with()
+        self.assertFalse(ChatCotizacion.objects.exists())
+        self.assertFalse(Producto.objects.filter(sku__startswith=datos_sinteticos.PREFIJO_SKU).exists())
+        self.assertEqual(kpis.obtener_snapshot().total_clientes, kpis.calcular_kpis()['total_clientes'])
+
+        # Los receptores vuelven a quedar conectados
+        with mock.patch.object(kpis, 'registrar_eliminado') as por_fila:
+            crear_chat().delete()
+        por_fila.assert_called_once()
+
+    def test_ids_por_clave_sin_ids_en_insert_y_con_otro_proceso(self):
+        # Como MySQL: bulk_create no asigna pk, y otro proceso inserta en medio del lote
+        original = QuerySet.bulk_create
+        ajeno = User.objects.create_user('ajeno')
+
+        def sin_ids(queryset, objetos, *args, **kwargs):
+            if queryset.model is ChatCotizacion:
+                # Dentro de fechas_manuales(): auto_now_add está apagado
+                ahora = timezone.now()
+                ChatCotizacion.objects.create(
+                    cliente=ajeno, producto=Producto.objects.first(), fecha_creacion=ahora, fecha_actualizacion=ahora,
+                )
+            creados = original(queryset, objetos, *args, **kwargs)
+            for objeto in objetos:
+                objeto.pk = None
+            return creados
+
+        with mock.patch.object(QuerySet, 'bulk_create', sin_ids):
+            _, clientes, _ = self._generar(semilla=9)
+
+        generados = ChatCotizacion.objects.filter(cliente_id__in=clientes)
+        self.assertEqual(generados.count(), 40)
+        self.assertEqual(MensajeCotizacion.objects.exclude(chat__in=generados).count(), 0)
+        self.assertEqual(Perfil.objects.filter(usuario_id__in=clientes).count(), 20)
+
+
+# ===========================
+# PRONÓSTICOS DE REPORTES
+# ===========================
+
+class PronosticosTest(TestCase):
+
+    def test_ventana_que_empieza_en_el_cambio_de_horario(self):
+        # 2026-09-06: en Chile el reloj salta de 00:00 a 01:00 (la medianoche no existe)
+        chat = crear_chat()
+        ChatCotizacion.objects.filter(pk=chat.pk).update(
+            fecha_creacion=timezone.make_aware(datetime(2026, 9, 6, 10)),
+        )
+        ChatCotizacion.objects.filter(pk=crear_chat('cliente2').pk).update(
+            fecha_creacion=timezone.make_aware(datetime(2026, 9, 5, 23)),
+        )
+
+        dias = pronosticos.actualizar_serie('cotizaciones', hoy=date(2026, 12, 5), completo=True)
+
+        self.assertEqual(dias, pronosticos.VENTANA_DIAS + 1)
+        serie = dict(SerieDiariaReporte.objects.filter(serie='cotizaciones').values_list('dia', 'valor'))
+        self.assertEqual(min(serie), date(2026, 9, 6))
+        self.assertEqual(serie[date(2026, 9, 6)], 1)
+        self.assertEqual(sum(serie.values()), 1)
+
+    def test_dia_del_cambio_de_horario_agrupa_por_fecha_local(self):
+        # 01:15 del 2026-09-06 es la primera hora de ese día; 23:59 del 5 sigue siendo el 5
+        for username, fecha in (('cliente1', datetime(2026, 9, 6, 1, 15)), ('cliente2', datetime(2026, 9, 5, 23, 59))):
+            ChatCotizacion.objects.filter(pk=crear_chat(username).pk).update(fecha_creacion=timezone.make_aware(fecha))
+
+        pronosticos.actualizar_serie('cotizaciones', hoy=date(2026, 9, 7), completo=True)
+
+        serie = dict(SerieDiariaReporte.objects.filter(serie='cotizaciones').values_list('dia', 'valor'))
+        self.assertEqual((serie[date(2026, 9, 5)], serie[date(2026, 9, 6)], serie[date(2026, 9, 7)]), (1, 1, 0))
+
+
+# ===========================
+# BENCHMARK DE VISTAS (CONSULTAS Y LATENCIA POR RUTA)
+# ===========================
+#
+# Recorre todas las rutas con nombre de myapp/urls.py sobre un conjunto de datos
+# sembrado y compara contra benchmark_vistas.json: estado HTTP y número de
+# consultas tras un calentamiento. La base también guarda tiempo en BD y tiempo
+# total (mediana de REPETICIONES), que solo se comparan con BENCHMARK_TIEMPOS=1:
+# dependen de la máquina. Para regenerar la línea base:
+#     BENCHMARK_ACTUALIZAR=1 python manage.py test myapp.tests.BenchmarkVistasTest
+# Tolerancias: BENCHMARK_TOLERANCIA_CONSULTAS (fracción, 0.1) y
+# BENCHMARK_TOLERANCIA_TIEMPO (factor sobre la base, 3.0, más 50 ms de holgura).
+
+ARCHIVO_BENCHMARK = os.path.join(os.path.dirname(__file__), 'benchmark_vistas.json')
+REPETICIONES = 3
+HOLGURA_TIEMPO = 0.05
+
+# nombre de ruta -> (rol, método, kwargs, datos); kwargs y datos pueden ser funciones del test
+RUTAS_BENCHMARK = {
+    'index': ('anonimo', 'get', None, None),
+    'chatbot_demo': ('anonimo', 'get', None, None),  # falta chatbot/chatbot_demo.html: 500 en la base
+    'registro': ('anonimo', 'get', None, None),
+    'login': ('anonimo', 'get', None, None),
+    'logout': ('cliente', 'get', None, None),
+    'password_reset': ('anonimo', 'get', None, None),
+    'password_reset_done': ('anonimo', 'get', None, None),
+    'password_reset_confirm': ('anonimo', 'get', {'uidb64': 'MQ', 'token': 'invalido'}, None),
+    'password_reset_complete': ('anonimo', 'get', None, None),
+    'admin_panel': ('admin', 'get', None, None),
+    'admin_kpis_api': ('admin', 'get', None, None),
+    'client_dashboard': ('cliente', 'get', None, None),
+    'catalogo_api': ('cliente', 'get', None, {'pagina': 2}),
+    'control_inventario': ('admin', 'get', None, None),
+    'inventario_sugerencias_api': ('admin', 'get', None, {'q': 'panel'}),
+    'producto_delete': ('admin', 'post', lambda t: {'pk': t.producto_desechable()}, None),
+    'cotizaciones': ('admin', 'get', None, None),
+    'admin_chat_cotizacion': ('admin', 'get', lambda t: {'chat_id': t.chat.pk}, None),
+    'crear_cotizacion': ('admin', 'get', None, None),
+    'dimensionamiento_api': ('admin', 'get', None, {'consumo_kwh': 350, 'tipo_sistema': 'ongrid'}),
+    'cotizar_lote_api': ('admin', 'json', None, {'filas': [{'consumo_kwh': 300 + i, 'tipo_sistema': 'ongrid'} for i in range(50)]}),
+    'ver_cotizacion': ('admin', 'get', lambda t: {'cot_id': t.chat.pk}, None),
+    'editar_cotizacion': ('admin', 'get', lambda t: {'cot_id': t.chat.pk}, None),
+    'eliminar_cotizacion': ('admin', 'get', lambda t: {'cot_id': t.chat.pk}, None),
+    'calculos_estadisticas': ('admin', 'get', None, None),
+    'reportes_graficos': ('admin', 'get', None, None),
+    'historial_cotizaciones': ('admin', 'get', None, None),
+    'cuenta': ('cliente', 'get', None, None),
+    'configuracion': ('cliente', 'get', None, None),
+    'send_message': ('cliente', 'json', None, {'message': 'hola', 'session_id': 'benchmark'}),
+    'conversation_history': ('cliente', 'get', {'session_id': 'benchmark'}, None),
+    'chatbot_cache_metricas_api': ('admin', 'get', None, None),
+    'metricas_vistas_api': ('admin', 'get', None, None),
+    'lista_chats_cotizacion': ('cliente', 'get', None, None),
+    'iniciar_chat_cotizacion': ('cliente', 'get', lambda t: {'producto_id': t.chat.producto_id}, None),
+    'chat_cotizacion_view': ('cliente', 'get', lambda t: {'chat_id': t.chat.pk}, None),
+    'chat_api_view': ('cliente', 'get', lambda t: {'chat_id': t.chat.pk}, None),
+    'chat_espera_view': ('cliente', 'get', lambda t: {'chat_id': t.chat.pk}, {'ultimo_id': 0}),
+    'actualizar_estado_rapido': ('admin', 'json', lambda t: {'chat_id': t.chat.pk}, {'nuevo_estado': 'en_proceso'}),
+    'lista_clientes': ('admin', 'get', None, None),
+    'password_change': ('cliente', 'get', None, None),
+    'crear_admin_secreto': ('anonimo', 'get', None, None),
+    'chatbot_dialogflow': ('anonimo', 'post', None, {'message': 'hola', 'session_id': 'benchmark'}),
+}
+
+
+def _tolerancia(variable, defecto):
+    return float(os.environ.get(variable, defecto))
+
+
+@override_settings(DIALOGFLOW_BACKEND='local')
+class BenchmarkVistasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generador = datos_sinteticos.Generador(dias=90, semilla=11, tamano_lote=500)
+        productos = generador.productos(40)
+        clientes = generador.clientes(200)
+        generador.cotizaciones(600, clientes, productos, mensajes_por_chat=4)
+        datos_sinteticos.despues_de_generar()
+        cls.admin = User.objects.create_user(username='admin_benchmark', password='x', is_staff=True)
+        cls.chat = ChatCotizacion.objects.order_by('pk').first()
+        cls.cliente = cls.chat.cliente
+        conversacion = ChatConversation.objects.create(session_id='benchmark', user=cls.cliente)
+        ChatMessage.objects.bulk_create(
+            ChatMessage(conversation=conversacion, message=f'm{i}', is_bot=bool(i % 2)) for i in range(80)
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_dialogflow_service()
+        self.addCleanup(reset_dialogflow_service)
+        # Sin red: el chatbot responde al instante
+        parche = mock.patch.object(ChatBotService, '_consultar', return_value='respuesta de prueba')
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def producto_desechable(self):
+        categoria = Categoria.objects.order_by('pk').first()
+        return Producto.objects.create(
+            nombre='Desechable', sku=f'BENCH-{time.monotonic_ns()}', precio=1, categoria=categoria
+        ).pk
+
+    def _pedir(self, nombre):
+        rol, metodo, kwargs, datos = RUTAS_BENCHMARK[nombre]
+        kwargs = kwargs(self) if callable(kwargs) else kwargs
+        datos = datos(self) if callable(datos) else datos
+        url = reverse(nombre, kwargs=kwargs)
+        self.client.raise_request_exception = False
+        self.client.logout()
+        if rol != 'anonimo':
+            self.client.force_login(self.admin if rol == 'admin' else self.cliente)
+
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            if metodo == 'json':
+                response = self.client.post(url, json.dumps(datos), content_type='application/json')
+            else:
+                response = getattr(self.client, metodo)(url, datos or {})
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            total = time.perf_counter() - inicio
+        return {
+            'estado': response.status_code,
+            'consultas': len(consultas),
+            'tiempo_bd': sum(float(q['time']) for q in consultas.captured_queries),
+            'tiempo_total': total,
+        }
+
+    def _medir(self, nombre, repeticiones=REPETICIONES):
+        self._pedir(nombre)  # calentamiento: cachés, plantillas, tablas de dimensionamiento
+        corridas = [self._pedir(nombre) for _ in range(repeticiones)]
+        mediana = lambda campo: sorted(c[campo] for c in corridas)[repeticiones // 2]
+        return {
+            'estado': corridas[-1]['estado'],
+            'consultas': corridas[-1]['consultas'],
+            'tiempo_bd': round(mediana('tiempo_bd'), 4),
+            'tiempo_total': round(mediana('tiempo_total'), 4),
+        }
+
+    def test_todas_las_rutas_tienen_benchmark(self):
+        from . import urls
+        nombres = {p.name for p in urls.urlpatterns if p.name}
+        self.assertEqual(nombres - set(RUTAS_BENCHMARK), set())
+        self.assertEqual(set(RUTAS_BENCHMARK) - nombres, set())
+
+    def test_sin_regresiones(self):
+        actualizar = bool(os.environ.get('BENCHMARK_ACTUALIZAR'))
+        tiempos = actualizar or bool(os.environ.get('BENCHMARK_TIEMPOS'))
+        if not actualizar and not os.path.exists(ARCHIVO_BENCHMARK):
+            self.fail(f"Falta {ARCHIVO_BENCHMARK}; se genera con BENCHMARK_ACTUALIZAR=1")
+        resultados = {
+            nombre: self._medir(nombre, REPETICIONES if tiempos else 1) for nombre in sorted(RUTAS_BENCHMARK)
+        }
+
+        if actualizar:
+            with open(ARCHIVO_BENCHMARK, 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, indent=2, sort_keys=True, ensure_ascii=False)
+                f.write('\n')
+            return
+
+        with open(ARCHIVO_BENCHMARK, encoding='utf-8') as f:
+            base = json.load(f)
+        tolerancia_consultas = _tolerancia('BENCHMARK_TOLERANCIA_CONSULTAS', 0.1)
+        tolerancia_tiempo = _tolerancia('BENCHMARK_TOLERANCIA_TIEMPO', 3.0)
+        regresiones = []
+        for nombre, r in resultados.items():
+            b = base.get(nombre)
+            if b is None:
+                continue  # ruta nueva: entra en la próxima actualización de la base
+            if r['estado'] != b['estado']:
+                regresiones.append(f"{nombre}: estado {b['estado']} -> {r['estado']}")
+            if r['consultas'] > int(b['consultas'] * (1 + tolerancia_consultas)):
+                regresiones.append(f"{nombre}: consultas {b['consultas']} -> {r['consultas']}")
+            if tiempos and r['tiempo_total'] > b['tiempo_total'] * tolerancia_tiempo + HOLGURA_TIEMPO:
+                regresiones.append(f"{nombre}: tiempo {b['tiempo_total'] * 1000:.0f} ms -> {r['tiempo_total'] * 1000:.0f} ms")
+        self.assertEqual(regresiones, [], "Regresiones respecto de benchmark_vistas.json")
+
+
+# ===========================
+# MEDICIÓN POR PETICIÓN (SERVER-TIMING)
+# ===========================
+
+@override_settings(METRICAS_PETICIONES=True)
+class MetricasPeticionesTest(TestCase):
+
+    def setUp(self):
+        metricas_vistas.registro.limpiar()
+        self.addCleanup(metricas_vistas.registro.limpiar)
+        self.admin = User.objects.create_user(username='admin_metricas', password='x', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def test_server_timing_y_percentiles_por_vista(self):
+        for _ in range(5):
+            response = self.client.get(reverse('lista_clientes'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ consultas"$')
+
+        vistas = self.client.get(reverse('metricas_vistas_api')).json()['vistas']
+        resumen = vistas['lista_clientes']
+        self.assertEqual(resumen['peticiones'], 5)
+        self.assertGreater(resumen['consultas']['p50'], 0)
+        self.assertLessEqual(resumen['total_ms']['p50'], resumen['total_ms']['p99'])
+
+    def test_endpoint_solo_admin(self):
+        cliente = User.objects.create_user(username='cliente_metricas', password='x')
+        self.client.force_login(cliente)
+        self.assertEqual(self.client.get(reverse('metricas_vistas_api')).status_code, 302)
+
+    def test_mide_peticiones_asgi_sin_cambiar_de_modo(self):
+        async def vista(request):
+            pass
+
+        self.assertTrue(asyncio.iscoroutinefunction(metricas_vistas.MetricasPeticionesMiddleware(vista)))
+        self.assertFalse(asyncio.iscoroutinefunction(metricas_vistas.MetricasPeticionesMiddleware(lambda r: None)))
+
+        self.async_client.force_login(self.admin)
+
+        async def pedir():
+            return await self.async_client.get(reverse('lista_clientes'))
+
+        response = async_to_sync(pedir)()
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* consultas"$')
+        self.assertEqual(metricas_vistas.registro.resumen()['lista_clientes']['peticiones'], 1)
+
+    @override_settings(METRICAS_PETICIONES=False)
+    def test_desactivado_no_mide(self):
+        response = self.client.get(reverse('lista_clientes'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metricas_vistas.registro.resumen(), {})
+
+
+# ===========================
+# MINIATURAS DE IMÁGENES DE PRODUCTO
+# ===========================
+
+class MediaTemporalMixin:
+    """MEDIA_ROOT en un directorio temporal (self.media) que se borra al terminar cada test."""
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=self.media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+
+def imagen_png(ancho, alto, color=(200, 120, 40, 255)):
+    salida = BytesIO()
+    Image.new('RGBA', (ancho, alto), color).save(salida, 'PNG')
+    return salida.getvalue()
+
+
+@override_settings(MINIATURAS_EN_SEGUNDO_PLANO=False, MINIATURAS_ANCHOS=(160, 320, 640))
+class MiniaturasTest(MediaTemporalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        categoria = Categoria.objects.create(nombre='Paneles')
+        self.producto = Producto.objects.create(nombre='Panel 550W', sku='PAN-550', precio=1000, categoria=categoria)
+
+    def _subir(self, contenido, nombre='panel.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen = ProductoImagen.objects.create(
+                producto=self.producto, imagen=SimpleUploadedFile(nombre, contenido, content_type='image/png')
+            )
+        imagen.refresh_from_db()
+        return imagen
+
+    def test_genera_variantes_junto_al_original(self):
+        imagen = self._subir(imagen_png(1000, 500))
+        variantes = imagen.variantes
+        self.assertEqual(variantes['original'], imagen.imagen.name)
+        carpeta = os.path.dirname(imagen.imagen.name)
+        for formato, extension in (('webp', 'webp'), ('jpeg', 'jpg')):
+            self.assertEqual(sorted(variantes[formato], key=int), ['160', '320', '640'])
+            for ancho, nombre in variantes[formato].items():
+                self.assertEqual(nombre, f"{carpeta}/{variantes['hash']}_{ancho}.{extension}")
+                with imagen.imagen.storage.open(nombre) as f:
+                    self.assertEqual(Image.open(f).size, (int(ancho), int(ancho) // 2))
+
+        self.assertTrue(imagen.miniatura.endswith(f"{variantes['hash']}_320.jpg"))
+        self.assertEqual(imagen.srcset_webp.count('w,'), 2)
+        self.assertIn(f"{variantes['hash']}_640.webp 640w", imagen.srcset_webp)
+
+    def test_imagen_chica_no_se_agranda_y_mismo_contenido_reutiliza(self):
+        primera = self._subir(imagen_png(200, 100))
+        self.assertEqual(sorted(primera.variantes['jpeg'], key=int), ['160', '320'])
+        self.assertIn('_320.jpg 200w', primera.srcset_jpeg)
+
+        segunda = self._subir(imagen_png(200, 100), nombre='copia.png')
+        self.assertNotEqual(segunda.imagen.name, primera.imagen.name)
+        self.assertEqual(segunda.variantes['webp'], primera.variantes['webp'])
+
+    def test_sin_variantes_usa_el_original(self):
+        imagen = self._subir(imagen_png(300, 300))
+        ProductoImagen.objects.filter(pk=imagen.pk).update(variantes={})
+        imagen.refresh_from_db()
+        self.assertEqual(imagen.miniatura, imagen.imagen.url)
+        self.assertEqual(imagen.srcset_jpeg, '')
+
+
+# ===========================
+# DEDUPLICACIÓN Y RECOMPRESIÓN DE MEDIA
+# ===========================
+
+class OptimizarMediaTest(MediaTemporalMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.control = os.path.join(self.media, 'control.json')
+
+        categoria = Categoria.objects.create(nombre='Paneles')
+        repetida = imagen_png(300, 200)
+        self.imagenes = [
+            ProductoImagen.objects.create(
+                producto=Producto.objects.create(nombre=f'Panel {i}', sku=f'PAN-{i}', precio=1, categoria=categoria),
+                imagen=SimpleUploadedFile('panel.png', repetida),
+            )
+            for i in range(2)
+        ]
+        cliente = User.objects.create_user(username='cliente_media', password='x')
+        chat = ChatCotizacion.objects.create(cliente=cliente, producto=self.imagenes[0].producto)
+        self.mensaje = MensajeCotizacion.objects.create(
+            chat=chat, autor=cliente, mensaje='foto', imagen=SimpleUploadedFile('foto.png', repetida)
+        )
+        # Foto grande sin comprimir (ruido: no se achica solo por formato)
+        grande = BytesIO()
+        Image.effect_noise((3000, 1500), 60).convert('RGB').save(grande, 'JPEG', quality=100)
+        self.grande = ProductoImagen.objects.create(
+            producto=self.imagenes[1].producto, imagen=SimpleUploadedFile('grande.jpg', grande.getvalue())
+        )
+
+    def _optimizar(self, **opciones):
+        return optimizacion_media.optimizar(
+            self.media, ruta_control=self.control, procesos=2, umbral_bytes=100 * 1024, informar=lambda _: None, **opciones
+        )
+
+    def test_deduplica_reapunta_y_recomprime(self):
+        tamano_grande = os.path.getsize(self.grande.imagen.path)
+        resumen = self._optimizar()
+        self.assertEqual((resumen['hasheados'], resumen['duplicados'], resumen['filas_reapuntadas']), (4, 2, 2))
+        self.assertEqual(resumen['recomprimidos'], 1)
+
+        nombres = {ProductoImagen.objects.get(pk=i.pk).imagen.name for i in self.imagenes}
+        nombres.add(MensajeCotizacion.objects.get(pk=self.mensaje.pk).imagen.name)
+        self.assertEqual(len(nombres), 1)
+        restantes = list(optimizacion_media.recorrer(self.media))
+        self.assertEqual(len(restantes), 2)
+        self.assertIn(nombres.pop(), restantes)
+
+        self.grande.refresh_from_db()
+        with Image.open(self.grande.imagen.path) as imagen:
+            self.assertEqual(imagen.size, (2560, 1280))
+        ahorro_grande = tamano_grande - os.path.getsize(self.grande.imagen.path)
+        self.assertGreater(ahorro_grande, 0)
+        self.assertEqual(resumen['ahorro_recompresion'], ahorro_grande)
+
+        # Retomar: nada nuevo que hacer
+        segunda = self._optimizar()
+        self.assertEqual((segunda['hasheados'], segunda['duplicados'], segunda['recomprimidos']), (0, 0, 0))
+
+    def test_no_borra_copias_que_cambiaron_despues_del_hash(self):
+        self._optimizar(simular=True)  # deja los hashes en el control
+        cambiada = self.imagenes[1].imagen.path
+        estado = os.stat(cambiada)
+        with open(cambiada, 'r+b') as f:  # mismo tamaño y fecha: el control no lo detecta
+            f.seek(estado.st_size // 2)
+            f.write(b'\x00\x01\x02\x03')
+        os.utime(cambiada, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+
+        resumen = self._optimizar()
+
+        self.assertEqual(resumen['duplicados'], 1)
+        self.assertTrue(os.path.exists(cambiada))
+        self.assertEqual(ProductoImagen.objects.get(pk=self.imagenes[1].pk).imagen.path, cambiada)
+        canonico = MensajeCotizacion.objects.get(pk=self.mensaje.pk).imagen.name
+        self.assertEqual(ProductoImagen.objects.get(pk=self.imagenes[0].pk).imagen.name, canonico)
+
+    @override_settings(BASE_DIR='/srv/mejorsol')
+    def test_control_por_defecto_bajo_base_dir(self):
+        self.assertEqual(optimizacion_media.ruta_control_por_defecto(), '/srv/mejorsol/cache/optimizar_media.json')
+
+    def test_por_lotes_y_simulado(self):
+        antes = sorted(optimizacion_media.recorrer(self.media))
+        resumen = self._optimizar(lote=2, simular=True)
+        self.assertEqual(resumen['hasheados'], 2)
+        resumen = self._optimizar(simular=True)
+        self.assertEqual(resumen['hasheados'], 2)  # solo los que faltaban
+        self.assertEqual(resumen['duplicados'], 2)
+        self.assertGreater(resumen['ahorro_total'], 0)
+        self.assertEqual(sorted(optimizacion_media.recorrer(self.media)), antes)
+        self.assertEqual(ProductoImagen.objects.filter(imagen__in=antes).count(), 3)
+
+
+# ===========================
+# CATÁLOGO EN CACHÉ DEL DASHBOARD DE CLIENTES
+# ===========================
+
+class CatalogoTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.paneles = Categoria.objects.create(nombre='Paneles')
+        baterias = Categoria.objects.create(nombre='Baterías')
+        for i in range(15):
+            Producto.objects.create(
+                nombre=f'Producto {i:02d}', sku=f'CAT-{i:02d}', precio=1000 + i,
+                categoria=self.paneles if i % 3 else baterias,
+            )
+        Producto.objects.create(nombre='Descontinuado', sku='CAT-X', precio=1, categoria=baterias, activo=False)
+
+    def test_pagina_y_filtra_desde_la_cache(self):
+        primera = catalogo.pagina(1)
+        self.assertEqual((primera['total'], primera['paginas'], len(primera['productos'])), (15, 2, 12))
+        self.assertTrue(primera['hay_mas'])
+        self.assertEqual([(c['nombre'], c['total']) for c in primera['categorias']], [('Baterías', 5), ('Paneles', 10)])
+
+        segunda = catalogo.pagina(2)
+        paneles = catalogo.pagina(1, self.paneles.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogo.pagina(1), primera)
+            self.assertEqual(catalogo.pagina(1, self.paneles.pk), paneles)
+            fuera_de_rango = catalogo.pagina(9)
+        self.assertEqual(len(segunda['productos']), 3)
+        self.assertFalse(segunda['hay_mas'])
+        self.assertEqual(paneles['total'], 10)
+        self.assertTrue(all(p['categoria_id'] == self.paneles.pk for p in paneles['productos']))
+        self.assertEqual(fuera_de_rango['pagina'], 2)
+        vistos = {p['nombre'] for p in primera['productos'] + segunda['productos']}
+        self.assertNotIn('Descontinuado', vistos)
+        self.assertEqual(len(vistos), 15)
+
+    def test_cada_pagina_en_su_propia_entrada(self):
+        with mock.patch.object(catalogo.cache, 'get', wraps=catalogo.cache.get) as lecturas:
+            catalogo.pagina(2)
+            catalogo.pagina(2)
+        leidos = [llamada.args[0] for llamada in lecturas.call_args_list]
+        self.assertTrue(all(clave.endswith((':resumen', ':todas:12:2', ':version')) for clave in leidos), leidos)
+        self.assertEqual(len(cache.get(f"catalogo:{catalogo.version()}:todas:12:2")), 3)
+
+    def test_cache_local_vence_pronto_y_check_de_despliegue(self):
+        from django.core.checks import run_checks
+
+        self.assertEqual(catalogo._ttl(), 60)
+        avisos = [w.id for w in run_checks(include_deployment_checks=True)]
+        self.assertIn('myapp.W001', avisos)
+        with mock.patch.object(fragmentos, 'cache_compartida', return_value=True):
+            self.assertEqual(catalogo._ttl(), 60 * 60)
+            self.assertNotIn('myapp.W001', [w.id for w in run_checks(include_deployment_checks=True)])
+
+    def test_senales_invalidan(self):
+        catalogo.pagina(1)
+        Producto.objects.get(sku='CAT-00').delete()
+        self.assertEqual(catalogo.pagina(1)['total'], 14)
+
+        producto = Producto.objects.get(sku='CAT-X')
+        producto.activo = True
+        producto.save()
+        self.assertEqual(catalogo.pagina(1)['total'], 15)
+
+        self.paneles.nombre = 'Paneles Solares'
+        self.paneles.save()
+        self.assertIn('Paneles Solares', [c['nombre'] for c in catalogo.pagina(1)['categorias']])
+
+    def test_dashboard_y_cargar_mas(self):
+        cliente = User.objects.create_user(username='cliente_catalogo', password='x')
+        self.client.force_login(cliente)
+        catalogo.pagina(1)
+
+        response = self.client.get(reverse('client_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['catalogo']['productos']), 12)
+        self.assertContains(response, 'id="catalogoMas"')
+
+        datos = self.client.get(reverse('catalogo_api'), {'pagina': 2}).json()
+        self.assertEqual((datos['pagina'], datos['hay_mas']), (2, False))
+        self.assertEqual(datos['html'].count('btn-ver-producto'), 3)
+        datos = self.client.get(reverse('catalogo_api'), {'pagina': 'x', 'categoria': self.paneles.pk}).json()
+        self.assertEqual((datos['pagina'], datos['total']), (1, 10))
+
+
+# ===========================
+# FRAGMENTOS DE PLANTILLA EN CACHÉ
+# ===========================
+
+class FragmentosPlantillaTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.chat = crear_chat()
+        self.admin = User.objects.create_user(username='admin_fragmentos', password='x', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def _consultas(self, ruta):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse(ruta))
+        self.assertEqual(response.status_code, 200)
+        return response, len(consultas)
+
+    def test_reportes_desde_la_cache_e_invalidados_por_senal(self):
+        _, en_frio = self._consultas('reportes_graficos')
+        response, en_caliente = self._consultas('reportes_graficos')
+        self.assertLess(en_caliente, en_frio)
+        self.assertContains(response, '<script id="d-embudo-v" type="application/json">[1]</script>', html=False)
+
+        ChatCotizacion.objects.create(cliente=self.chat.cliente, producto=self.chat.producto)
+        response, _ = self._consultas('reportes_graficos')
+        self.assertContains(response, '<script id="d-embudo-v" type="application/json">[2]</script>', html=False)
+
+    def test_selector_de_categorias_invalidado_por_senal(self):
+        response, _ = self._consultas('control_inventario')
+        self.assertNotContains(response, 'Inversores')
+        Categoria.objects.create(nombre='Inversores')
+        response, _ = self._consultas('control_inventario')
+        self.assertContains(response, 'Inversores')
+
+    def test_comando_medir_plantillas(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+        salida = StringIO()
+        call_command('medir_plantillas', repeticiones=1, stdout=salida)
+        for plantilla in ('cliente/client_dashboard.html', 'admin/control_inventario.html', 'admin/reportes_graficos.html'):
+            self.assertIn(plantilla, salida.getvalue())
+
+
+# ===========================
+# BÚSQUEDA DE PRODUCTOS DEL INVENTARIO
+# ===========================
+
+class BusquedaProductosTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        baterias = Categoria.objects.create(nombre='Baterías')
+        paneles = Categoria.objects.create(nombre='Paneles')
+        self.bateria = Producto.objects.create(
+            nombre='Batería Litio 5kWh', sku='BAT-5K', precio=1, categoria=baterias, voltaje='48V',
+        )
+        self.kit = Producto.objects.create(
+            nombre='Kit Off-Grid', sku='KIT-OFF', precio=1, categoria=paneles,
+            descripcion='Incluye panel, inversor y batería de respaldo', activo=False,
+        )
+        self.panel = Producto.objects.create(
+            nombre='Panel Solar 450W', sku='PAN-450', precio=1, categoria=paneles, potencia='450 W',
+        )
+        self.admin = User.objects.create_user(username='admin_busqueda', password='x', is_staff=True)
+
+    def _buscar(self, q, queryset=None):
+        return list(busqueda.filtrar(queryset or Producto.objects.all(), q).values_list('sku', flat=True))
+
+    def test_sin_tildes_en_todos_los_campos_y_por_relevancia(self):
+        # Nombre antes que descripción; los inactivos también se encuentran
+        self.assertEqual(self._buscar('BATERIA'), ['BAT-5K', 'KIT-OFF'])
+        self.assertEqual(self._buscar('respaldo'), ['KIT-OFF'])
+        self.assertEqual(self._buscar('48v'), ['BAT-5K'])
+        self.assertEqual(self._buscar('450'), ['PAN-450'])
+        self.assertEqual(self._buscar('panel inversor'), ['KIT-OFF'])
+        self.assertEqual(self._buscar('pan-45'), ['PAN-450'])
+        self.assertEqual(self._buscar('x'), [])
+        self.assertEqual(self._buscar('bateria', Producto.objects.filter(activo=True)), ['BAT-5K'])
+
+    def test_indice_se_actualiza_con_las_senales(self):
+        self.assertEqual(self._buscar('microinversor'), [])
+        with self.assertNumQueries(1):
+            self._buscar('bateria')  # índice ya construido: solo la consulta de la página
+        Producto.objects.create(nombre='Microinversor 800W', sku='MIC-800', precio=1, categoria=self.panel.categoria)
+        self.assertEqual(self._buscar('microinv'), ['MIC-800'])
+        self.panel.delete()
+        self.assertEqual(self._buscar('450'), [])
+
+    def test_vista_y_sugerencias(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('control_inventario'), {'q': 'bateria', 'estado': 'activo'})
+        self.assertEqual([p.sku for p in response.context['productos']], ['BAT-5K'])
+
+        sugerencias = self.client.get(reverse('inventario_sugerencias_api'), {'q': 'pan'}).json()['sugerencias']
+        self.assertEqual(sugerencias[0], {'id': self.panel.pk, 'nombre': 'Panel Solar 450W', 'sku': 'PAN-450'})
+        self.assertEqual([s['sku'] for s in sugerencias], ['PAN-450', 'KIT-OFF'])
+
+    def test_filtros_de_la_vista_antes_de_cortar_y_sin_tope(self):
+        otra = Categoria.objects.create(nombre='Estructuras')
+        Producto.objects.bulk_create(
+            Producto(nombre=f'Panel Monocristalino {i}', sku=f'MONO-{i:03d}', precio=1, categoria=self.panel.categoria)
+            for i in range(250)
+        )
+        Producto.objects.create(nombre='Soporte para panel', sku='SOP-1', precio=1, categoria=otra)
+        busqueda.invalidar()  # bulk_create no dispara las señales
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('control_inventario'), {'q': 'panel', 'categoria': otra.pk})
+        self.assertEqual([p.sku for p in response.context['productos']], ['SOP-1'])
+        response = self.client.get(reverse('control_inventario'), {'q': 'panel'})
+        self.assertEqual(response.context['productos'].paginator.count, 253)
+        response = self.client.get(reverse('control_inventario'), {'q': 'panel', 'export': 'csv'})
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 254)
+
+    def test_terminos_cortos_usan_icontains(self):
+        self.assertEqual(self._buscar('w'), ['PAN-450', 'BAT-5K'])
+        self.assertEqual(self._buscar(' 5 '), ['PAN-450', 'BAT-5K'])
+        self.assertEqual(self._buscar('   '), [])
+
+    def test_fulltext_con_la_union_del_listado(self):
+        # Consulta del listado del inventario (une categorias, que también tiene nombre y descripcion)
+        productos = Producto.objects.select_related('categoria').filter(activo=True)
+        with mock.patch.object(busqueda, '_usa_fulltext', return_value=True):
+            sql = str(busqueda.filtrar(productos, 'panel').query)
+        columnas = sql[sql.index('MATCH (') + len('MATCH ('):sql.index(') AGAINST')].split(', ')
+        tabla = connection.ops.quote_name(Producto._meta.db_table)
+        self.assertEqual(columnas, [f"{tabla}.{connection.ops.quote_name(c)}" for c in busqueda.CAMPOS])
+
+    @skipUnless(connection.vendor == 'mysql', 'El índice FULLTEXT es propio de MySQL')
+    def test_mysql_indice_fulltext_y_plan(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW INDEX FROM productos WHERE Key_name = 'producto_busqueda_ft'")
+            self.assertEqual(len(cursor.fetchall()), len(busqueda.CAMPOS))  # migración 0009 aplicada
+
+            productos = Producto.objects.select_related('categoria').filter(activo=True)  # como control_inventario
+            sql, params = busqueda.filtrar(productos, 'panel').query.sql_with_params()
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columnas = [c[0] for c in cursor.description]
+            plan = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+        productos = next(fila for fila in plan if fila['table'] == 'productos')
+        self.assertEqual((productos['type'], productos['key']), ('fulltext', 'producto_busqueda_ft'))
@@ -0,0 +1,68 @@
+"""
+Aviso de mensajes nuevos en los chats de cotización (long-polling).
+
+Cada vez que se guarda un MensajeCotizacion se anota su id en la caché bajo una
+clave por chat (ver la señal en models.py). La vista de espera
+(views.chat_espera_view) compara esa marca con el último id que ya tiene el
+navegador y solo consulta la base de datos cuando hay algo nuevo, así un chat
+abierto sin actividad no genera consultas.
+
+La espera solo se mantiene abierta bajo ASGI (MejorSol/asgi.py), donde no ocupa
+un worker. Bajo WSGI cada petición retenida bloquearía un worker síncrono por
+ESPERA_MAXIMA segundos, así que la vista responde de inmediato y el navegador
+vuelve a preguntar cada INTERVALO_POLLING segundos (el polling de antes).
+
+Para que el aviso cruce entre workers la caché debe ser compartida (memcached o
+DatabaseCache, ver CACHES en settings.py). Con la LocMemCache por defecto cada
+proceso solo ve sus propias marcas, que duran TTL_MARCA: la vista no confía en
+ellas y además consulta la BD (id > ultimo_id, por el índice (chat, id)) cada
+INTERVALO_POLLING segundos y al vencer la espera. Con caché compartida la BD
+solo se consulta al vencer la espera.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max
+
+# Segundos que una petición de espera queda abierta (menor que el timeout de gunicorn)
+ESPERA_MAXIMA = getattr(settings, 'CHAT_LONG_POLL_SEGUNDOS', 25)
+# Cada cuánto se revisa la marca en caché mientras se espera
+INTERVALO_REVISION = 1.0
+# Tiempo de vida de la marca; al expirar se vuelve a consultar la base de datos
+TTL_MARCA = 60 * 60 * 24
+# Segundos entre consultas del navegador cuando no hay espera (WSGI)
+INTERVALO_POLLING = 5
+
+
+def _clave(chat_id):
+    return f"chat_cotizacion:{chat_id}:ultimo_mensaje"
+
+
+def notificar_mensaje(chat_id, mensaje_id):
+    """Registra que el chat tiene un mensaje nuevo con id `mensaje_id`."""
+    cache.set(_clave(chat_id), mensaje_id, TTL_MARCA)
+
+
+def ultimo_mensaje_id(chat_id):
+    """Último id de mensaje conocido para el chat, o None si no hay marca en caché."""
+    return cache.get(_clave(chat_id))
+
+
+def sembrar_marca(chat_id):
+    """
+    Caché fría: pone la marca con el último id guardado en la BD y retorna la
+    marca vigente. Usa cache.add para no pisar una marca más nueva escrita por
+    notificar_mensaje entre la consulta y la escritura; nunca usa el id que
+    envía el navegador.
+    """
+    from .models import MensajeCotizacion
+
+    ultimo = MensajeCotizacion.objects.filter(chat_id=chat_id).aggregate(ultimo=Max('id'))['ultimo'] or 0
+    cache.add(_clave(chat_id), ultimo, TTL_MARCA)
+    marca = ultimo_mensaje_id(chat_id)
+    return ultimo if marca is None else marca
+
+
+def espera_disponible(request):
+    """True si la petición llegó por ASGI y puede quedar abierta sin ocupar un worker."""
+    return isinstance(request, ASGIRequest)
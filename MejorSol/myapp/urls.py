@@ -46,12 +46,15 @@ urlpatterns = [
     # URLS DE PANELES
     # ===========================
     path('admin-panel/', views.admin_panel, name='admin_panel'),
+    path('api/admin-panel/kpis/', views.admin_kpis_api, name='admin_kpis_api'),
     path('client-dashboard/', views.client_dashboard, name='client_dashboard'),
+    path('api/catalogo/', views.catalogo_api, name='catalogo_api'),
     
     # ===========================
     # URLS DE INVENTARIO 
     # ===========================
     path('inventario/', views.control_inventario_view, name='control_inventario'),
+    path('api/inventario/sugerencias/', views.inventario_sugerencias_api, name='inventario_sugerencias_api'),
     path('productos/eliminar/<int:pk>/', views.producto_delete, name='producto_delete'),
     
     # ===========================
@@ -60,6 +63,8 @@ urlpatterns = [
     path("cotizaciones/", views.admin_lista_chats_cotizacion_view, name="cotizaciones"),
     path('cotizaciones/chat/<int:chat_id>/', views.admin_chat_cotizacion_view, name='admin_chat_cotizacion'), 
     path("cotizaciones/crear/", views.crear_cotizacion, name="crear_cotizacion"),
+    path('api/dimensionamiento/', views.dimensionamiento_api, name='dimensionamiento_api'),
+    path('api/dimensionamiento/lote/', views.cotizar_lote_api, name='cotizar_lote_api'),
     
     # Redirecciones antiguas
     path("cotizaciones/antigua/<int:cot_id>/", views.ver_cotizacion, name="ver_cotizacion"),
@@ -84,6 +89,8 @@ urlpatterns = [
     # ===========================
     path('send_message/', views.send_message, name='send_message'),
     path('conversation-history/<str:session_id>/', views.get_conversation_history, name='conversation_history'),
+    path('api/chatbot/cache/', views.chatbot_cache_metricas_api, name='chatbot_cache_metricas_api'),
+    path('api/metricas/vistas/', views.metricas_vistas_api, name='metricas_vistas_api'),
 
     # ===========================
     # CHAT DE COTIZACIONES (CLIENTE)
@@ -92,6 +99,7 @@ urlpatterns = [
     path('iniciar-chat-cotizacion/<int:producto_id>/', views.iniciar_chat_view, name='iniciar_chat_cotizacion'),
     path('chat-cotizacion/<int:chat_id>/', views.chat_cotizacion_view, name='chat_cotizacion_view'),
     path('api/chat/<int:chat_id>/mensajes/', views.chat_api_view, name='chat_api_view'),
+    path('api/chat/<int:chat_id>/espera/', views.chat_espera_view, name='chat_espera_view'),
     path('api/cotizacion/<int:chat_id>/estado/', views.actualizar_estado_rapido, name='actualizar_estado_rapido'),
    
     # ===========================
@@ -1,11 +1,12 @@
+import asyncio
 import csv
-import re
 import json
+import logging
 import uuid
 import random
-import numpy as np
-from datetime import datetime, timedelta
-from django.utils import timezone
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, update_session_auth_hash
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -14,11 +15,12 @@ from django.contrib.auth.views import LoginView
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.db.models import Q, F, Sum, Count, ProtectedError, Avg
-from django.db.models.functions import TruncMonth, TruncDay
-from django.http import HttpResponse, JsonResponse
+from django.db.models.functions import TruncMonth
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.views.decorators.csrf import csrf_exempt
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.http import require_POST, require_http_methods
 from django.db import transaction
 from django.views.decorators.clickjacking import xframe_options_sameorigin
@@ -35,16 +37,20 @@ from .models import (
     ChatCotizacion, MensajeCotizacion, Perfil
 )
 # --- Servicios ---
+from . import (
+    busqueda, cache_respuestas, catalogo, contexto_chatbot, dimensionamiento, fragmentos, metricas_vistas, paginacion,
+    tiempo_real,
+)
 from .services import ChatBotService 
-from .services import DialogflowService
+from .services import get_dialogflow_service
+# Pronósticos: numpy/scikit-learn se cargan solo al reajustar (ver analitica.py)
+from .pronosticos import datos_reporte
+from .cotizaciones import contadores_por_estado, pagina_por_fecha
+from .kpis import obtener_snapshot, como_dict
+from .flujo_cotizacion import procesar_respuesta_bot, obtener_bot, crear_mensajes
+from .exportacion import por_bloques, respuesta_csv, respuesta_json_streaming, exportar_inventario, exportar_cotizaciones, exportar_productos_adquiridos
 
-# --- MACHINE LEARNING (Scikit-Learn) ---
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-from sklearn.model_selection import train_test_split
-# ---------------------------------------
+logger = logging.getLogger(__name__)
 
 
 # ===========================
@@ -111,17 +117,8 @@ class CustomLoginView(LoginView):
 @login_required
 @user_passes_test(is_admin)
 def admin_panel(request):
-    now = timezone.now()
-    
-    kpi_cotizaciones_mes = ChatCotizacion.objects.filter(
-        fecha_creacion__year=now.year,
-        fecha_creacion__month=now.month
-    ).count()
-
-    kpi_total_productos = Producto.objects.count()
-    kpi_total_clientes = Perfil.objects.filter(tipo_usuario='cliente').count()
-    stock_data = Producto.objects.aggregate(total_stock=Sum('stock'))
-    kpi_stock_total = stock_data['total_stock'] or 0
+    # KPIs desde la fila precalculada (ver kpis.py)
+    kpis = como_dict(obtener_snapshot())
     
     act_cotizaciones = ChatCotizacion.objects.select_related('cliente', 'producto').order_by('-fecha_creacion')[:3]
     act_productos = Producto.objects.select_related('categoria').order_by('-fecha_creacion')[:2]
@@ -129,10 +126,7 @@ def admin_panel(request):
 
     context = {
         'user': request.user,
-        'kpi_cotizaciones_mes': kpi_cotizaciones_mes,
-        'kpi_total_productos': kpi_total_productos,
-        'kpi_total_clientes': kpi_total_clientes,
-        'kpi_stock_total': kpi_stock_total,
+        **kpis,
         'act_cotizaciones': act_cotizaciones,
         'act_productos': act_productos,
         'act_clientes': act_clientes,
@@ -140,6 +134,13 @@ def admin_panel(request):
     return render(request, 'admin/admin_panel.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def admin_kpis_api(request):
+    """KPIs del dashboard en JSON para el refresco cada 30 s (lee una sola fila)."""
+    return JsonResponse(como_dict(obtener_snapshot()))
+
+
 # ===========================
 # VISTA DE INVENTARIO
 # ===========================
@@ -203,8 +204,6 @@ def control_inventario_view(request):
     
     productos = Producto.objects.select_related('categoria').all()
 
-    if q:
-        productos = productos.filter(Q(sku__icontains=q) | Q(nombre__icontains=q))
     if categoria:
         productos = productos.filter(categoria__id=categoria)
     if estado == 'activo':
@@ -214,10 +213,14 @@ def control_inventario_view(request):
     elif estado == 'bajo':
         productos = productos.filter(stock__lte=F('stock_minimo'), activo=True, stock__gt=0)
 
-    productos = productos.order_by('-fecha_creacion')
+    if q:
+        # Índice FULLTEXT (MySQL) o de trigramas en memoria, ordenado por relevancia
+        productos = busqueda.filtrar(productos, q)
+    else:
+        productos = productos.order_by('-fecha_creacion')
     
     if request.GET.get('export') == 'csv':
-        return export_inventario_csv(productos)
+        return exportar_inventario(productos)
     
     paginator = Paginator(productos, 20)
     page_number = request.GET.get('page')
@@ -231,6 +234,13 @@ def control_inventario_view(request):
     return render(request, 'admin/control_inventario.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def inventario_sugerencias_api(request):
+    """Autocompletado del buscador del inventario: productos más relevantes para `q`."""
+    return JsonResponse({'sugerencias': busqueda.sugerencias(request.GET.get('q', ''))})
+
+
 @login_required
 @user_passes_test(is_admin)
 @require_http_methods(["POST"])
@@ -260,23 +270,6 @@ def producto_delete(request, pk):
     return redirect('control_inventario')
 
 
-def export_inventario_csv(queryset):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="inventario.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['SKU', 'Producto', 'Categoría', 'Stock', 'Stock Mínimo', 'Precio', 'Estado'])
-    for producto in queryset:
-        estado = 'OK'
-        if producto.stock <= producto.stock_minimo: estado = 'BAJO STOCK'
-        elif not producto.activo: estado = 'INACTIVO'
-        writer.writerow([
-            producto.sku, producto.nombre,
-            producto.categoria.nombre if producto.categoria else '',
-            producto.stock, producto.stock_minimo, producto.precio, estado
-        ])
-    return response
-
-
 # ===========================
 # VISTAS DE COTIZACIONES
 # ===========================
@@ -287,23 +280,23 @@ def admin_lista_chats_cotizacion_view(request):
     ESTADO_DB_CHOICES = ['pendiente', 'en_proceso', 'aprobada', 'rechazada']
     estado_filtro = request.GET.get('estado')
     
-    chats = ChatCotizacion.objects.all().select_related('cliente', 'producto').order_by('-fecha_actualizacion')
+    chats = ChatCotizacion.objects.select_related('cliente', 'producto')
     
     if estado_filtro and estado_filtro != 'todos' and estado_filtro in ESTADO_DB_CHOICES:
         chats = chats.filter(estado=estado_filtro)
 
-    contadores = {
-        'todos': ChatCotizacion.objects.all().count(),
-        'pendiente': ChatCotizacion.objects.filter(estado='pendiente').count(),
-        'en_proceso': ChatCotizacion.objects.filter(estado='en_proceso').count(),
-        'aprobada': ChatCotizacion.objects.filter(estado='aprobada').count(),
-        'rechazada': ChatCotizacion.objects.filter(estado='rechazada').count(),
-    }
+    # Paginación por cursor sobre fecha_actualizacion (ver cotizaciones.py)
+    chats, siguiente_cursor = pagina_por_fecha(chats, cursor=request.GET.get('cursor'))
+    contadores = contadores_por_estado()
+    filtro_actual = estado_filtro if estado_filtro in ESTADO_DB_CHOICES else 'todos'
     
     context = {
         'chats_cotizacion': chats, 
-        'filtro_actual': estado_filtro if estado_filtro else 'todos',
+        'filtro_actual': filtro_actual,
         'contadores': contadores,
+        'total_filtro': contadores[filtro_actual],
+        'siguiente_cursor': siguiente_cursor,
+        'es_primera_pagina': not request.GET.get('cursor'),
     }
     return render(request, 'admin/cotizaciones.html', context)
 
@@ -360,7 +353,56 @@ def cotizaciones_view(request):
 @user_passes_test(is_admin)
 def crear_cotizacion(request):
     messages.info(request, "Función manual.")
-    return render(request, "admin/crear_cotizacion.html")
+    return render(request, "admin/crear_cotizacion.html", {
+        'kits_json': json.dumps(dimensionamiento.kits()),
+        'kwh_json': json.dumps(dimensionamiento.tabla_kwh()),
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def dimensionamiento_api(request):
+    """Equipo recomendado: ?consumo_kwh=350&tipo_sistema=ongrid|offgrid[&temporada=verano]."""
+    try:
+        resultado = dimensionamiento.dimensionar(
+            request.GET.get('consumo_kwh', ''),
+            request.GET.get('tipo_sistema', 'ongrid'),
+            request.GET.get('temporada', 'invierno'),
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'mensaje': str(e)}, status=400)
+    return JsonResponse(resultado)
+
+
+@require_POST
+@login_required
+@user_passes_test(is_admin_or_vendedor)
+def cotizar_lote_api(request):
+    """
+    Cotiza muchos escenarios de una vez. Acepta un archivo 'archivo' (CSV o JSON),
+    un cuerpo JSON ({'filas': [...]}) o un cuerpo text/csv.
+    Con ?formato=csv la respuesta se descarga como CSV.
+    """
+    archivo = request.FILES.get('archivo')
+    if archivo:
+        contenido = archivo.read().decode('utf-8', errors='replace')
+        formato = 'json' if archivo.name.lower().endswith('.json') else 'csv'
+    else:
+        contenido = request.body.decode('utf-8', errors='replace')
+        formato = 'csv' if request.content_type == 'text/csv' else 'json'
+
+    try:
+        filas = dimensionamiento.leer_escenarios(contenido, formato)
+    except (ValueError, csv.Error) as e:
+        return JsonResponse({'status': 'error', 'mensaje': f'Entrada no válida: {e}'}, status=400)
+    if len(filas) > dimensionamiento.MAXIMO_FILAS_LOTE:
+        return JsonResponse({'status': 'error', 'mensaje': f'Máximo {dimensionamiento.MAXIMO_FILAS_LOTE} filas por lote.'}, status=400)
+
+    resultados = dimensionamiento.cotizar_lote(filas)
+    if request.GET.get('formato') == 'csv':
+        columnas = dimensionamiento.COLUMNAS_RESULTADO_LOTE
+        return respuesta_csv('cotizacion_lote.csv', columnas, ([r.get(c, '') for c in columnas] for r in resultados))
+    return JsonResponse({'status': 'ok', 'resultados': resultados})
 
 @login_required
 @user_passes_test(is_admin)
@@ -391,6 +433,9 @@ def eliminar_cotizacion(request, cot_id):
 @login_required
 @user_passes_test(is_admin)
 def calculos_estadisticas_view(request):
+    if request.GET.get('export') == 'csv':
+        return exportar_productos_adquiridos(ProductoAdquirido.objects.order_by('-fecha_compra'))
+
     total_ventas = ProductoAdquirido.objects.aggregate(total=Sum('precio_adquisicion'))['total'] or 0
     total_clientes = ProductoAdquirido.objects.values('cliente').distinct().count()
     total_productos = Producto.objects.filter(activo=True).count()
@@ -401,12 +446,8 @@ def calculos_estadisticas_view(request):
     return render(request, 'admin/calculos_estadisticas.html', context)
 
 
-@login_required
-@user_passes_test(is_admin)
-def reportes_graficos_view(request):
-    # 1. DATOS REALES (Sin simulación)
-    hace_90 = timezone.now() - timedelta(days=90)
-    
+def _datos_reporte_graficos():
+    """KPIs y series (en JSON) de los gráficos de reportes_graficos."""
     # --- CORRECCIÓN GRÁFICOS (EMBUDO Y PRODUCTOS) ---
     # Usamos .order_by() vacío al inicio para limpiar el ordenamiento por defecto
     # que estaba causando los duplicados en los gráficos.
@@ -425,90 +466,29 @@ def reportes_graficos_view(request):
     total = ChatCotizacion.objects.count()
     aprob = ChatCotizacion.objects.filter(estado='aprobada').count()
     kpi_tasa = round((aprob/total*100), 1) if total else 0
-    kpi_prom = 0 # Se calculará dinámicamente si se desea
 
-    # --- MACHINE LEARNING 1: PREDICCIÓN DEMANDA (Cotizaciones) ---
-    # Agrupar por día
-    data_cot = list(ChatCotizacion.objects.filter(fecha_creacion__gte=hace_90)
-                    .annotate(dia=TruncDay('fecha_creacion'))
-                    .values('dia').annotate(total=Count('id')).order_by('dia'))
-    
-    pred_l, pred_v, tend_l, tend_v = [], [], [], []
-    
-    df = pd.DataFrame(data_cot)
-    if not df.empty:
-        # Fix Timezone Chile
-        if df['dia'].dt.tz is not None: df['dia'] = df['dia'].dt.tz_localize(None)
-        
-        # Llenar días vacíos con 0
-        df = df.set_index('dia').asfreq('D', fill_value=0).reset_index()
-        df['fecha_num'] = df['dia'].map(datetime.toordinal)
-        
-        # Entrenar ML
-        try:
-            model = LinearRegression()
-            model.fit(df[['fecha_num']], df['total'])
-            
-            # Predecir 3 días
-            last = df['dia'].iloc[-1]
-            future = [last + timedelta(days=i) for i in range(1, 4)]
-            preds = model.predict([[d.toordinal()] for d in future])
-            
-            for i, d in enumerate(future):
-                pred_l.append(d.strftime('%d-%b'))
-                pred_v.append(max(0, round(preds[i], 1)))
-        except: pass
-
-        # Datos Históricos (últimos 30 días para el gráfico)
-        hace_30 = df['dia'].iloc[-1] - timedelta(days=30)
-        df_recent = df[df['dia'] >= hace_30]
-        tend_l = df_recent['dia'].dt.strftime('%d-%b').tolist()
-        tend_v = df_recent['total'].tolist()
-        
-        # KPI Promedio
-        kpi_prom = round(df_recent['total'].mean(), 1)
+    # --- PRONÓSTICOS (precalculados por `manage.py actualizar_pronosticos`) ---
+    pronostico = datos_reporte()
 
-    # --- MACHINE LEARNING 2: PREDICCIÓN CLIENTES ---
-    data_cli = list(User.objects.filter(perfil__tipo_usuario='cliente', date_joined__gte=hace_90)
-                    .annotate(dia=TruncDay('date_joined'))
-                    .values('dia').annotate(nuevos=Count('id')).order_by('dia'))
-    
-    cli_l, cli_v, kpi_proy = [], [], 0
-    
-    dfc = pd.DataFrame(data_cli)
-    if not dfc.empty:
-        if dfc['dia'].dt.tz is not None: dfc['dia'] = dfc['dia'].dt.tz_localize(None)
-        
-        # Acumulado real
-        dfc = dfc.set_index('dia').asfreq('D', fill_value=0).reset_index()
-        dfc['total_acumulado'] = dfc['nuevos'].cumsum()
-        
-        try:
-            model_c = LinearRegression()
-            model_c.fit(dfc['dia'].map(datetime.toordinal).values.reshape(-1,1), dfc['total_acumulado'])
-            
-            last = dfc['dia'].iloc[-1]
-            fut = [last + timedelta(days=i) for i in range(1, 8)]
-            prj = model_c.predict(np.array([d.toordinal() for d in fut]).reshape(-1,1))
-            
-            for i, d in enumerate(fut):
-                cli_l.append(d.strftime('%d-%b'))
-                cli_v.append(int(prj[i]))
-            
-            kpi_proy = int(prj[-1] - dfc['total_acumulado'].iloc[-1])
-        except: pass
-
-    context = {
+    return {
         'kpi_tasa_conversion': kpi_tasa, 'kpi_total_cotizaciones': total,
-        'kpi_promedio_cot_dia': kpi_prom, 'kpi_aprobadas': aprob,
-        'kpi_proyeccion_clientes': kpi_proy,
+        'kpi_promedio_cot_dia': pronostico['kpi_promedio_cot_dia'], 'kpi_aprobadas': aprob,
+        'kpi_proyeccion_clientes': pronostico['kpi_proyeccion_clientes'],
         
         'embudo_labels': json.dumps(embudo_labels), 'embudo_valores': json.dumps(embudo_valores),
-        'tendencia_labels': json.dumps(tend_l), 'tendencia_valores': json.dumps(tend_v),
+        'tendencia_labels': json.dumps(pronostico['tendencia_labels']), 'tendencia_valores': json.dumps(pronostico['tendencia_valores']),
         'productos_labels': json.dumps(productos_labels), 'productos_valores': json.dumps(productos_valores),
-        'prediccion_labels': json.dumps(pred_l), 'prediccion_valores': json.dumps(pred_v),
-        'clientes_ml_labels': json.dumps(cli_l), 'clientes_ml_valores': json.dumps(cli_v),
-        
+        'prediccion_labels': json.dumps(pronostico['prediccion_labels']), 'prediccion_valores': json.dumps(pronostico['prediccion_valores']),
+        'clientes_ml_labels': json.dumps(pronostico['clientes_ml_labels']), 'clientes_ml_valores': json.dumps(pronostico['clientes_ml_valores']),
+    }
+
+
+@login_required
+@user_passes_test(is_admin)
+def reportes_graficos_view(request):
+    context = {
+        # Se calcula solo si los fragmentos del reporte no están en caché (ver fragmentos.py)
+        'reporte': SimpleLazyObject(_datos_reporte_graficos),
         # Pasamos estados para el filtro
         'estados_posibles': ChatCotizacion.ESTADO_CHOICES
     }
@@ -536,6 +516,9 @@ def historial_cotizaciones_view(request):
         queryset = queryset.filter(fecha_actualizacion__date__lte=hasta)
 
     queryset = queryset.order_by('-fecha_actualizacion')
+    if request.GET.get('export') == 'csv':
+        return exportar_cotizaciones(queryset)
+
     paginator = Paginator(queryset, 25) 
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -584,42 +567,99 @@ def chatbot_demo(request):
     return render(request, 'chatbot/chatbot_demo.html')
 
 
-@csrf_exempt
-@require_POST
-def send_message(request):
+async def send_message(request):
+    """
+    Vista async: mientras se espera a HuggingFace (ChatBotService) el worker
+    ASGI sigue atendiendo otras peticiones. Exenta de CSRF como antes.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '')
         session_id = data.get('session_id') or str(uuid.uuid4())
 
-        conversation, _ = ChatConversation.objects.get_or_create(session_id=session_id)
-        if request.user.is_authenticated:
-            conversation.user = request.user
-            conversation.save()
-        
-        ChatMessage.objects.create(conversation=conversation, message=user_message, is_bot=False)
+        # Últimos mensajes desde la caché compartida o la BD (ver contexto_chatbot.py)
+        user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+        contexto = await sync_to_async(contexto_chatbot.cargar)(session_id, user)
+        # El mensaje se guarda antes de llamar al bot: si el bot falla queda en el historial
+        await sync_to_async(contexto_chatbot.registrar_mensaje)(session_id, contexto, user_message)
 
-        history_messages = conversation.messages.order_by('-timestamp')[:6]
-        history = [{'message': msg.message, 'is_bot': msg.is_bot} for msg in reversed(history_messages)]
+        chatbot = ChatBotService()
+        bot_response = await chatbot.aget_ai_response(user_message, contexto['mensajes'])
 
-        chatbot = ChatBotService() 
-        bot_response = chatbot.get_ai_response(user_message, history)
-        
-        ChatMessage.objects.create(conversation=conversation, message=bot_response, is_bot=True)
+        await sync_to_async(contexto_chatbot.registrar_mensaje)(session_id, contexto, bot_response, is_bot=True)
 
         return JsonResponse({ 'status': 'success', 'response': bot_response, 'session_id': session_id })
     except Exception as e:
         return JsonResponse({ 'status': 'error', 'response': 'Lo siento, ocurrió un error.', 'error': str(e) })
 
+# Los decoradores csrf_exempt/require_POST de Django 3.2 no envuelven vistas async
+send_message.csrf_exempt = True
+
+
+@login_required
+@user_passes_test(is_admin)
+def chatbot_cache_metricas_api(request):
+    """Aciertos/fallos de la caché de respuestas del chatbot (de este proceso)."""
+    return JsonResponse(cache_respuestas.metricas())
+
+
+@login_required
+@user_passes_test(is_admin)
+def metricas_vistas_api(request):
+    """p50/p95/p99 de tiempo total, tiempo en BD y consultas por vista (de este proceso)."""
+    if request.method == 'DELETE':
+        metricas_vistas.registro.limpiar()
+    return JsonResponse({'activo': getattr(settings, 'METRICAS_PETICIONES', False), 'vistas': metricas_vistas.registro.resumen()})
+
+
+LIMITE_HISTORIAL_DEFECTO = 50
+LIMITE_HISTORIAL_MAXIMO = 200
+
+
+def _historial_json(m):
+    return {'id': m.id, 'message': m.message, 'is_bot': m.is_bot, 'timestamp': m.timestamp.isoformat()}
+
 
 def get_conversation_history(request, session_id):
+    """
+    Historial paginado por cursor sobre (timestamp, id), en orden cronológico:
+    - sin cursor: los últimos `limit` mensajes
+    - ?before=<cursor>: los `limit` anteriores; ?after=<cursor>: los `limit` siguientes
+    La respuesta trae `before`/`after` (cursores del primer/último mensaje) y `hay_mas`.
+    Con ?export=json se descarga la conversación completa en streaming.
+    """
+    conv = ChatConversation.objects.filter(session_id=session_id).only('id').first()
+    if conv is None:
+        return JsonResponse({'history': [], 'hay_mas': False, 'before': None, 'after': None})
+    msgs = ChatMessage.objects.filter(conversation=conv)
+
+    if request.GET.get('export') == 'json':
+        return respuesta_json_streaming(
+            f'conversacion_{session_id}.json', 'history',
+            (_historial_json(m) for m in por_bloques(msgs.order_by('timestamp', 'id'))),
+        )
+
     try:
-        conv = ChatConversation.objects.get(session_id=session_id)
-        msgs = ChatMessage.objects.filter(conversation=conv).order_by('timestamp')
-        history = [{'message': m.message, 'is_bot': m.is_bot, 'timestamp': m.timestamp.isoformat()} for m in msgs]
-        return JsonResponse({'history': history})
-    except ChatConversation.DoesNotExist:
-        return JsonResponse({'history': []})
+        limit = max(1, min(int(request.GET.get('limit') or LIMITE_HISTORIAL_DEFECTO), LIMITE_HISTORIAL_MAXIMO))
+        after = request.GET.get('after')
+        before = request.GET.get('before')
+        if after:
+            pagina, hay_mas = paginacion.pagina(msgs, ('timestamp', 'id'), paginacion.leer_cursor(after), limit)
+        else:
+            valores = paginacion.leer_cursor(before) if before else None
+            pagina, hay_mas = paginacion.pagina(msgs, ('-timestamp', '-id'), valores, limit)
+            pagina.reverse()
+    except ValueError:
+        return JsonResponse({'error': 'Cursor inválido'}, status=400)
+
+    return JsonResponse({
+        'history': [_historial_json(m) for m in pagina],
+        'hay_mas': hay_mas,
+        'before': paginacion.cursor(pagina[0].timestamp, pagina[0].id) if pagina else before,
+        'after': paginacion.cursor(pagina[-1].timestamp, pagina[-1].id) if pagina else after,
+    })
 
 
 # ===========================
@@ -641,7 +681,8 @@ def handler_500(request):
 def client_dashboard(request):
     user = request.user
     productos_adquiridos = ProductoAdquirido.objects.filter(cliente=user).select_related('producto')
-    productos_disponibles = Producto.objects.filter(activo=True).select_related('categoria').prefetch_related('imagenes')
+    # Primera página del catálogo en caché; el resto llega por catalogo_api
+    pagina_catalogo = catalogo.pagina(1, _entero(request.GET.get('categoria')))
 
     if request.method == "POST":
         perfil_form = ClienteProfileForm(request.POST, instance=user)
@@ -654,11 +695,28 @@ def client_dashboard(request):
 
     context = {
         "user": user, "productos_adquiridos": productos_adquiridos,
-        "productos_disponibles": productos_disponibles, "perfil_form": perfil_form,
+        "catalogo": pagina_catalogo, "perfil_form": perfil_form,
     }
     return render(request, "cliente/client_dashboard.html", context)
 
 
+def _entero(valor, defecto=None):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return defecto
+
+
+@login_required
+def catalogo_api(request):
+    """Página del catálogo (tarjetas ya renderizadas) para "Cargar más" y el filtro por categoría."""
+    datos = catalogo.pagina(_entero(request.GET.get('pagina'), 1), _entero(request.GET.get('categoria')))
+    return JsonResponse({
+        'html': render_to_string('cliente/partials/tarjetas_producto.html', {'productos': datos['productos']}, request),
+        'pagina': datos['pagina'], 'paginas': datos['paginas'], 'total': datos['total'], 'hay_mas': datos['hay_mas'],
+    })
+
+
 # ===========================
 # VISTAS PARA CHAT DE COTIZACIÓN (CLIENTE Y API)
 # ===========================
@@ -679,8 +737,7 @@ def iniciar_chat_view(request, producto_id):
             f"Por favor, espera un momento o describe tu solicitud mientras te atienden."
         )
         MensajeCotizacion.objects.create(
-            chat=chat, autor=User.objects.filter(is_superuser=True).first(), 
-            es_bot=True, mensaje=mensaje_bienvenida
+            chat=chat, autor=obtener_bot(), es_bot=True, mensaje=mensaje_bienvenida
         )
     return JsonResponse({'status': 'ok', 'chat_id': chat.id})
 
@@ -696,182 +753,150 @@ def chat_cotizacion_view(request, chat_id):
     return render(request, 'chat/chat_detail.html', context)
 
 
+def mensaje_a_json(m, user):
+    return {
+        'id': m.id, 'autor': m.autor.username, 'mensaje': m.mensaje,
+        'imagen': m.imagen.url if m.imagen else None,
+        'es_bot': m.es_bot, 'es_mio': m.autor_id == user.id,
+        'timestamp': m.timestamp.isoformat()
+    }
+
+
 @login_required
 def chat_api_view(request, chat_id):
     chat = get_object_or_404(ChatCotizacion, id=chat_id)
-    if not (request.user == chat.cliente or request.user.is_staff):
+    if not (request.user.id == chat.cliente_id or request.user.is_staff):
         return JsonResponse({'error': 'No autorizado'}, status=403)
 
-    def msg_to_json(m, user):
-        return {
-            'id': m.id, 'autor': m.autor.username, 'mensaje': m.mensaje,
-            'imagen': m.imagen.url if m.imagen else None,
-            'es_bot': m.es_bot, 'es_mio': m.autor == user,
-            'timestamp': m.timestamp.isoformat()
-        }
-
     if request.method == 'POST':
         data = json.loads(request.body)
         mensaje_texto = data.get('mensaje', '')
         if not mensaje_texto:
             return JsonResponse({'error': 'Mensaje vacío'}, status=400)
             
-        nuevo_mensaje = MensajeCotizacion.objects.create(
-            chat=chat, autor=request.user, mensaje=mensaje_texto
-        )
-        mensajes_a_enviar = [msg_to_json(nuevo_mensaje, request.user)]
-        
-        if is_cliente(request.user):
-            respuesta_bot = procesar_respuesta_bot(chat, mensaje_texto)
+        with transaction.atomic():
+            respuesta_bot = None
+            if is_cliente(request.user):
+                respuesta_bot = procesar_respuesta_bot(chat, mensaje_texto, usuario=request.user)
+            nuevos = [MensajeCotizacion(chat=chat, autor=request.user, mensaje=mensaje_texto)]
             if respuesta_bot:
-                bot_user = User.objects.filter(is_superuser=True).first()
-                if bot_user:
-                    bot_msg = MensajeCotizacion.objects.create(
-                        chat=chat, autor=bot_user, es_bot=True, mensaje=respuesta_bot
-                    )
-                    mensajes_a_enviar.append(msg_to_json(bot_msg, request.user))
-        
+                nuevos.append(MensajeCotizacion(chat=chat, autor=obtener_bot(), es_bot=True, mensaje=respuesta_bot))
+            nuevos = crear_mensajes(chat, nuevos)
+        mensajes_a_enviar = [mensaje_a_json(m, request.user) for m in nuevos]
+
         return JsonResponse({'status': 'ok', 'mensajes': mensajes_a_enviar})
 
     if request.method == 'GET':
-        ultimo_timestamp_cliente = request.GET.get('ultimo_mensaje', None)
-        if ultimo_timestamp_cliente:
-            mensajes_nuevos = chat.mensajes.filter(timestamp__gt=ultimo_timestamp_cliente).order_by('timestamp')
-        else:
-            mensajes_nuevos = chat.mensajes.all().order_by('timestamp')
-        return JsonResponse({'mensajes': [msg_to_json(m, request.user) for m in mensajes_nuevos]})
-
-
-def procesar_respuesta_bot(chat, ultimo_mensaje_cliente):
-    if chat.estado not in ['pendiente', 'en_proceso'] and chat.cliente_mensaje_dato is not None:
-        return None 
-    if chat.mensajes.filter(autor__is_staff=True, es_bot=False).exists():
-        if chat.estado == 'pendiente':
-             chat.estado = 'en_proceso'
-             chat.save()
-        return None
-    if len(ultimo_mensaje_cliente) > 500:
-        return "Tu mensaje es muy largo (máximo 500 caracteres). Por favor, sé más breve."
-    if len(ultimo_mensaje_cliente) < 2:
-        if ultimo_mensaje_cliente.lower().strip() not in ['si', 'sí', 'no', 'ok']:
-            return "No entendí tu respuesta. Por favor, intenta de nuevo."
-    
-    usuario_registrado = chat.cliente
-    def is_confirmation(msg):
-        return msg.lower().strip() in ['si', 'sí', 'ok', 'yes', 'correcto']
-    def is_negation(msg):
-        return msg.lower().strip() in ['no', 'negativo', 'cambiar', 'corregir']
-
-    def manejar_confirmacion(dato_chat, dato_user_profile, siguiente_paso_msg, mensaje_confirmacion, mensaje_peticion_dato_nuevo):
-        if dato_chat is None:
-            if dato_user_profile and dato_user_profile.strip() not in ['','None']:
-                return (mensaje_confirmacion.format(dato=dato_user_profile), 'CONFIRMAR')
-            else:
-                return (siguiente_paso_msg, 'PEDIR')
-        if dato_chat.startswith('CONFIRMAR_'):
-            if is_confirmation(ultimo_mensaje_cliente):
-                tipo = dato_chat.split('_')[-1]
-                if tipo == 'NOMBRE':
-                    chat.cliente_nombre_dato = f"{usuario_registrado.first_name} {usuario_registrado.last_name}".strip()
-                    if chat.cliente_nombre_dato == '': chat.cliente_nombre_dato = usuario_registrado.username
-                elif tipo == 'EMAIL': chat.cliente_email_dato = usuario_registrado.email
-                elif tipo == 'TELEFONO': chat.cliente_telefono_dato = getattr(usuario_registrado.perfil, 'telefono', 'NO_PROPORCIONADO')
-                chat.save()
-                return (siguiente_paso_msg, 'CONFIRMADO')
-            elif is_negation(ultimo_mensaje_cliente):
-                if dato_chat.endswith('NOMBRE'): chat.cliente_nombre_dato = None
-                elif dato_chat.endswith('EMAIL'): chat.cliente_email_dato = None
-                elif dato_chat.endswith('TELEFONO'): chat.cliente_telefono_dato = None
-                chat.save()
-                return (mensaje_peticion_dato_nuevo, 'PEDIR_NUEVO')
-            else:
-                if dato_chat.endswith('NOMBRE'): chat.cliente_nombre_dato = None
-                elif dato_chat.endswith('EMAIL'): chat.cliente_email_dato = None
-                elif dato_chat.endswith('TELEFONO'): chat.cliente_telefono_dato = None
-                chat.save()
-                return ('DATA_PROVIDED', 'PEDIR_NUEVO')
-        return None, 'COMPLETADO'
-
-    # 1. NOMBRE
-    if chat.cliente_nombre_dato is None or chat.cliente_nombre_dato.startswith('CONFIRMAR_'):
-        nombre_perfil = f"{usuario_registrado.first_name} {usuario_registrado.last_name}".strip()
-        if not nombre_perfil or nombre_perfil == ' ': nombre_perfil = usuario_registrado.username
-        
-        resultado, estado = manejar_confirmacion(
-            chat.cliente_nombre_dato, nombre_perfil, 
-            "Genial. Ahora, ¿cuál es tu correo electrónico?",
-            "Tu nombre registrado es **{}**. ¿Es correcto para esta cotización? (Sí/No)",
-            "De acuerdo. Por favor, ingresa el nombre y apellido."
-        )
-        if estado == 'CONFIRMAR':
-            chat.cliente_nombre_dato = 'CONFIRMAR_NOMBRE'
-            chat.save()
-            return resultado
-        if estado == 'PEDIR' or (estado == 'PEDIR_NUEVO' and not is_confirmation(ultimo_mensaje_cliente) and not is_negation(ultimo_mensaje_cliente)):
-             if len(ultimo_mensaje_cliente) < 5 or not re.search(r'\s', ultimo_mensaje_cliente):
-                 return "Por favor, ingresa el nombre y apellido completo."
-             chat.cliente_nombre_dato = ultimo_mensaje_cliente
-             chat.save()
-             return "¡Genial, {}! Ahora, ¿cuál es tu correo electrónico?".format(chat.cliente_nombre_dato)
-
-    # 2. EMAIL
-    if chat.cliente_email_dato is None or chat.cliente_email_dato.startswith('CONFIRMAR_'):
-        email_perfil = usuario_registrado.email
-        resultado, estado = manejar_confirmacion(
-            chat.cliente_email_dato, email_perfil, 
-            "Perfecto. ¿Cuál es tu número de teléfono?",
-            "Tu correo registrado es **{}**. ¿Es correcto? (Sí/No)",
-            "Por favor, ingresa el correo electrónico (ej: tu@correo.com)."
-        )
-        if estado == 'CONFIRMAR':
-            chat.cliente_email_dato = 'CONFIRMAR_EMAIL'
-            chat.save()
-            return resultado
-        if estado == 'PEDIR' or (estado == 'PEDIR_NUEVO' and not is_confirmation(ultimo_mensaje_cliente) and not is_negation(ultimo_mensaje_cliente)):
-            if not re.match(r"[^@]+@[^@]+\.[^@]+", ultimo_mensaje_cliente):
-                return "Correo no válido. Por favor, ingresa un email (ej: tu@correo.com)."
-            chat.cliente_email_dato = ultimo_mensaje_cliente
-            chat.save()
-            return "Perfecto. ¿Cuál es tu número de teléfono?"
-
-    # 3. TELEFONO
-    if chat.cliente_telefono_dato is None or chat.cliente_telefono_dato.startswith('CONFIRMAR_'):
-        telefono_perfil = getattr(usuario_registrado.perfil, 'telefono', '')
-        resultado, estado = manejar_confirmacion(
-            chat.cliente_telefono_dato, telefono_perfil, 
-            "¡Gracias! Indícame la **Región y Comuna**.",
-            "Tu teléfono registrado es **{}**. ¿Es correcto? (Sí/No)",
-            "Por favor, ingresa el número de teléfono."
-        )
-        if estado == 'CONFIRMAR':
-            chat.cliente_telefono_dato = 'CONFIRMAR_TELEFONO'
-            chat.save()
-            return resultado
-        if estado == 'PEDIR' or (estado == 'PEDIR_NUEVO' and not is_confirmation(ultimo_mensaje_cliente) and not is_negation(ultimo_mensaje_cliente)):
-             if not re.search(r'(\d.*){8,}', ultimo_mensaje_cliente):
-                 return "Teléfono no válido (ej: +56 9 1234 5678)."
-             chat.cliente_telefono_dato = ultimo_mensaje_cliente
-             chat.save()
-             return "¡Gracias! Indícame la **Región y Comuna**."
-
-    # 4. REGION/COMUNA
-    if chat.cliente_rut_dato is None: 
-        if len(ultimo_mensaje_cliente) < 5:
-             return "Necesitamos la Región y Comuna para evaluar logística."
-        chat.cliente_rut_dato = ultimo_mensaje_cliente
-        chat.save()
-        return "¡Excelente! Finalmente, ¿podrías darme **más detalles de tu proyecto**?"
-        
-    # 5. MENSAJE
-    if chat.cliente_mensaje_dato is None:
-        if len(ultimo_mensaje_cliente) < 10:
-             return "Por favor, dame un poco más de detalle sobre tu proyecto."
-        chat.cliente_mensaje_dato = ultimo_mensaje_cliente
-        chat.estado = 'en_proceso' 
-        chat.save()
-        return f"¡Muchas gracias! Tu solicitud está completa. Un vendedor revisará la información y te contactará pronto."
+        # Cursor por id: ?after_id=<id> (nuevos), ?before_id=<id> (anteriores) y ?limit=<n>.
+        # Sin cursor se retorna la última página del historial.
+        try:
+            after_id = _entero_opcional(request.GET.get('after_id'))
+            before_id = _entero_opcional(request.GET.get('before_id'))
+            limit = _entero_opcional(request.GET.get('limit')) or LIMITE_MENSAJES_DEFECTO
+        except ValueError:
+            return JsonResponse({'error': 'Cursor inválido'}, status=400)
+        mensajes, hay_mas = pagina_mensajes(chat.id, request.user, after_id=after_id, before_id=before_id, limit=limit)
+        return JsonResponse({'mensajes': mensajes, 'hay_mas': hay_mas})
+
+
+LIMITE_MENSAJES_DEFECTO = 50
+LIMITE_MENSAJES_MAXIMO = 200
+
+
+def _entero_opcional(valor):
+    return int(valor) if valor not in (None, '') else None
+
+
+def pagina_mensajes(chat_id, user, after_id=None, before_id=None, limit=LIMITE_MENSAJES_DEFECTO):
+    """
+    Retorna (mensajes_json, hay_mas) para una página del chat, siempre en orden cronológico.
+    - after_id: los `limit` mensajes siguientes a ese id (hay_mas = quedan más nuevos).
+    - sin after_id: los `limit` mensajes anteriores a before_id, o los últimos del chat
+      (hay_mas = quedan más antiguos).
+    Usa el índice (chat, id), así el costo depende del tamaño de página y no del historial.
+    """
+    limit = max(1, min(limit, LIMITE_MENSAJES_MAXIMO))
+    mensajes = MensajeCotizacion.objects.filter(chat_id=chat_id).select_related('autor')
+    if after_id is not None:
+        pagina, hay_mas = paginacion.pagina(mensajes, ('id',), (after_id,), limit)
+    else:
+        pagina, hay_mas = paginacion.pagina(mensajes, ('-id',), None if before_id is None else (before_id,), limit)
+        pagina.reverse()
+    return [mensaje_a_json(m, user) for m in pagina], hay_mas
+
+
+# --- Espera de mensajes nuevos (long-polling, reemplaza el polling cada 5 s) ---
+
+def _chat_autorizado(request, chat_id):
+    """Retorna (usuario, chat) si el usuario puede ver el chat, o (usuario, None)."""
+    user = request.user
+    if not user.is_authenticated:
+        return user, None
+    chat = ChatCotizacion.objects.filter(id=chat_id).only('id', 'cliente_id').first()
+    if chat is None or not (user.id == chat.cliente_id or user.is_staff):
+        return user, None
+    return user, chat
+
+
+async def chat_espera_view(request, chat_id):
+    """
+    GET ?ultimo_id=<id>: queda abierta hasta que el chat tenga un mensaje con id
+    mayor (o hasta ESPERA_MAXIMA segundos) y entonces retorna esos mensajes.
+    Mientras espera lee una marca en caché y consulta la base de datos al vencer
+    (y cada INTERVALO_POLLING segundos si la caché no es compartida; ver
+    tiempo_real.py). Solo espera servida por ASGI (MejorSol/asgi.py); bajo
+    WSGI responde de inmediato y `reintentar_ms` indica al navegador cuándo
+    volver a preguntar.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    user, chat = await sync_to_async(_chat_autorizado)(request, chat_id)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+    if chat is None:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    try:
+        despues_de_id = int(request.GET.get('ultimo_id', 0))
+    except ValueError:
+        return JsonResponse({'error': 'ultimo_id inválido'}, status=400)
+
+    leer_marca = sync_to_async(tiempo_real.ultimo_mensaje_id, thread_sensitive=False)
+
+    async def marca():
+        ultimo = await leer_marca(chat_id)
+        if ultimo is None:
+            # Caché fría: se siembra con el último id de la BD
+            ultimo = await sync_to_async(tiempo_real.sembrar_marca)(chat_id)
+        return ultimo
+
+    def respuesta(mensajes, hay_mas):
+        return JsonResponse({'mensajes': mensajes, 'hay_mas': hay_mas, 'reintentar_ms': reintentar_ms})
+
+    async def nuevos_en_bd():
+        # Un mensaje guardado en otro worker puede no haber movido la marca de este (caché local)
+        mensajes, hay_mas = await sync_to_async(pagina_mensajes)(chat_id, user, after_id=despues_de_id)
+        if mensajes:
+            await sync_to_async(tiempo_real.notificar_mensaje)(chat_id, mensajes[-1]['id'])
+        return mensajes, hay_mas
+
+    esperar = tiempo_real.espera_disponible(request)
+    compartida = fragmentos.cache_compartida()
+    reintentar_ms = 0 if esperar else tiempo_real.INTERVALO_POLLING * 1000
+    ahora = time.monotonic()
+    limite = ahora + (tiempo_real.ESPERA_MAXIMA if esperar else 0)
+    proxima_bd = ahora + tiempo_real.INTERVALO_POLLING
+    while True:
+        if await marca() > despues_de_id:
+            mensajes, hay_mas = await sync_to_async(pagina_mensajes)(chat_id, user, after_id=despues_de_id)
+            return respuesta(mensajes, hay_mas)
+        ahora = time.monotonic()
+        if ahora >= limite or (not compartida and ahora >= proxima_bd):
+            mensajes, hay_mas = await nuevos_en_bd()
+            if mensajes or ahora >= limite:
+                return respuesta(mensajes, hay_mas)
+            proxima_bd = ahora + tiempo_real.INTERVALO_POLLING
+        await asyncio.sleep(tiempo_real.INTERVALO_REVISION)
 
-    return None
 
 @xframe_options_sameorigin
 @login_required
@@ -880,14 +905,17 @@ def lista_chats_cotizacion_view(request):
     context = { 'lista_de_chats': chats }
     return render(request, 'cliente/lista_chats_cotizacion.html', context)
 
-# Dialogflow
-dialogflow_service = DialogflowService()
-
+# Dialogflow (el cliente se crea en la primera llamada, ver services.get_dialogflow_service)
 def chatbot_dialogflow(request):
     if request.method != "POST":
         return JsonResponse({"error": "Método no permitido"}, status=405)
     msg = request.POST.get("message")
     session_id = request.POST.get("session_id", "default-session")
+    try:
+        dialogflow_service = get_dialogflow_service()
+    except Exception as e:
+        logger.warning("Dialogflow no disponible: %s", e)
+        return JsonResponse({"error": "Chatbot no disponible", "detail": str(e)}, status=503)
     df_response = dialogflow_service.detect_intent(session_id, msg)
     return JsonResponse(df_response)
 